@@ -0,0 +1,83 @@
+"""
+Microbenchmark of the in-memory lookups of server/db.py
+(server2/db.py has its own copy of the same code).
+
+Fills a ChatDB with 1k to 1M chats and reports the cost of get_chat_by_id, update_chat
+and add_chat + delete_chat (without persistence), next to the former linear scan.
+The indexed operations should stay flat as the number of chats grows.
+
+Usage (from the repository root):
+    python benchmarks/bench_chat_db.py [--sizes 1000,10000,100000,1000000]
+"""
+import os
+import sys
+import json
+import random
+import argparse
+import tempfile
+import timeit
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+# server.db loads data/*.json relative to the working directory when imported
+os.chdir(ROOT)
+sys.path.insert(0, ROOT)
+from server.db import Chat, ChatDB
+
+
+def linear_get_chat_by_id(db, id):
+    """The former get_chat_by_id: scan every chat."""
+    for chat in db.data.values():
+        if chat.id == id:
+            return chat
+
+
+def make_db(size):
+    """Return a ChatDB holding `size` chats with one message each, backed by an empty temporary file."""
+    with tempfile.NamedTemporaryFile("w", suffix=".json", delete=False) as f:
+        json.dump([], f)
+    db = ChatDB(f.name)
+    os.remove(f.name)
+    for i in range(size):
+        chat = Chat(0, i % 100, f"thread_{i}")
+        chat.add_message("user", "hello")
+        db.add_chat(chat, persist=False)
+    return db
+
+
+def per_op_us(stmt, number):
+    """Return the best time of one call of stmt over 3 repeats, in microseconds."""
+    return min(timeit.repeat(stmt, number=number, repeat=3)) / number * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="1000,10000,100000,1000000", help="Comma-separated numbers of chats")
+    parser.add_argument("--ops", type=int, default=10000, help="Number of indexed operations timed per size")
+    args = parser.parse_args()
+
+    print(f"{'chats':>9} {'get (us)':>9} {'update (us)':>11} {'add+del (us)':>12} {'linear get (us)':>15}")
+    for size in [int(size) for size in args.sizes.split(",")]:
+        db = make_db(size)
+        ids = [random.randint(1, size) for _ in range(args.ops)]
+        chats = [db.get_chat_by_id(id) for id in ids]
+        lookups, updates = iter(ids * 3), iter(chats * 3)
+
+        get = per_op_us(lambda: db.get_chat_by_id(next(lookups)), args.ops)
+        update = per_op_us(lambda: db.update_chat(next(updates), persist=False), args.ops)
+
+        def add_delete():
+            chat = db.add_chat(Chat(0, 1, "thread"), persist=False)
+            db.delete_chat(chat.id, persist=False)
+        add_delete_us = per_op_us(add_delete, args.ops)
+
+        # The linear scan is timed on a few lookups only, it is O(chats)
+        scans = max(1, min(args.ops, 10_000_000 // size))
+        linear_ids = iter(ids * 3)
+        linear = per_op_us(lambda: linear_get_chat_by_id(db, next(linear_ids)), scans)
+
+        print(f"{size:>9} {get:>9.3f} {update:>11.3f} {add_delete_us:>12.3f} {linear:>15.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""
+Memory benchmark of the chat model of server/db.py
+(server2/db.py has its own copy of the same code).
+
+Loads chats of 50 messages and 200 assistant logs, with a last context and last promotions
+set, the way ChatDB loads them from data/chats.json, and reports the bytes allocated per chat:
+in total, for the message and log texts themselves, and the rest (objects, lists, fields).
+The same chats kept as parsed JSON dicts are reported for comparison.
+
+Usage (from the repository root):
+    python benchmarks/bench_chat_memory.py [--chats 1000] [--messages 50] [--logs 200]
+"""
+import os
+import sys
+import gc
+import json
+import random
+import argparse
+import tracemalloc
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+# server.db loads data/*.json relative to the working directory when imported
+os.chdir(ROOT)
+sys.path.insert(0, ROOT)
+from server.db import Chat
+
+LOG_TYPES = ["user_message", "Add message", "run_created", "run_completed", "context_found",
+             "promotions_query", "promotions_found", "promotion_selected"]
+
+
+def make_chat_json(chat_id, messages, logs):
+    """Return the JSON text of a chat as saved in data/chats.json."""
+    chat = Chat(chat_id, random.randint(1, 4), "thread_{}".format(chat_id))
+    for i in range(messages):
+        chat.add_message("user" if i % 2 == 0 else "assistant", "ข้อความที่ {} ".format(i) * 8)
+    for i in range(logs):
+        chat.add_assistant_log(random.choice(LOG_TYPES), "log {} of the assistant ".format(i) * 4, "{:.3f} seconds".format(random.random()))
+        if i % 20 == 0:
+            chat.add_run_id("run_{}_{}".format(chat_id, i))
+    chat.set_last_context({"product_type": ["โทรศัพท์มือถือ", "แท็บเล็ต"]})
+    chat.set_last_promotions([{"id": i, "promotion_title": "โปรโมชั่น {}".format(i), "summary_text": "รายละเอียด " * 30} for i in range(3)])
+    return json.dumps(chat.get_as_dict())
+
+
+def text_bytes(item):
+    """Return the bytes of the message texts of a chat dict."""
+    return sum(sys.getsizeof(message["message"]) for message in item["chat_messages"]) + \
+        sum(sys.getsizeof(log["message"]) for log in item["assistant_logs"])
+
+
+def allocated_per_item(texts, load):
+    """Return the bytes still allocated per item after loading every JSON text with `load`."""
+    gc.collect()
+    tracemalloc.start()
+    start = tracemalloc.get_traced_memory()[0]
+    items = [load(text) for text in texts]
+    gc.collect()
+    allocated = tracemalloc.get_traced_memory()[0] - start
+    tracemalloc.stop()
+    del items
+    return allocated / len(texts)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chats", type=int, default=1000, help="Number of chats loaded")
+    parser.add_argument("--messages", type=int, default=50, help="Messages per chat")
+    parser.add_argument("--logs", type=int, default=200, help="Assistant logs per chat")
+    args = parser.parse_args()
+
+    texts = [make_chat_json(chat_id, args.messages, args.logs) for chat_id in range(1, args.chats + 1)]
+    content = sum(text_bytes(json.loads(text)) for text in texts) / len(texts)
+
+    print(f"{args.chats} chats of {args.messages} messages and {args.logs} assistant logs, bytes per chat:")
+    print(f"{'representation':>15} {'total':>9} {'texts':>9} {'overhead':>9}")
+    for name, load in [("Chat", lambda text: Chat.from_dict(json.loads(text))), ("JSON dicts", json.loads)]:
+        total = allocated_per_item(texts, load)
+        print(f"{name:>15} {total:>9.0f} {content:>9.0f} {total - content:>9.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""
+Throughput benchmark of the chat storage backends of server/db.py
+(server2/db.py has its own copy of the same code).
+
+Fills a journaled JSON ChatDB and a SqliteChatDB with the same 10k+ chats, then reports
+operations per second of add_chat, get_chat_by_id and update_chat after one new message and
+assistant log (one user turn), all persisted, and the time of one full rewrite of chats.json
+as the JSON backend did on every update before the journal.
+
+Usage (from the repository root):
+    python benchmarks/bench_db_backends.py [--chats 10000,50000] [--messages 10]
+"""
+import os
+import sys
+import time
+import random
+import argparse
+import tempfile
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+# server.db loads data/*.json relative to the working directory when imported
+os.chdir(ROOT)
+sys.path.insert(0, ROOT)
+from server.db import Chat, ChatDB, SqliteChatDB
+
+
+def make_chat(messages):
+    """Return a new chat with `messages` user and assistant messages and as many assistant logs."""
+    chat = Chat(0, random.randint(1, 4), "thread")
+    for i in range(messages):
+        chat.add_message("user" if i % 2 == 0 else "assistant", "message {}".format(i) * 10)
+        chat.add_assistant_log("context", "log {}".format(i) * 10, 0.5)
+    return chat
+
+
+def ops_per_second(operation, ops):
+    """Run operation `ops` times and return the number of calls per second."""
+    start = time.perf_counter()
+    for _ in range(ops):
+        operation()
+    return ops / (time.perf_counter() - start)
+
+
+def bench(db, size, messages, ops):
+    """Return the add, get and update throughputs of a chat database after filling it with `size` chats."""
+    add = ops_per_second(lambda: db.add_chat(make_chat(messages)), size)
+    ids = list(range(1, size + 1))
+
+    get = ops_per_second(lambda: db.get_chat_by_id(random.choice(ids)), ops)
+
+    def update():
+        chat = db.get_chat_by_id(random.choice(ids))
+        chat.add_message("user", "hello")
+        chat.add_assistant_log("context", "searching", 0.5)
+        db.update_chat(chat)
+    return add, get, ops_per_second(update, ops)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chats", default="10000", help="Comma-separated numbers of chats")
+    parser.add_argument("--messages", type=int, default=10, help="Messages and assistant logs per chat")
+    parser.add_argument("--ops", type=int, default=5000, help="Number of get and update operations timed")
+    args = parser.parse_args()
+
+    print(f"{'backend':>8} {'chats':>7} {'add/s':>9} {'get/s':>10} {'update/s':>9}")
+    for size in [int(size) for size in args.chats.split(",")]:
+        with tempfile.TemporaryDirectory() as directory:
+            chats_path = os.path.join(directory, "chats.json")
+            with open(chats_path, "w") as f:
+                f.write("[]")
+            json_db = ChatDB(chats_path)
+            results = {
+                "json": bench(json_db, size, args.messages, args.ops),
+                "sqlite": bench(SqliteChatDB(os.path.join(directory, "database.sqlite3")), size, args.messages, args.ops),
+            }
+            for backend, (add, get, update) in results.items():
+                print(f"{backend:>8} {size:>7} {add:>9.0f} {get:>10.0f} {update:>9.0f}")
+
+            start = time.perf_counter()
+            json_db.save_to_file(chats_path)
+            print(f"full rewrite of chats.json at {size} chats: {(time.perf_counter() - start) * 1e3:.0f} ms")
+            json_db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+"""
+Benchmark of truncated dimensions and Qdrant quantization for one named vector.
+
+For each setting (dimension x quantization mode), uploads the vectors to a temporary
+collection and reports recall@k against an exact full-precision search, the estimated
+RAM of the vectors and the query latency. The queries are the vectors of another named
+vector of the same promotions, e.g. titles searched against summaries.
+
+Qdrant's local mode does not quantize, so set QDRANT_URL to a Qdrant server to measure
+quantization; without it only the truncated dimensions are meaningful.
+
+Usage:
+    python benchmarks/bench_quantization.py [--vector vector_summary_text] [--query-vector vector_promotion_title]
+    python benchmarks/bench_quantization.py --synthetic 20000 --dimension 3072
+"""
+import os
+import sys
+import time
+import argparse
+import numpy as np
+from dotenv import load_dotenv
+from qdrant_client import QdrantClient, models
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "../src"))
+from utils.quantization import QUANTIZATION_MODES, quantization_config, quantization_search_params, vector_bytes
+from utils.vector_store import load_processed_file
+
+load_dotenv()
+
+
+def normalize(matrix):
+    """L2-normalize the rows of a matrix."""
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return matrix / np.where(norms > 0, norms, 1)
+
+
+def load_vectors(args):
+    """Return the vectors to index and the query vectors, from the processed data or synthetic."""
+    if args.synthetic:
+        rng = np.random.default_rng(0)
+        data = rng.standard_normal((args.synthetic, args.dimension), dtype=np.float32)
+        queries = data[:args.queries] + 0.5 * rng.standard_normal((args.queries, args.dimension), dtype=np.float32)
+        return data, queries
+    _, vectors, _ = load_processed_file(args.file, mmap=True)
+    return np.asarray(vectors[args.vector]), np.asarray(vectors[args.query_vector][:args.queries])
+
+
+def exact_top_k(data, queries, dimension, k):
+    """Return the ids of the exact top-k cosine neighbours of each query over the first dimensions."""
+    scores = normalize(queries[:, :dimension]) @ normalize(data[:, :dimension]).T
+    return [set(row) for row in np.argsort(-scores, axis=1)[:, :k].tolist()]
+
+
+def run_setting(qdrant, data, queries, truth, dimension, mode, rescore, args):
+    """Index the vectors with one setting and return its recall@k and latency percentiles."""
+    collection = f"bench_quantization_{dimension}_{mode}"
+    if qdrant.collection_exists(collection):
+        qdrant.delete_collection(collection)
+    quantization = quantization_config(mode)
+    qdrant.create_collection(
+        collection_name=collection,
+        vectors_config=models.VectorParams(
+            size=dimension,
+            distance=models.Distance.COSINE,
+            quantization_config=quantization,
+            on_disk=True if quantization is not None else None,
+        ),
+    )
+    qdrant.upload_collection(collection_name=collection, vectors=data[:, :dimension], ids=range(len(data)),
+                             batch_size=256, wait=True)
+
+    params = quantization_search_params(mode, rescore, args.oversampling)
+    latencies, recalls = [], []
+    for query, expected in zip(queries, truth):
+        start_time = time.perf_counter()
+        points = qdrant.search(
+            collection_name=collection,
+            query_vector=query[:dimension].tolist(),
+            limit=args.k,
+            search_params=params,
+        )
+        latencies.append(time.perf_counter() - start_time)
+        recalls.append(len(expected & {point.id for point in points}) / len(expected))
+
+    qdrant.delete_collection(collection)
+    return float(np.mean(recalls)), np.percentile(latencies, 50), np.percentile(latencies, 95)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--file", default="promotions_with_summary.csv", help="Raw file of the processed data")
+    parser.add_argument("--vector", default="vector_summary_text", help="Named vector to index")
+    parser.add_argument("--query-vector", default="vector_promotion_title", help="Named vector used as queries")
+    parser.add_argument("--synthetic", type=int, default=0, help="Index this many random vectors instead")
+    parser.add_argument("--dimension", type=int, default=3072, help="Dimension of the synthetic vectors")
+    parser.add_argument("--queries", type=int, default=100, help="Number of queries")
+    parser.add_argument("--k", type=int, default=10, help="Number of neighbours for recall@k")
+    parser.add_argument("--oversampling", type=float, default=2.0, help="Oversampling of quantized searches")
+    args = parser.parse_args()
+
+    data, queries = load_vectors(args)
+    full = data.shape[1]
+    args.k = min(args.k, len(data))
+    qdrant_url = os.environ.get('QDRANT_URL')
+    qdrant = QdrantClient(url=qdrant_url, api_key=os.environ.get('QDRANT_API_KEY')) if qdrant_url else QdrantClient(":memory:")
+    print(f"{len(data)} vectors of {full} dimensions, {len(queries)} queries, Qdrant {qdrant_url or 'local mode (no quantization)'}")
+
+    # The baseline is an exact search at full precision and full dimension
+    truth = exact_top_k(data, queries, full, args.k)
+
+    print(f"{'dimension':>9} {'quantization':>12} {'rescore':>7} {f'recall@{args.k}':>10} {'RAM (MB)':>9} {'p50 (ms)':>9} {'p95 (ms)':>9}")
+    dimensions = [dimension for dimension in [full, 1536, 1024, 512, 256] if dimension <= full]
+    settings = [(dimension, mode, True) for dimension in sorted(set(dimensions), reverse=True) for mode in QUANTIZATION_MODES]
+    settings.append((full, "binary", False))
+    for dimension, mode, rescore in settings:
+        recall, p50, p95 = run_setting(qdrant, data, queries, truth, dimension, mode, rescore, args)
+        ram = len(data) * vector_bytes(dimension, mode) / 2**20
+        print(f"{dimension:>9} {mode:>12} {str(rescore if mode != 'none' else '-'):>7} {recall:>10.3f} {ram:>9.2f} {p50 * 1e3:>9.2f} {p95 * 1e3:>9.2f}")
+
+
+if __name__ == "__main__":
+    main()
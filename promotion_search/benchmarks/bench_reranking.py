@@ -0,0 +1,64 @@
+"""
+Microbenchmark of the reranking step of NeuralSearcher.get_context_reranked.
+
+Compares the former pandas implementation with utils.reranking on synthetic
+candidate sets shaped like /api/search results (queries x vectors x limit_per_vec).
+
+Usage:
+    python benchmarks/bench_reranking.py
+"""
+import os
+import sys
+import random
+import timeit
+import pandas as pd
+from qdrant_client.models import ScoredPoint
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "../src"))
+from utils.reranking import rerank
+
+COLUMNS = ["id", "score", "promotion_title", "summary_text"]
+
+
+def make_points(n_points, n_ids):
+    """Generate ScoredPoints with random scores over n_ids distinct promotions."""
+    return [
+        ScoredPoint(
+            id=random.randrange(n_ids),
+            version=0,
+            score=random.random(),
+            payload={
+                "promotion_title": "title",
+                "summary_text": "summary",
+                "promotion_description": "description " * 50,
+            },
+        )
+        for _ in range(n_points)
+    ]
+
+
+def rerank_pandas(scored_points, limit, threshold, columns):
+    """The DataFrame-based reranking used before utils.reranking."""
+    df = pd.DataFrame([{'id': point.id, 'score': point.score, **point.payload} for point in scored_points])
+    df = df[df['score'] >= threshold]
+    df = df.sort_values(['score', 'id'], ascending=False).drop_duplicates('id', keep='first')
+    df = df.head(limit)
+    return df[columns].to_dict(orient='records')
+
+
+def main():
+    random.seed(0)
+    print(f"{'candidates':>10} {'pandas (us)':>12} {'reranking (us)':>15} {'speedup':>8}")
+    # 6 queries x 5 vectors x 3 per vector is a typical request, larger sets show the scaling
+    for n_points, n_ids in [(30, 20), (90, 60), (1000, 500), (10000, 2000)]:
+        points = make_points(n_points, n_ids)
+        assert rerank_pandas(points, 5, 0.2, COLUMNS) == rerank(points, 5, 0.2, COLUMNS)
+
+        number = max(10, 20000 // n_points)
+        before = min(timeit.repeat(lambda: rerank_pandas(points, 5, 0.2, COLUMNS), number=number, repeat=5)) / number
+        after = min(timeit.repeat(lambda: rerank(points, 5, 0.2, COLUMNS), number=number, repeat=5)) / number
+        print(f"{n_points:>10} {before * 1e6:>12.1f} {after * 1e6:>15.1f} {before / after:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,13 +1,67 @@
+import hashlib
+import numpy as np
 import pandas as pd
-from tqdm import tqdm
 from utils.embedder import OpenAIEmbedder
+from utils.bulk_embedder import BulkEmbedder
+from utils.vector_store import get_processed_path, load_processed_file, processed_exists, save_processed
 import os
 
+# Columns that identify a promotion across runs of the feed
+KEY_COLUMNS = ["promotion_title", "promotion_link", "start_date", "end_date"]
+
+
+def make_row_keys(df):
+    """Return a stable key for each row, derived from its identifying columns."""
+    keys = []
+    seen = {}
+    for values in df[KEY_COLUMNS].astype(str).itertuples(index=False):
+        key = hashlib.sha1("\0".join(values).encode("utf-8")).hexdigest()
+        # Rows with identical identifying columns get an occurrence suffix
+        seen[key] = seen.get(key, 0) + 1
+        keys.append(key if seen[key] == 1 else f"{key}-{seen[key]}")
+    return keys
+
+
+def content_hash(model, text):
+    """Return the hash of a cell's text for the given embedding model."""
+    return hashlib.sha256(f"{model}\0{text}".encode("utf-8")).hexdigest()
+
+
+def load_previous_vectors(file_name, columns):
+    """
+    Load the content hashes and vectors of the previous run.
+
+    Returns:
+    - tuple: A mapping from row key to previous row index, a mapping from column to
+      (hashes, vectors) and the number of previous rows.
+    """
+    if not processed_exists(file_name):
+        return {}, {}, 0
+
+    metadata, vectors, _ = load_processed_file(file_name)
+    if "row_key" not in metadata.columns:
+        return {}, {}, 0
+
+    previous_columns = {
+        column: (metadata[f"hash_{column}"].tolist(), vectors[f"vector_{column}"])
+        for column in columns
+        if f"hash_{column}" in metadata.columns and f"vector_{column}" in vectors
+    }
+    row_index = {key: index for index, key in enumerate(metadata["row_key"])}
+    return row_index, previous_columns, len(metadata)
+
 
 def embed_data(file_name):
     # Create an instance of the OpenAIEmbedder class
     openai_embedder = OpenAIEmbedder()
 
+    # Run batched requests from a rate-limited worker pool, checkpointing finished batches
+    checkpoint_path = os.path.join(
+        os.path.dirname(__file__), f"../data/processed/{file_name}.checkpoint.jsonl"
+    )
+    os.makedirs(os.path.dirname(checkpoint_path), exist_ok=True)
+    bulk_embedder = BulkEmbedder(openai_embedder, checkpoint_path=checkpoint_path)
+
     # Read the CSV file into a DataFrame
     df = pd.read_csv(
         os.path.join(os.path.dirname(__file__), f"../data/raw/{file_name}")
@@ -29,18 +83,64 @@ def embed_data(file_name):
         "summary_text",
     ]
 
-    # Apply embedding to specified columns
-    for column in tqdm(columns_to_embed):
-        df["vector_" + column] = df[column].apply(
-            lambda x: openai_embedder.get_embedding(x)
-        )
+    model = openai_embedder.OPENAI_EMBEDDING_MODEL
+
+    # Hash every cell so that unchanged cells reuse the vectors of the previous run
+    df["row_key"] = make_row_keys(df)
+    row_index, previous_columns, n_previous_rows = load_previous_vectors(file_name, columns_to_embed)
+    row_keys = set(df["row_key"])
+    deleted = sum(1 for key in row_index if key not in row_keys) * len(previous_columns)
 
-    # Save the processed DataFrame to a new CSV file
-    output_path = os.path.join(
-        os.path.dirname(__file__), f"../data/processed/{file_name}"
+    to_embed = []
+    reused = {}
+    for column in columns_to_embed:
+        df["hash_" + column] = [content_hash(model, text) for text in df[column]]
+        previous_hashes, _ = previous_columns.get(column, ([], None))
+        reused[column] = ([], [])
+        for row, (key, hash_value) in enumerate(zip(df["row_key"], df["hash_" + column])):
+            index = row_index.get(key)
+            if index is not None and index < len(previous_hashes) and previous_hashes[index] == hash_value:
+                reused[column][0].append(row)
+                reused[column][1].append(index)
+            else:
+                to_embed.append((column, row))
+
+    # Embed only the new or changed cells, in batched requests
+    embeddings = []
+    if to_embed:
+        texts = [df[column].iat[row] for column, row in to_embed]
+        embeddings = bulk_embedder.embed(texts)
+        print(bulk_embedder.report(len({row for _, row in to_embed})))
+
+    # Assemble one contiguous float32 array per column from reused and new vectors
+    if embeddings:
+        dimension = len(embeddings[0])
+    else:
+        dimension = next((vectors.shape[1] for _, vectors in previous_columns.values()), None)
+        if dimension is None:
+            # Only an empty file embeds nothing without vectors of a previous run to reuse
+            raise ValueError(f"data/raw/{file_name} has no rows to embed")
+    vectors = {
+        "vector_" + column: np.empty((len(df), dimension), dtype=np.float32)
+        for column in columns_to_embed
+    }
+    for column, (rows, indices) in reused.items():
+        if rows:
+            vectors["vector_" + column][rows] = previous_columns[column][1][indices]
+    for (column, row), embedding in zip(to_embed, embeddings):
+        vectors["vector_" + column][row] = embedding
+    del previous_columns
+
+    n_cells = len(df) * len(columns_to_embed)
+    print(
+        f"Reused {n_cells - len(to_embed)} cells, embedded {len(to_embed)} cells, "
+        f"deleted {deleted} cells ({n_previous_rows} rows before, {len(df)} rows now)"
     )
-    df.to_csv(output_path, index=False)
-    print(f"file saved in data/processed/{file_name}")
+
+    # Save the metadata as a columnar file and each vector column as a float32 .npy array
+    output_path = get_processed_path(file_name)
+    save_processed(output_path, df, vectors, manifest={"source": file_name, "model": model})
+    print(f"data saved in data/processed/{os.path.basename(output_path)}")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,191 @@
+import os
+import json
+import time
+import argparse
+import numpy as np
+from datetime import datetime
+from dotenv import load_dotenv
+from utils.searcher import NeuralSearcher
+
+# Load environment variables
+load_dotenv()
+
+COLLECTION_NAME = os.environ.get('COLLECTION_NAME')
+EVALUATION_DIR = os.path.join(os.path.dirname(__file__), "../data/evaluation")
+
+# Search parameters of a configuration that does not set them, the same as /api/search
+DEFAULT_CONFIG = {
+    "embed_columns": ['vector_promotion_title', 'vector_promotion_description', 'vector_shop', 'vector_special_day', 'vector_summary_text'],
+    "limit": 5,
+    "threshold": 0.0,
+    "limit_per_vec": 3,
+    "fusion": None,
+    "lexical": None,
+    "mode": None,
+    "backend": None,
+    "repeat": 1,
+}
+
+
+class CallCounter:
+    """Proxy that counts the method calls made on a client."""
+
+    def __init__(self, target):
+        self.target = target
+        self.calls = 0
+
+    def __getattr__(self, name):
+        attribute = getattr(self.target, name)
+        if not callable(attribute):
+            return attribute
+
+        def counted(*args, **kwargs):
+            self.calls += 1
+            return attribute(*args, **kwargs)
+        return counted
+
+
+def recall_at_k(result_ids, expected, k):
+    """Return the fraction of the expected ids found in the first k results."""
+    return len(set(result_ids[:k]) & set(expected)) / len(expected)
+
+
+def reciprocal_rank(result_ids, expected):
+    """Return 1 / the rank of the first expected id in the results, or 0 if none is found."""
+    for rank, point_id in enumerate(result_ids, start=1):
+        if point_id in expected:
+            return 1.0 / rank
+    return 0.0
+
+
+def get_searcher(searchers, backend):
+    """Return the searcher of a backend, with its Qdrant and embedding calls counted."""
+    backend = backend or os.environ.get('SEARCH_BACKEND', 'qdrant')
+    if backend not in searchers:
+        searcher = NeuralSearcher(collection_name=COLLECTION_NAME, backend=backend)
+        searcher.qdrant_client = CallCounter(searcher.qdrant_client)
+
+        # Count the embedding requests, not the get_embeddings calls that may send several
+        embedder = searcher.openai_embedder
+        embed_batch = embedder.embed_batch
+        embedder.embedding_requests = 0
+
+        def counted_embed_batch(*args, **kwargs):
+            embedder.embedding_requests += 1
+            return embed_batch(*args, **kwargs)
+        embedder.embed_batch = counted_embed_batch
+        searchers[backend] = searcher
+    return searchers[backend]
+
+
+def evaluate_config(searchers, config, labelled):
+    """
+    Run every labelled query set through get_context_reranked with one configuration.
+
+    The caches are cleared first, so the first run of each query set is a cold search and
+    the following runs (see "repeat") measure the caches.
+
+    Args:
+    - searchers (dict): The searcher of each backend, created on first use.
+    - config (dict): The configuration, with every key of DEFAULT_CONFIG.
+    - labelled (list[dict]): The query sets, each with "queries" and "expected" ids.
+
+    Returns:
+    - dict: Recall@k and MRR over the query sets, latency percentiles and call counts over every search.
+    """
+    searcher = get_searcher(searchers, config["backend"])
+    searcher.embedding_cache.clear()
+    searcher.result_cache.clear()
+    qdrant_calls = searcher.qdrant_client.calls
+    embedding_requests = searcher.openai_embedder.embedding_requests
+
+    recalls, reciprocal_ranks, latencies = [], [], []
+    for _ in range(config["repeat"]):
+        for item in labelled:
+            start_time = time.perf_counter()
+            result = searcher.get_context_reranked(
+                item["queries"],
+                config["embed_columns"],
+                limit=config["limit"],
+                threshold=config["threshold"],
+                limit_per_vec=config["limit_per_vec"],
+                columns=["id", "score"],
+                mode=config["mode"],
+                fusion=config["fusion"],
+                lexical=config["lexical"],
+            )
+            latencies.append(time.perf_counter() - start_time)
+            result_ids = [record["id"] for record in result]
+            recalls.append(recall_at_k(result_ids, item["expected"], config["limit"]))
+            reciprocal_ranks.append(reciprocal_rank(result_ids, item["expected"]))
+
+    return {
+        "k": config["limit"],
+        "recall_at_k": float(np.mean(recalls)),
+        "mrr": float(np.mean(reciprocal_ranks)),
+        "latency_p50_ms": 1000 * float(np.percentile(latencies, 50)),
+        "latency_p95_ms": 1000 * float(np.percentile(latencies, 95)),
+        "searches": len(latencies),
+        "embedding_requests": searcher.openai_embedder.embedding_requests - embedding_requests,
+        "qdrant_calls": searcher.qdrant_client.calls - qdrant_calls,
+    }
+
+
+def evaluate(queries_file, configs_file, output_dir):
+    """
+    Evaluate every configuration on a labelled set and write the results to a JSON file.
+
+    Args:
+    - queries_file (str): JSON list of {"queries": [...], "expected": [promotion ids]}.
+    - configs_file (str): JSON list of configurations, each with a "name" and any key of DEFAULT_CONFIG.
+    - output_dir (str): The directory of the results file.
+
+    Returns:
+    - str: The path of the results file.
+    """
+    with open(queries_file, "r") as f:
+        labelled = json.load(f)
+    with open(configs_file, "r") as f:
+        configs = [{"name": config["name"], **DEFAULT_CONFIG, **config} for config in json.load(f)]
+
+    searchers = {}
+    results = []
+    print(f"{'config':<20} {'recall@k':>9} {'mrr':>6} {'p50 (ms)':>9} {'p95 (ms)':>9} {'embed':>6} {'qdrant':>7}")
+    for config in configs:
+        try:
+            metrics = evaluate_config(searchers, config, labelled)
+        except Exception as e:
+            # Keep evaluating the other configurations, e.g. when a backend is not available
+            print(f"{config['name']:<20} failed: {e}")
+            results.append({"config": config, "error": str(e)})
+            continue
+        results.append({"config": config, "metrics": metrics})
+        print(
+            f"{config['name']:<20} {metrics['recall_at_k']:>9.3f} {metrics['mrr']:>6.3f} "
+            f"{metrics['latency_p50_ms']:>9.1f} {metrics['latency_p95_ms']:>9.1f} "
+            f"{metrics['embedding_requests']:>6} {metrics['qdrant_calls']:>7}"
+        )
+
+    os.makedirs(output_dir, exist_ok=True)
+    created_at = datetime.now()
+    output_path = os.path.join(output_dir, f"evaluation_{created_at:%Y%m%d%H%M%S}.json")
+    with open(output_path, "w") as f:
+        json.dump({
+            "created_at": created_at.isoformat(timespec="seconds"),
+            "collection": COLLECTION_NAME,
+            "model": os.environ.get('OPENAI_EMBEDDING_MODEL'),
+            "queries_file": os.path.basename(queries_file),
+            "query_sets": len(labelled),
+            "results": results,
+        }, f, indent=4, ensure_ascii=False)
+    print(f"results saved in {output_path}")
+    return output_path
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Evaluate the relevance and latency of search configurations.")
+    parser.add_argument("--queries", default=os.path.join(EVALUATION_DIR, "queries.json"), help="Labelled query sets")
+    parser.add_argument("--configs", default=os.path.join(EVALUATION_DIR, "configs.json"), help="Configurations to evaluate")
+    parser.add_argument("--output-dir", default=os.path.join(EVALUATION_DIR, "results"), help="Directory of the results file")
+    args = parser.parse_args()
+    evaluate(args.queries, args.configs, args.output_dir)
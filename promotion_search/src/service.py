@@ -1,7 +1,11 @@
 import os
+import json
 import time
-from fastapi import FastAPI, Query
-from utils.searcher import NeuralSearcher
+from fastapi import FastAPI, Query, Request
+from fastapi.responses import PlainTextResponse
+from utils.async_searcher import AsyncNeuralSearcher
+from utils.filters import make_search_filter
+from utils.metrics import METRICS
 from dotenv import load_dotenv
 
 # Load environment variables
@@ -12,16 +16,59 @@ COLLECTION_NAME = os.environ.get('COLLECTION_NAME')
 
 app = FastAPI()
 
-# Create a neural searcher instance
-searcher = NeuralSearcher(collection_name=COLLECTION_NAME)
+# Create a neural searcher instance, shared by every request with one connection pool per backend
+searcher = AsyncNeuralSearcher(collection_name=COLLECTION_NAME)
 
 vector_columns = ['vector_promotion_title','vector_promotion_description','vector_shop','vector_special_day','vector_summary_text']
 
+def cache_metrics():
+    """Report the counters of the searcher's caches and single-flight groups to /metrics."""
+    metrics = []
+    for cache_name, cache in [("embedding", searcher.embedding_cache), ("result", searcher.result_cache)]:
+        stats = cache.get_stats()
+        for counter in ["hits", "misses", "evictions", "expirations", "invalidations"]:
+            metrics.append((f"search_cache_{counter}_total", {"cache": cache_name}, stats[counter]))
+    for flight_name, flight in [("embedding", searcher.embedding_flight), ("search", searcher.search_flight)]:
+        stats = flight.get_stats()
+        metrics.append(("search_single_flight_calls_total", {"flight": flight_name}, stats["calls"]))
+        metrics.append(("search_single_flight_shared_total", {"flight": flight_name}, stats["shared"]))
+    return metrics
+
+METRICS.add_callback(cache_metrics)
+
+@app.on_event("shutdown")
+async def shutdown():
+    await searcher.close()
+
+@app.middleware("http")
+async def record_stage_timings(request: Request, call_next):
+    # Collect the stage timings of each search for the Server-Timing header and the log line
+    if not METRICS.enabled or request.url.path != "/api/search":
+        return await call_next(request)
+
+    timings = METRICS.start_request()
+    start_time = time.perf_counter()
+    response = await call_next(request)
+    METRICS.observe("total", time.perf_counter() - start_time)
+    response.headers["Server-Timing"] = METRICS.server_timing(timings)
+    if METRICS.log:
+        print(json.dumps({
+            "path": request.url.path,
+            "status": response.status_code,
+            "timings_ms": {stage: round(1000 * seconds, 3) for stage, seconds in timings.items()},
+        }))
+    return response
+
 @app.get("/api/search")
-def search(queries: list[str] = Query(..., description="List of query strings"),
-            vector_name: list[str] = Query(vector_columns, description="List of vector name")):
+async def search(queries: list[str] = Query(..., description="List of query strings"),
+            vector_name: list[str] = Query(vector_columns, description="List of vector name"),
+            fusion: str | None = Query(None, description="Server-side fusion of the rankings: rrf or dbsf"),
+            active_at: int | None = Query(None, description="Only promotions active at this Unix timestamp"),
+            cards: list[str] | None = Query(None, description="Only promotions valid for any of these credit cards"),
+            category: list[str] | None = Query(None, description="Only promotions of any of these categories"),
+            lexical: str | None = Query(None, description="Lexical retrieval: off, hybrid (BM25 and vector rankings fused) or auto (BM25 alone when confident)")):
     start_time = time.time()
-    response = {"result" : searcher.get_context_reranked(queries, 
+    response = {"result" : await searcher.get_context_reranked(queries, 
                                                          vector_name, 
                                                          limit=5, 
                                                          threshold=0.0, 
@@ -29,10 +76,25 @@ def search(queries: list[str] = Query(..., description="List of query strings"),
                                                          columns=["id", 
                                                                   "score",
                                                                   "promotion_title",
-                                                                  "summary_text"])}
+                                                                  "summary_text"],
+                                                         fusion=fusion,
+                                                         search_filter=make_search_filter(active_at, cards, category),
+                                                         lexical=lexical)}
     print("Response time is {} sec".format(time.time() - start_time))
     return response
 
+@app.get("/api/search/stats")
+async def search_stats():
+    return {"latency": searcher.get_latency_stats(),
+            "embedding_cache": searcher.embedding_cache.get_stats(),
+            "result_cache": searcher.result_cache.get_stats(),
+            "single_flight": {"embeddings": searcher.embedding_flight.get_stats(),
+                              "searches": searcher.search_flight.get_stats()}}
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    return PlainTextResponse(METRICS.render(), media_type="text/plain; version=0.0.4")
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run("service:app", host="0.0.0.0", port=8001, reload=True)
\ No newline at end of file
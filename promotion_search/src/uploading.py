@@ -1,9 +1,13 @@
 import os
-import ast
-import pandas as pd
+import time
+import uuid
+from datetime import datetime
 from tqdm import tqdm
 from dotenv import load_dotenv
 from qdrant_client import models, QdrantClient
+from utils.vector_store import iter_processed_rows, load_manifest
+from utils.filters import FILTER_PAYLOAD_INDEXES, derive_filter_fields
+from utils.quantization import get_quantization_mode, parse_vector_settings, quantization_config, truncated_dimension
 
 # Load environment variables
 load_dotenv()
@@ -13,27 +17,96 @@ qdrant_url = os.environ.get('QDRANT_URL')
 qdrant_api_key = os.environ.get('QDRANT_API_KEY')
 collection_name = os.environ.get('COLLECTION_NAME')
 openai_embedding_dimension = os.environ.get('OPENAI_EMBEDDING_DIMENSION')
+upload_batch_size = int(os.environ.get('UPLOAD_BATCH_SIZE', 256))
+upload_parallel = int(os.environ.get('UPLOAD_PARALLEL', 4))
+keep_versions = int(os.environ.get('COLLECTION_KEEP_VERSIONS', 1))
+vector_dimensions = parse_vector_settings(os.environ.get('VECTOR_DIMENSIONS'))
+vector_quantization = parse_vector_settings(os.environ.get('VECTOR_QUANTIZATION'))
 
-def upload_data_to_qdrant(file_name):
-    
-    # Read the CSV file into a DataFrame
-    input_path = os.path.join(os.path.dirname(__file__), f"../data/processed/{file_name}")
-    df = pd.read_csv(input_path, dtype=str)
-    
-    # Replacing NaN values by None values
-    df = df.where(pd.notnull(df), None)
+def generate_points(file_name, batch_size=256, dimensions=None):
+    """
+    Yield the points of the processed data one by one, so that only a batch is held in memory.
 
-    # Define vector columns
-    vector_columns = [col for col in df.columns if col.startswith('vector_')]
+    Args:
+    - file_name (str): The name of the raw CSV file.
+    - batch_size (int): The number of metadata rows decoded at once. Defaults to 256.
+    - dimensions (dict | None): The dimension each named vector is truncated to. Defaults to the full dimensions.
 
-    # Split the main DataFrame into two parts
-    df_vector = df[vector_columns]
-    df_non_vector = df.drop(columns=vector_columns)
-    del df # Delete the original DataFrame to free up memory
+    Yields:
+    - PointStruct: A point with its named vectors and payload, including the fields used by search filters.
+    """
+    dimensions = dimensions or {}
+    for idx, row, vectors in iter_processed_rows(file_name, batch_size=batch_size):
+        # Content hashes are only used by the embedding step and are not uploaded as payload
+        payload = {key: value for key, value in row.items() if not key.startswith('hash_')}
+        yield models.PointStruct(
+            id=idx,
+            vector={col: vector[:dimensions.get(col)].tolist() for col, vector in vectors.items()},
+            payload={**payload, **derive_filter_fields(row)},
+        )
+
+def make_version_name(alias_name):
+    """
+    Return the name of a new versioned collection behind the alias.
+
+    Names sort by creation time, to the microsecond, and end with a random suffix, so that
+    two uploads started at the same time never build into the same collection.
+    """
+    return f"{alias_name}_v{datetime.now().strftime('%Y%m%d%H%M%S%f')}_{uuid.uuid4().hex[:8]}"
+
+def get_alias_target(qdrant, alias_name):
+    """Return the collection the alias points to, or None if the alias does not exist."""
+    for alias in qdrant.get_aliases().aliases:
+        if alias.alias_name == alias_name:
+            return alias.collection_name
+    return None
+
+def warm_collection(qdrant, version_name, vector_names):
+    """Run one search per named vector so that the new collection is loaded before it receives traffic."""
+    points = qdrant.retrieve(collection_name=version_name, ids=[0], with_vectors=True, with_payload=False)
+    if not points:
+        return
+    for vector_name in vector_names:
+        qdrant.search(
+            collection_name=version_name,
+            query_vector=(vector_name, points[0].vector[vector_name]),
+            limit=1,
+            with_payload=True,
+        )
+
+def swap_alias(qdrant, alias_name, version_name):
+    """
+    Atomically point the alias to the new versioned collection.
+
+    A plain collection named like the alias (created by earlier versions of this script)
+    is dropped first, since a collection and an alias can not share a name.
+    """
+    if alias_name in [collection.name for collection in qdrant.get_collections().collections]:
+        qdrant.delete_collection(alias_name)
 
-    # Convert string representations of lists to actual lists
-    for col in vector_columns:
-        df_vector[col] = df_vector[col].apply(ast.literal_eval)
+    operations = []
+    if get_alias_target(qdrant, alias_name) is not None:
+        operations.append(models.DeleteAliasOperation(delete_alias=models.DeleteAlias(alias_name=alias_name)))
+    operations.append(models.CreateAliasOperation(
+        create_alias=models.CreateAlias(collection_name=version_name, alias_name=alias_name)
+    ))
+    qdrant.update_collection_aliases(change_aliases_operations=operations)
+
+def delete_old_versions(qdrant, alias_name, keep=1):
+    """Delete the versioned collections behind the alias, except the current one and the `keep` most recent others."""
+    current = get_alias_target(qdrant, alias_name)
+    versions = sorted(
+        collection.name for collection in qdrant.get_collections().collections
+        if collection.name.startswith(f"{alias_name}_v") and collection.name != current
+    )
+    for version_name in versions[:max(len(versions) - keep, 0)]:
+        qdrant.delete_collection(version_name)
+        print(f"Deleted old collection {version_name}")
+
+def upload_data_to_qdrant(file_name, batch_size=upload_batch_size, parallel=upload_parallel):
+
+    # Read the number of rows and the vector dimensions without loading the data
+    manifest = load_manifest(file_name)
 
     # Initialize QdrantClient with provided credentials
     qdrant = QdrantClient(
@@ -42,33 +115,52 @@ def upload_data_to_qdrant(file_name):
         prefer_grpc=True,
     )
 
-    # Define vector configuration for each column
-    vectors_config = {
-        col: models.VectorParams(
+    # Define vector configuration for each column, with its truncated dimension and quantization
+    dimensions = {
+        col: truncated_dimension(vector_dimensions, col, dimension)
+        for col, dimension in manifest["vectors"].items()
+    }
+    vectors_config = {}
+    for col, dimension in dimensions.items():
+        mode = get_quantization_mode(vector_quantization, col)
+        quantization = quantization_config(mode)
+        vectors_config[col] = models.VectorParams(
             distance=models.Distance.COSINE,
-            size=openai_embedding_dimension,
+            size=dimension,
+            quantization_config=quantization,
+            # Quantized vectors stay in RAM, the originals are only read from disk for rescoring
+            on_disk=True if quantization is not None else None,
         )
-        for col in vector_columns
-    }
+        print(f"{col}: {dimension} dimensions, {mode} quantization")
 
-    # Recreate the collection in Qdrant
-    qdrant.recreate_collection(
-        collection_name=collection_name,
+    # Build into a new versioned collection, the live one keeps serving searches meanwhile
+    version_name = make_version_name(collection_name)
+    qdrant.create_collection(
+        collection_name=version_name,
         vectors_config=vectors_config
     )
 
-    # Upload data to the collection
+    # Index the payload fields of the search filters, so that filtered searches stay fast
+    for field_name, field_schema in FILTER_PAYLOAD_INDEXES.items():
+        qdrant.create_payload_index(collection_name=version_name, field_name=field_name, field_schema=field_schema, wait=True)
+
+    # Stream the points to the collection in fixed-size batches sent by parallel workers
+    start_time = time.time()
     qdrant.upload_points(
-        collection_name=collection_name,
-        points=[
-            models.PointStruct(
-                id=idx, 
-                vector={key: value for key, value in df_vector.loc[idx].items()},
-                payload={key: value for key, value in df_non_vector.loc[idx].items()},
-            )
-            for idx in tqdm(df_non_vector.index)
-        ],
+        collection_name=version_name,
+        points=tqdm(generate_points(file_name, batch_size, dimensions), total=manifest["rows"]),
+        batch_size=batch_size,
+        parallel=parallel,
+        wait=True,
     )
+    elapsed = time.time() - start_time
+    print(f"Uploaded {manifest['rows']} points in {elapsed:.2f}s ({manifest['rows'] / max(elapsed, 1e-9):.1f} points/s)")
+
+    # Warm the new version, move the alias to it and drop the versions no longer needed
+    warm_collection(qdrant, version_name, list(manifest["vectors"]))
+    swap_alias(qdrant, collection_name, version_name)
+    print(f"Alias {collection_name} now points to {version_name}")
+    delete_old_versions(qdrant, collection_name, keep=keep_versions)
 
 if __name__ == "__main__":
     # var = input("Please enter the file name to upload (it should include '.csv' in the name): ")
@@ -0,0 +1,261 @@
+import time
+import asyncio
+from qdrant_client import AsyncQdrantClient
+from utils.embedder import AsyncOpenAIEmbedder
+from utils.filters import SearchFilter
+from utils.metrics import METRICS
+from utils.reranking import fuse_rankings
+from utils.searcher import FUSION_MODES, NeuralSearcher
+from utils.single_flight import AsyncSingleFlight
+
+class AsyncNeuralSearcher(NeuralSearcher):
+    """Asynchronous NeuralSearcher using AsyncQdrantClient and an async OpenAI embeddings client."""
+
+    def create_qdrant_client(self):
+        """Create the async Qdrant client used for searches."""
+        return AsyncQdrantClient(url=self.qdrant_url, api_key=self.qdrant_api_key, prefer_grpc=True)
+
+    def create_embedder(self):
+        """Create the async embedder used for queries."""
+        return AsyncOpenAIEmbedder()
+
+    def create_single_flight(self):
+        """Create the single-flight group used to coalesce concurrent coroutines."""
+        return AsyncSingleFlight()
+
+    async def close(self):
+        """Close the Qdrant and OpenAI connections."""
+        await self.qdrant_client.close()
+        await self.openai_embedder.close()
+
+    async def resolve_collection_version(self) -> str:
+        """See NeuralSearcher.resolve_collection_version."""
+        if self.local_index is not None:
+            # Reading a new version of the processed data must not block the event loop
+            return await asyncio.to_thread(self.local_index.reload)
+        METRICS.count("qdrant_requests_total", method="get_aliases")
+        return self.find_alias_target(await self.qdrant_client.get_aliases())
+
+    async def check_collection_version(self, force: bool = False) -> bool:
+        """See NeuralSearcher.check_collection_version."""
+        if not self.version_check_due(force):
+            return False
+        version = await self.resolve_collection_version()
+        # The version listeners reload the payload store and the lexical index from disk
+        return await asyncio.to_thread(self.set_collection_version, version)
+
+    async def embed_queries(self, queries: list[str]) -> dict:
+        """See NeuralSearcher.embed_queries."""
+        with METRICS.timer("embedding"):
+            query_vectors, missing = self.lookup_embeddings(queries)
+
+            # Embed every cache miss not already in flight in one batched request
+            if missing:
+                embeddings = await self.embedding_flight.do_many(self.embedding_keys(missing), self.embed_texts)
+                self.store_embeddings(missing, embeddings, query_vectors)
+
+        return query_vectors
+
+    async def embed_texts(self, keys: list[tuple]) -> list:
+        """See NeuralSearcher.embed_texts."""
+        return await self.openai_embedder.get_embeddings([text for _, text in keys])
+
+    async def search(self,
+                     text: str,
+                     vector_name: str,
+                     limit: int = 3,
+                     query_vector: list[float] | None = None,
+                     with_payload: bool | list[str] = False,
+                     search_filter: SearchFilter | None = None):
+        """See NeuralSearcher.search."""
+        if query_vector is None:
+            query_vector = (await self.embed_queries([text]))[text]
+
+        if self.local_index is not None:
+            points = self.local_index.search([(text, vector_name)], {text: query_vector}, limit, search_filter=search_filter)[0]
+            return self.attach_payloads(points, with_payload)
+
+        METRICS.count("qdrant_requests_total", method="search")
+        return await self.qdrant_client.search(
+            collection_name=self.collection_name,
+            query_vector=(vector_name, self.vector_query(vector_name, query_vector)),
+            query_filter=self.qdrant_filter(search_filter),
+            limit=limit,
+            search_params=self.vector_search_params(vector_name),
+            with_vectors=False,
+            with_payload=with_payload
+        )
+
+    async def search_batch(self, pairs: list[tuple], query_vectors: dict, limit: int = 3, search_filter: SearchFilter | None = None):
+        """See NeuralSearcher.search_batch."""
+        requests = self.build_search_requests(pairs, query_vectors, limit, search_filter)
+        METRICS.count("qdrant_requests_total", method="search_batch")
+        return await self.qdrant_client.search_batch(collection_name=self.collection_name, requests=requests)
+
+    async def search_fanout(self, pairs: list[tuple], query_vectors: dict, limit: int = 3, search_filter: SearchFilter | None = None):
+        """Search every (query, vector name) pair with one concurrent request each."""
+        return await asyncio.gather(*[
+            self.search(text=query, vector_name=col, limit=limit, query_vector=query_vectors[query], search_filter=search_filter)
+            for query, col in pairs
+        ])
+
+    async def search_pairs(self,
+                           queries: list[str],
+                           embed_columns: list[str],
+                           limit_per_vec: int = 3,
+                           mode: str | None = None,
+                           search_filter: SearchFilter | None = None):
+        """See NeuralSearcher.search_pairs."""
+        mode = self.get_search_mode(mode)
+
+        # Pick up a new collection version behind the alias
+        await self.check_collection_version()
+
+        # Embed each distinct query once and reuse it for every vector
+        query_vectors = await self.embed_queries(queries)
+        pairs = [(query, col) for query in query_vectors for col in embed_columns]
+
+        start_time = time.perf_counter()
+        if self.local_index is not None:
+            mode = "local"
+            results = self.local_index.search(pairs, query_vectors, limit_per_vec, search_filter=search_filter)
+        elif mode == "batch":
+            results = await self.search_batch(pairs, query_vectors, limit_per_vec, search_filter)
+        else:
+            results = await self.search_fanout(pairs, query_vectors, limit_per_vec, search_filter)
+        self.record_latency(mode, time.perf_counter() - start_time)
+
+        return dict(zip(pairs, results))
+
+    async def search_fused(self,
+                           queries: list[str],
+                           embed_columns: list[str],
+                           limit: int = 3,
+                           threshold: float = 0.0,
+                           limit_per_vec: int = 3,
+                           fusion: str = "rrf",
+                           with_payload: bool | list[str] = False,
+                           search_filter: SearchFilter | None = None):
+        """See NeuralSearcher.search_fused."""
+        if fusion not in FUSION_MODES:
+            raise ValueError("Invalid fusion mode: {}".format(fusion))
+
+        # Pick up a new collection version behind the alias
+        await self.check_collection_version()
+
+        # Embed each distinct query once and reuse it for every vector
+        query_vectors = await self.embed_queries(queries)
+
+        start_time = time.perf_counter()
+        if self.local_index is not None:
+            points = self.local_index.search_fused(query_vectors, embed_columns, limit, threshold, limit_per_vec, fusion,
+                                                   with_payload, search_filter)
+            self.record_latency(f"local_fusion_{fusion}", time.perf_counter() - start_time)
+            return points
+
+        METRICS.count("qdrant_requests_total", method="query_points")
+        response = await self.qdrant_client.query_points(
+            **self.build_fused_query(query_vectors, embed_columns, limit, threshold, limit_per_vec, fusion, with_payload,
+                                     search_filter)
+        )
+        self.record_latency(f"fusion_{fusion}", time.perf_counter() - start_time)
+
+        return response.points
+
+    async def search_hybrid(self,
+                            queries: list[str],
+                            embed_columns: list[str],
+                            limit: int = 3,
+                            threshold: float = 0.0,
+                            limit_per_vec: int = 3,
+                            mode: str | None = None,
+                            lexical: str = "hybrid",
+                            search_filter: SearchFilter | None = None):
+        """See NeuralSearcher.search_hybrid."""
+        # Building the lexical index on first use reads the processed data, off the event loop
+        await asyncio.to_thread(self.get_lexical_index)
+        lexical_rankings = self.search_lexical(queries, search_filter)
+        if lexical == "auto" and self.is_lexical_confident(lexical_rankings):
+            METRICS.count("search_lexical_total", path="lexical_only")
+            return fuse_rankings(list(lexical_rankings.values()), limit)
+
+        METRICS.count("search_lexical_total", path="hybrid")
+        results = await self.search_pairs(queries, embed_columns, limit_per_vec, mode, search_filter)
+        return self.fuse_hybrid(results, lexical_rankings, limit, threshold)
+
+    async def get_context(self,
+                          queries: list[str],
+                          embed_columns: list[str],
+                          limit_per_vec: int = 3,
+                          mode: str | None = None,
+                          search_filter: SearchFilter | None = None):
+        """See NeuralSearcher.get_context."""
+        results = await self.search_pairs(queries, embed_columns, limit_per_vec, mode, search_filter)
+        return [point for points in results.values() for point in points]
+
+    async def get_context_reranked(self,
+                                   queries: list[str],
+                                   embed_columns: list[str],
+                                   limit: int = 3,
+                                   threshold: float = 0.5,
+                                   limit_per_vec: int = 3,
+                                   columns: list[str] = ["id",
+                                                         "score",
+                                                         "promotion_title",
+                                                         "summary_text"],
+                                   mode: str | None = None,
+                                   fusion: str | None = None,
+                                   search_filter: SearchFilter | None = None,
+                                   lexical: str | None = None):
+        """See NeuralSearcher.get_context_reranked."""
+        fusion = fusion or self.fusion
+        lexical = self.get_lexical_mode(lexical)
+
+        # Answer repeated searches from the result cache, once the alias has been checked
+        await self.check_collection_version()
+        key = self.result_cache.make_key(queries, embed_columns, limit=limit, threshold=threshold,
+                                         limit_per_vec=limit_per_vec, columns=tuple(columns), fusion=fusion,
+                                         search_filter=search_filter.key() if search_filter is not None else None,
+                                         lexical=lexical)
+        result = self.result_cache.get(key)
+        if result is None:
+            # Identical searches arriving meanwhile wait for this one instead of searching again
+            async def compute():
+                result = await self.rerank_context(queries, embed_columns, limit, threshold, limit_per_vec, columns, mode, fusion,
+                                                   search_filter, lexical)
+                self.result_cache.put(key, result)
+                return result
+            result = [dict(record) for record in await self.search_flight.do(key, compute)]
+        return result
+
+    async def rerank_context(self, queries, embed_columns, limit, threshold, limit_per_vec, columns, mode, fusion, search_filter=None,
+                             lexical="off"):
+        """See NeuralSearcher.rerank_context."""
+        payload_fields = [col for col in columns if col not in ["id", "score"]]
+        if lexical != "off":
+            points = await self.search_hybrid(queries, embed_columns, limit, threshold, limit_per_vec, mode, lexical, search_filter)
+        elif fusion:
+            points = await self.search_fused(queries, embed_columns, limit, threshold, limit_per_vec, fusion,
+                                             self.fused_payload(payload_fields), search_filter)
+        else:
+            scored_points = await self.get_context(queries, embed_columns, limit_per_vec, mode=mode, search_filter=search_filter)
+            points = self.rerank_points(scored_points, limit, threshold)
+
+        return self.points_to_records(points, columns, await self.fetch_payloads(points, payload_fields))
+
+    async def fetch_payloads(self, points, payload_fields: list[str]) -> dict:
+        """See NeuralSearcher.fetch_payloads."""
+        ids = self.payload_ids(points, payload_fields)
+        if not ids:
+            return {}
+        with METRICS.timer("payload"):
+            if self.payload_store is not None:
+                return self.payload_store.get_payloads(ids, payload_fields)
+            METRICS.count("qdrant_requests_total", method="retrieve")
+            retrieved = await self.qdrant_client.retrieve(
+                collection_name=self.collection_name,
+                ids=ids,
+                with_payload=payload_fields,
+                with_vectors=False,
+            )
+            return {point.id: point.payload for point in retrieved}
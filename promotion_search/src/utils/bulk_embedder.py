@@ -0,0 +1,189 @@
+import os
+import json
+import time
+import random
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import openai
+from tqdm import tqdm
+from utils.embedder import OpenAIEmbedder
+
+class TokenBucket:
+    """Thread-safe token bucket refilled continuously at a per-minute rate."""
+
+    def __init__(self, per_minute: float):
+        """
+        Initialize the TokenBucket.
+
+        Args:
+        - per_minute (float): The number of units allowed per minute, also used as the bucket capacity.
+        """
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.available = float(per_minute)
+        self.updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, amount: float = 1) -> None:
+        """Block until the given amount can be taken from the bucket."""
+        amount = min(amount, self.capacity)
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.available = min(self.capacity, self.available + (now - self.updated_at) * self.rate)
+                self.updated_at = now
+                if self.available >= amount:
+                    self.available -= amount
+                    return
+                wait = (amount - self.available) / self.rate
+            time.sleep(wait)
+
+class BulkEmbedder:
+    """Embed large lists of texts with a bounded pool of workers sending batched requests."""
+
+    RETRYABLE_ERRORS = (openai.RateLimitError, openai.APIConnectionError, openai.APITimeoutError, openai.InternalServerError)
+
+    def __init__(self,
+                 embedder: OpenAIEmbedder | None = None,
+                 max_workers: int | None = None,
+                 requests_per_minute: int | None = None,
+                 tokens_per_minute: int | None = None,
+                 max_retries: int = 6,
+                 checkpoint_path: str | None = None):
+        """
+        Initialize the BulkEmbedder.
+
+        Args:
+        - embedder (OpenAIEmbedder | None): The embedder used to tokenize, batch and send requests. Defaults to a new OpenAIEmbedder.
+        - max_workers (int | None): The number of concurrent requests. Defaults to EMBEDDING_WORKERS or 4.
+        - requests_per_minute (int | None): The request rate limit. Defaults to OPENAI_EMBEDDING_RPM or 3000.
+        - tokens_per_minute (int | None): The token rate limit. Defaults to OPENAI_EMBEDDING_TPM or 1000000.
+        - max_retries (int): The number of retries of a failed request. Defaults to 6.
+        - checkpoint_path (str | None): A JSON lines file where finished embeddings are saved so that an
+          interrupted run can resume. Defaults to None (no checkpoint).
+        """
+        self.embedder = embedder or OpenAIEmbedder()
+        self.max_workers = max_workers or int(os.environ.get('EMBEDDING_WORKERS', 4))
+        self.request_bucket = TokenBucket(requests_per_minute or int(os.environ.get('OPENAI_EMBEDDING_RPM', 3000)))
+        self.token_bucket = TokenBucket(tokens_per_minute or int(os.environ.get('OPENAI_EMBEDDING_TPM', 1000000)))
+        self.max_retries = max_retries
+        self.checkpoint_path = checkpoint_path
+        self._checkpoint_lock = threading.Lock()
+        # stats are updated from the worker threads too
+        self._stats_lock = threading.Lock()
+        self.stats = {}
+
+    def count(self, name: str, amount=1) -> None:
+        """Add to a counter of the stats of the current run."""
+        with self._stats_lock:
+            self.stats[name] += amount
+
+    @staticmethod
+    def input_key(model: str, text: str) -> str:
+        """Return the checkpoint key of an input text."""
+        return hashlib.sha256(f"{model}\0{text}".encode("utf-8")).hexdigest()
+
+    def load_checkpoint(self) -> dict:
+        """Load the embeddings saved by a previous, interrupted run."""
+        done = {}
+        if self.checkpoint_path and os.path.exists(self.checkpoint_path):
+            with open(self.checkpoint_path, "r") as f:
+                for line in f:
+                    try:
+                        item = json.loads(line)
+                    except json.JSONDecodeError:
+                        # The last line may be cut short by the interruption
+                        continue
+                    done[item["key"]] = item["embedding"]
+        return done
+
+    def save_checkpoint(self, keys: list[str], embeddings: list) -> None:
+        """Append the embeddings of a finished batch to the checkpoint file."""
+        if not self.checkpoint_path:
+            return
+        with self._checkpoint_lock:
+            with open(self.checkpoint_path, "a") as f:
+                for key, embedding in zip(keys, embeddings):
+                    f.write(json.dumps({"key": key, "embedding": embedding}) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+
+    def embed_with_retry(self, inputs: list[str], n_tokens: int, model: str) -> list:
+        """Send one throttled batch request, retrying rate limits and server errors with jittered backoff."""
+        for attempt in range(self.max_retries + 1):
+            self.request_bucket.acquire(1)
+            self.token_bucket.acquire(n_tokens)
+            try:
+                return self.embedder.embed_batch(inputs, model=model)
+            except self.RETRYABLE_ERRORS as e:
+                if attempt == self.max_retries:
+                    raise
+                delay = random.uniform(0, min(60.0, 2.0 ** attempt))
+                self.count("retries")
+                tqdm.write(f"Embedding request failed ({type(e).__name__}), retrying in {delay:.1f}s")
+                time.sleep(delay)
+
+    def embed(self, texts: list[str], model: str | None = None, overflow: str = "truncate") -> list:
+        """
+        Embed a list of texts with concurrent, rate-limited batch requests.
+
+        Args:
+        - texts (list[str]): The texts to embed.
+        - model (str | None): The embedding model. Defaults to OPENAI_EMBEDDING_MODEL.
+        - overflow (str): "truncate" or "split", see OpenAIEmbedder.get_embeddings. Defaults to "truncate".
+
+        Returns:
+        - list[list[float]]: The embeddings, in the same order as the texts.
+        """
+        model = model or self.embedder.OPENAI_EMBEDDING_MODEL
+        start_time = time.time()
+        self.stats = {"requests": 0, "retries": 0, "tokens": 0, "resumed": 0, "elapsed": 0.0}
+
+        pieces, owners, token_counts = self.embedder.prepare_inputs(texts, overflow)
+        keys = [self.input_key(model, piece) for piece in pieces]
+        piece_embeddings = [None] * len(pieces)
+
+        # Reuse the embeddings finished by a previous run
+        done = self.load_checkpoint()
+        for i, key in enumerate(keys):
+            if key in done:
+                piece_embeddings[i] = done[key]
+        self.stats["resumed"] = sum(embedding is not None for embedding in piece_embeddings)
+        del done
+
+        remaining = [i for i, embedding in enumerate(piece_embeddings) if embedding is None]
+        batches = [[remaining[j] for j in batch]
+                   for batch in self.embedder.pack_batches([token_counts[i] for i in remaining])]
+
+        def run_batch(batch):
+            n_tokens = sum(token_counts[i] for i in batch)
+            embeddings = self.embed_with_retry([pieces[i] for i in batch], n_tokens, model)
+            self.save_checkpoint([keys[i] for i in batch], embeddings)
+            return batch, embeddings, n_tokens
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = [executor.submit(run_batch, batch) for batch in batches]
+            for future in tqdm(as_completed(futures), total=len(futures), desc="Embedding batches"):
+                batch, embeddings, n_tokens = future.result()
+                for i, embedding in zip(batch, embeddings):
+                    piece_embeddings[i] = embedding
+                self.count("requests")
+                self.count("tokens", n_tokens)
+
+        # Every input is embedded, the checkpoint is no longer needed
+        if self.checkpoint_path and os.path.exists(self.checkpoint_path):
+            os.remove(self.checkpoint_path)
+
+        self.stats["elapsed"] = time.time() - start_time
+        return self.embedder.combine_pieces(len(texts), owners, token_counts, piece_embeddings)
+
+    def report(self, n_rows: int) -> str:
+        """Return a throughput summary of the last run for the given number of rows."""
+        elapsed = max(self.stats.get("elapsed", 0.0), 1e-9)
+        return (
+            f"Embedded {n_rows} rows in {elapsed:.2f}s "
+            f"({n_rows / elapsed:.1f} rows/s, {self.stats['tokens'] / elapsed:.0f} tokens/s, "
+            f"{self.stats['requests']} requests, {self.stats['retries']} retries, "
+            f"{self.stats['resumed']} inputs resumed from checkpoint)"
+        )
@@ -0,0 +1,159 @@
+import os
+import time
+import threading
+from collections import OrderedDict
+from dotenv import load_dotenv
+from utils.embedder import normalize_text
+
+# Load environment variables
+load_dotenv()
+
+class LRUCache:
+    """Thread-safe LRU cache with a time-to-live and hit/miss/eviction counters."""
+
+    def __init__(self, max_size: int = 4096, ttl: float = 3600.0):
+        """
+        Initialize the LRUCache.
+
+        Args:
+        - max_size (int): The maximum number of entries to keep. Defaults to 4096.
+        - ttl (float): The number of seconds an entry stays valid. Defaults to 3600.
+        """
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_key(self, key):
+        """
+        Get the cached value of a key.
+
+        Args:
+        - key (Hashable): The key of the entry.
+
+        Returns:
+        - Any | None: The value, or None if it is missing or expired.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    del self._entries[key]
+                    self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put_key(self, key, value) -> None:
+        """
+        Store a value, evicting the least recently used entries if full.
+
+        Args:
+        - key (Hashable): The key of the entry.
+        - value (Any): The value to cache.
+        """
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self) -> None:
+        """Remove every cached entry."""
+        with self._lock:
+            self._entries.clear()
+            self.invalidations += 1
+
+    def get_stats(self) -> dict:
+        """Return the size and the counters of the cache."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "invalidations": self.invalidations,
+            }
+
+class EmbeddingCache(LRUCache):
+    """LRU cache of query embeddings keyed by (model, normalized text)."""
+
+    @staticmethod
+    def normalize(text: str) -> str:
+        """
+        Normalize a text exactly the way the embedder does, so that two texts share an
+        entry only if the embedder would send the same input for both.
+        """
+        return normalize_text(text)
+
+    def get(self, model: str, text: str):
+        """
+        Get the cached embedding of a text.
+
+        Args:
+        - model (str): The name of the embedding model.
+        - text (str): The text that was embedded.
+
+        Returns:
+        - list[float] | None: The embedding, or None if it is missing or expired.
+        """
+        return self.get_key((model, self.normalize(text)))
+
+    def put(self, model: str, text: str, embedding) -> None:
+        """
+        Store the embedding of a text.
+
+        Args:
+        - model (str): The name of the embedding model.
+        - text (str): The text that was embedded.
+        - embedding (list[float]): The embedding of the text.
+        """
+        self.put_key((model, self.normalize(text)), embedding)
+
+class ResultCache(LRUCache):
+    """LRU cache of reranked search results, keyed by the normalized query set and the search parameters."""
+
+    @staticmethod
+    def make_key(queries: list[str], embed_columns: list[str], **params):
+        """
+        Build the cache key of a search.
+
+        The queries are whitespace-collapsed, case-folded, deduplicated and sorted, and the
+        vector names are sorted, since none of that changes the reranked result.
+
+        Args:
+        - queries (list[str]): A list of queries.
+        - embed_columns (list[str]): A list of embedding columns name.
+        - params: The other search parameters (limit, threshold, ...), as hashable values.
+
+        Returns:
+        - tuple: The cache key.
+        """
+        normalized = tuple(sorted({" ".join(query.split()).casefold() for query in queries}))
+        return (normalized, tuple(sorted(set(embed_columns))), tuple(sorted(params.items())))
+
+    def get(self, key):
+        """Get a copy of the cached result of a search, or None."""
+        result = self.get_key(key)
+        return None if result is None else [dict(record) for record in result]
+
+    def put(self, key, result: list[dict]) -> None:
+        """Store a copy of the result of a search."""
+        self.put_key(key, [dict(record) for record in result])
+
+# Process-wide cache shared by every searcher
+EMBEDDING_CACHE = EmbeddingCache(
+    max_size=int(os.environ.get('EMBEDDING_CACHE_SIZE', 4096)),
+    ttl=float(os.environ.get('EMBEDDING_CACHE_TTL', 3600)),
+)
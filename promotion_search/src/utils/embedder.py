@@ -1,18 +1,34 @@
 import os
+import asyncio
+import httpx
+import numpy as np
 from dotenv import load_dotenv
-from openai import OpenAI
+from openai import AsyncOpenAI, OpenAI
 import tiktoken
+from utils.metrics import METRICS
 
 # Load environment variables
 load_dotenv()
 
+def normalize_text(text: str) -> str:
+    """Return the text the embedder actually sends for a text: newlines are replaced by spaces."""
+    return text.replace("\n", " ")
+
 class OpenAIEmbedder:
     def __init__(self):
         self.OPENAI_API_KEY = os.environ.get('OPENAI_API_KEY')
         self.OPENAI_EMBEDDING_MODEL = os.environ.get('OPENAI_EMBEDDING_MODEL')
         self.OPENAI_EMBEDDING_ENCODING = os.environ.get('OPENAI_EMBEDDING_ENCODING')
         self.OPENAI_MAX_TOKENS_ENCODING = int(os.environ.get('OPENAI_MAX_TOKENS_ENCODING'))
-        self.openai_client = OpenAI(api_key=self.OPENAI_API_KEY)
+        # Per-request limits of the embeddings endpoint
+        self.OPENAI_EMBEDDING_MAX_BATCH_SIZE = int(os.environ.get('OPENAI_EMBEDDING_MAX_BATCH_SIZE', 2048))
+        self.OPENAI_EMBEDDING_MAX_BATCH_TOKENS = int(os.environ.get('OPENAI_EMBEDDING_MAX_BATCH_TOKENS', 300000))
+        self.openai_client = self.create_client()
+        self.encoding = tiktoken.get_encoding(self.OPENAI_EMBEDDING_ENCODING)
+
+    def create_client(self):
+        """Create the OpenAI client used for embedding requests."""
+        return OpenAI(api_key=self.OPENAI_API_KEY)
 
     def get_embedding(self, text, model=None):
         """Get the embedding for the given text using the specified model."""
@@ -20,18 +36,174 @@ class OpenAIEmbedder:
         text = text.replace("\n", " ")
         return self.openai_client.embeddings.create(input=[text], model=model).data[0].embedding
 
+    def get_embeddings(self, texts, model=None, overflow="truncate"):
+        """
+        Get the embeddings for a list of texts, packing them into as few requests as possible.
+
+        Args:
+        - texts (list[str]): The texts to embed.
+        - model (str | None): The embedding model. Defaults to OPENAI_EMBEDDING_MODEL.
+        - overflow (str): What to do with texts over OPENAI_MAX_TOKENS_ENCODING tokens.
+          "truncate" keeps the leading tokens, "split" embeds every chunk and averages them.
+          Defaults to "truncate".
+
+        Returns:
+        - list[list[float]]: The embeddings, in the same order as the texts.
+        """
+        model = model or self.OPENAI_EMBEDDING_MODEL
+        pieces, owners, token_counts = self.prepare_inputs(texts, overflow)
+
+        # Embed the pieces batch by batch
+        piece_embeddings = []
+        for batch in self.pack_batches(token_counts):
+            piece_embeddings.extend(self.embed_batch([pieces[i] for i in batch], model=model))
+
+        return self.combine_pieces(len(texts), owners, token_counts, piece_embeddings)
+
+    def prepare_inputs(self, texts, overflow="truncate"):
+        """
+        Tokenize the texts once and cut them into inputs that fit the per-input token limit.
+
+        Args:
+        - texts (list[str]): The texts to embed.
+        - overflow (str): "truncate" or "split", see get_embeddings. Defaults to "truncate".
+
+        Returns:
+        - tuple: The input strings, the index of the text each input belongs to and the token count of each input.
+        """
+        if overflow not in ["truncate", "split"]:
+            raise ValueError("Invalid overflow mode: {}".format(overflow))
+
+        pieces, owners, token_counts = [], [], []
+        for index, text in enumerate(texts):
+            text = normalize_text(text)
+            # The endpoint rejects empty inputs, failing the whole request: fail before sending it
+            if not text.strip():
+                raise ValueError("Text {} is empty, it can not be embedded".format(index))
+            tokens = self.encoding.encode(text)
+            if len(tokens) <= self.OPENAI_MAX_TOKENS_ENCODING:
+                chunks = [text]
+                lengths = [len(tokens)]
+            elif overflow == "truncate":
+                chunks = [self.encoding.decode(tokens[:self.OPENAI_MAX_TOKENS_ENCODING])]
+                lengths = [self.OPENAI_MAX_TOKENS_ENCODING]
+            else:
+                step = self.OPENAI_MAX_TOKENS_ENCODING
+                chunks = [self.encoding.decode(tokens[i:i + step]) for i in range(0, len(tokens), step)]
+                lengths = [len(tokens[i:i + step]) for i in range(0, len(tokens), step)]
+
+            for chunk, length in zip(chunks, lengths):
+                pieces.append(chunk)
+                owners.append(index)
+                token_counts.append(length)
+
+        return pieces, owners, token_counts
+
+    def pack_batches(self, token_counts):
+        """
+        Group consecutive inputs into batches under the per-request item and token limits.
+
+        Args:
+        - token_counts (list[int]): The token count of each input.
+
+        Returns:
+        - list[list[int]]: The input indices of each batch.
+        """
+        batches = []
+        batch, batch_tokens = [], 0
+        for index, count in enumerate(token_counts):
+            if batch and (len(batch) >= self.OPENAI_EMBEDDING_MAX_BATCH_SIZE
+                          or batch_tokens + count > self.OPENAI_EMBEDDING_MAX_BATCH_TOKENS):
+                batches.append(batch)
+                batch, batch_tokens = [], 0
+            batch.append(index)
+            batch_tokens += count
+        if batch:
+            batches.append(batch)
+        return batches
+
+    def embed_batch(self, inputs, model=None):
+        """Send one embeddings request and return the vectors in input order."""
+        model = model or self.OPENAI_EMBEDDING_MODEL
+        METRICS.count("openai_requests_total", endpoint="embeddings")
+        METRICS.count("openai_embedding_inputs_total", amount=len(inputs))
+        response = self.openai_client.embeddings.create(input=inputs, model=model)
+        return [item.embedding for item in sorted(response.data, key=lambda item: item.index)]
+
+    @staticmethod
+    def combine_pieces(n_texts, owners, token_counts, piece_embeddings):
+        """Merge the embeddings of split texts into one vector per text, weighted by token count."""
+        if len(owners) == n_texts:
+            return piece_embeddings
+
+        embeddings = [None] * n_texts
+        for owner, count, embedding in zip(owners, token_counts, piece_embeddings):
+            vector = np.asarray(embedding, dtype=np.float64) * count
+            embeddings[owner] = vector if embeddings[owner] is None else embeddings[owner] + vector
+
+        result = []
+        for embedding in embeddings:
+            norm = np.linalg.norm(embedding)
+            result.append((embedding / norm if norm > 0 else embedding).tolist())
+        return result
+
     def count_tokens(self, text, model=None):
         """Count the number of tokens in the given text using the specified encoding."""
-        model = model or self.OPENAI_EMBEDDING_ENCODING
-        encoding = tiktoken.get_encoding(model)
+        if model is None or model == self.OPENAI_EMBEDDING_ENCODING:
+            encoding = self.encoding
+        else:
+            encoding = tiktoken.get_encoding(model)
         return len(encoding.encode(text))
 
     def check_token_length(self, text):
         """Check if the number of tokens in the text is within the maximum limit."""
         return self.count_tokens(text) <= self.OPENAI_MAX_TOKENS_ENCODING
 
+class AsyncOpenAIEmbedder(OpenAIEmbedder):
+    """Asynchronous embedder whose requests share one pooled HTTP connection pool."""
+
+    def create_client(self):
+        """Create the async OpenAI client, with a connection pool sized by OPENAI_MAX_CONNECTIONS."""
+        max_connections = int(os.environ.get('OPENAI_MAX_CONNECTIONS', 100))
+        http_client = httpx.AsyncClient(
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+            timeout=httpx.Timeout(60.0, connect=5.0),
+        )
+        return AsyncOpenAI(api_key=self.OPENAI_API_KEY, http_client=http_client)
+
+    async def get_embedding(self, text, model=None):
+        """Get the embedding for the given text using the specified model."""
+        return (await self.get_embeddings([text], model=model))[0]
+
+    async def get_embeddings(self, texts, model=None, overflow="truncate"):
+        """Get the embeddings for a list of texts, see OpenAIEmbedder.get_embeddings."""
+        model = model or self.OPENAI_EMBEDDING_MODEL
+        pieces, owners, token_counts = self.prepare_inputs(texts, overflow)
+
+        # Send the batches concurrently
+        results = await asyncio.gather(*[
+            self.embed_batch([pieces[i] for i in batch], model=model)
+            for batch in self.pack_batches(token_counts)
+        ])
+        piece_embeddings = [embedding for embeddings in results for embedding in embeddings]
+
+        return self.combine_pieces(len(texts), owners, token_counts, piece_embeddings)
+
+    async def embed_batch(self, inputs, model=None):
+        """Send one embeddings request and return the vectors in input order."""
+        model = model or self.OPENAI_EMBEDDING_MODEL
+        METRICS.count("openai_requests_total", endpoint="embeddings")
+        METRICS.count("openai_embedding_inputs_total", amount=len(inputs))
+        response = await self.openai_client.embeddings.create(input=inputs, model=model)
+        return [item.embedding for item in sorted(response.data, key=lambda item: item.index)]
+
+    async def close(self):
+        """Close the connection pool."""
+        await self.openai_client.close()
+
 # Example usage:
 # embedder = OpenAIEmbedder()
 # print(embedder.get_embedding("example text"))
+# print(embedder.get_embeddings(["example text", "another text"]))
 # print(embedder.count_tokens("example text"))
 # print(embedder.check_token_length("example text"))
@@ -0,0 +1,141 @@
+import os
+from datetime import datetime, time, timedelta
+from zoneinfo import ZoneInfo
+from dotenv import load_dotenv
+from qdrant_client import models
+
+# Load environment variables
+load_dotenv()
+
+# Time zone of the dates of the raw data
+PROMOTION_TIMEZONE = ZoneInfo(os.environ.get('PROMOTION_TIMEZONE', 'Asia/Bangkok'))
+
+# Payload fields derived by the uploader for filtering, and their Qdrant payload index
+FILTER_PAYLOAD_INDEXES = {
+    "start_timestamp": models.PayloadSchemaType.INTEGER,
+    "end_timestamp": models.PayloadSchemaType.INTEGER,
+    "credit_cards": models.PayloadSchemaType.KEYWORD,
+    "promotion_category": models.PayloadSchemaType.KEYWORD,
+}
+
+# Columns of the processed data the filter fields are derived from
+FILTER_SOURCE_COLUMNS = ["start_date", "end_date", "credit_card", "promotion_category"]
+
+
+def parse_date_timestamp(value, end_of_day: bool = False) -> int | None:
+    """
+    Parse a YYYY-MM-DD date of the raw data to a Unix timestamp.
+
+    Args:
+    - value (str | None): The date.
+    - end_of_day (bool): Return the last second of the day instead of the first, for inclusive end dates. Defaults to False.
+
+    Returns:
+    - int | None: The timestamp in seconds, or None if the date is missing or invalid (e.g. "-").
+    """
+    try:
+        day = datetime.fromisoformat(str(value).strip()).date()
+    except ValueError:
+        return None
+    if end_of_day:
+        return int(datetime.combine(day + timedelta(days=1), time(), PROMOTION_TIMEZONE).timestamp()) - 1
+    return int(datetime.combine(day, time(), PROMOTION_TIMEZONE).timestamp())
+
+
+def normalize_card_name(name: str) -> str:
+    """
+    Return the keyword of a credit card name, so that "The Passion" in the raw data and
+    "KbankThePassion" in the user profiles match: case-folded, letters and digits only,
+    without the bank prefix.
+    """
+    key = "".join(char for char in str(name).casefold() if char.isalnum())
+    return key.removeprefix("kbank") or key
+
+
+def split_credit_cards(value) -> list[str]:
+    """
+    Split the credit_card field of the raw data, one card per line, into card keywords.
+
+    Args:
+    - value (str | None): The credit_card field.
+
+    Returns:
+    - list[str]: The distinct card keywords, in their original order.
+    """
+    keys = [normalize_card_name(line.strip(' "')) for line in str(value or "").splitlines()]
+    return list(dict.fromkeys(key for key in keys if key))
+
+
+def derive_filter_fields(row: dict) -> dict:
+    """Return the payload fields used by search filters, derived from a row of the processed data."""
+    return {
+        "start_timestamp": parse_date_timestamp(row.get("start_date")),
+        "end_timestamp": parse_date_timestamp(row.get("end_date"), end_of_day=True),
+        "credit_cards": split_credit_cards(row.get("credit_card")),
+    }
+
+
+class SearchFilter:
+    """
+    Restriction of a search to the promotions active at a time, valid for some cards or in some categories.
+
+    It is applied inside the vector search: as a Qdrant filter, or row by row by the local backend.
+    A promotion without a start or end date is not bounded on that side.
+    """
+
+    def __init__(self, active_at: int | None = None, cards: list[str] | None = None, categories: list[str] | None = None):
+        """
+        Initialize the SearchFilter.
+
+        Args:
+        - active_at (int | None): Keep the promotions active at this Unix timestamp. Defaults to None.
+        - cards (list[str] | None): Keep the promotions valid for any of these card names. Defaults to None.
+        - categories (list[str] | None): Keep the promotions of any of these categories. Defaults to None.
+        """
+        self.active_at = active_at
+        self.cards = sorted({normalize_card_name(card) for card in cards or []} - {""})
+        self.categories = sorted({category.strip() for category in categories or []} - {""})
+
+    def is_empty(self) -> bool:
+        """Return True if the filter keeps every promotion."""
+        return self.active_at is None and not self.cards and not self.categories
+
+    def key(self) -> tuple:
+        """Return a hashable value identifying the filter, for the result cache."""
+        return (self.active_at, tuple(self.cards), tuple(self.categories))
+
+    def to_qdrant(self) -> models.Filter:
+        """Return the equivalent Qdrant filter, using the payload indexes of FILTER_PAYLOAD_INDEXES."""
+        must = []
+        if self.active_at is not None:
+            for field, bound in [("start_timestamp", models.Range(lte=self.active_at)),
+                                 ("end_timestamp", models.Range(gte=self.active_at))]:
+                must.append(models.Filter(should=[
+                    models.FieldCondition(key=field, range=bound),
+                    models.IsEmptyCondition(is_empty=models.PayloadField(key=field)),
+                ]))
+        if self.cards:
+            must.append(models.FieldCondition(key="credit_cards", match=models.MatchAny(any=self.cards)))
+        if self.categories:
+            must.append(models.FieldCondition(key="promotion_category", match=models.MatchAny(any=self.categories)))
+        return models.Filter(must=must)
+
+    def matches(self, payload: dict) -> bool:
+        """Return True if a payload passes the filter, the same way as the Qdrant filter."""
+        if self.active_at is not None:
+            start, end = payload.get("start_timestamp"), payload.get("end_timestamp")
+            if (start is not None and start > self.active_at) or (end is not None and end < self.active_at):
+                return False
+        if self.cards and not set(self.cards) & set(payload.get("credit_cards") or []):
+            return False
+        if self.categories and payload.get("promotion_category") not in self.categories:
+            return False
+        return True
+
+
+def make_search_filter(active_at: int | None = None,
+                       cards: list[str] | None = None,
+                       categories: list[str] | None = None) -> SearchFilter | None:
+    """Return a SearchFilter, or None if it would keep every promotion."""
+    search_filter = SearchFilter(active_at, cards, categories)
+    return None if search_filter.is_empty() else search_filter
@@ -0,0 +1,190 @@
+import re
+import math
+import threading
+import unicodedata
+import numpy as np
+from collections import Counter
+from qdrant_client.models import ScoredPoint
+from utils.filters import FILTER_PAYLOAD_INDEXES, FILTER_SOURCE_COLUMNS, SearchFilter
+from utils.payload_store import metadata_to_payloads
+from utils.vector_store import load_processed_metadata, processed_version
+
+# Text fields of the processed data searched by the lexical index
+LEXICAL_FIELDS = ["promotion_title", "shop", "special_day", "summary_text"]
+
+# Runs of Thai characters, and runs of other letters and digits
+TOKEN_PATTERN = re.compile(r"([\u0E00-\u0E7F]+)|([^\W_\u0E00-\u0E7F]+)")
+
+# BM25 parameters: term frequency saturation and document length normalization
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+
+def tokenize(text: str) -> list[str]:
+    """
+    Split a text into lexical terms.
+
+    Thai is written without spaces between words, so Thai runs are split into overlapping
+    character bigrams, which match any Thai word or name without a dictionary. Other scripts
+    are split into words of letters and digits, e.g. "s24", "ultra". Text is NFKC-normalized
+    and case-folded.
+
+    Args:
+    - text (str): The text.
+
+    Returns:
+    - list[str]: The terms, in order and with repetitions.
+    """
+    terms = []
+    for thai, word in TOKEN_PATTERN.findall(unicodedata.normalize("NFKC", str(text or "")).casefold()):
+        if word:
+            terms.append(word)
+        elif len(thai) == 1:
+            terms.append(thai)
+        else:
+            terms.extend(thai[i:i + 2] for i in range(len(thai) - 1))
+    return terms
+
+
+def bm25_idf(documents: int, frequency: int) -> float:
+    """Return the BM25 inverse document frequency of a term found in `frequency` of `documents` documents."""
+    return math.log(1 + (documents - frequency + 0.5) / (frequency + 0.5))
+
+
+class LexicalSnapshot:
+    """An immutable inverted index of one version of the processed data, swapped as a whole on reload."""
+
+    def __init__(self, version: str, rows: int, postings: dict, payloads: list[dict]):
+        self.version = version
+        self.rows = rows
+        self.postings = postings
+        self.payloads = payloads
+
+class LexicalIndex:
+    """
+    In-memory BM25 inverted index over the text fields of the processed data of a raw file.
+
+    Each term maps to the sorted row numbers containing it and their precomputed BM25 term
+    weights, so scoring a query is one NumPy scatter-add per distinct query term.
+    Point ids are row numbers, as uploaded to Qdrant.
+    """
+
+    def __init__(self, file_name: str, k1: float = BM25_K1, b: float = BM25_B):
+        """
+        Initialize the LexicalIndex and build it from the current processed data.
+
+        Args:
+        - file_name (str): The name of the raw CSV file, e.g. promotions_with_summary.csv.
+        - k1 (float): The BM25 term frequency saturation. Defaults to 1.5.
+        - b (float): The BM25 document length normalization. Defaults to 0.75.
+        """
+        self.file_name = file_name
+        self.k1 = k1
+        self.b = b
+        self.snapshot = None
+        self._reload_lock = threading.Lock()
+        self.reload()
+
+    def reload(self) -> str:
+        """
+        Build the index again if the processed data changed since the last build.
+
+        Returns:
+        - str: The version of the indexed data.
+        """
+        with self._reload_lock:
+            version = processed_version(self.file_name)
+            if self.snapshot is None or self.snapshot.version != version:
+                self.snapshot = self.load(version)
+            return self.snapshot.version
+
+    def load(self, version: str) -> LexicalSnapshot:
+        """Tokenize the text fields of every row and build the postings with their BM25 weights."""
+        metadata = load_processed_metadata(self.file_name, columns=LEXICAL_FIELDS + FILTER_SOURCE_COLUMNS)
+        rows = metadata_to_payloads(metadata)
+        counts = [Counter(term for field in LEXICAL_FIELDS for term in tokenize(row.get(field))) for row in rows]
+
+        lengths = np.array([sum(count.values()) for count in counts], dtype=np.float32)
+        average_length = float(lengths.mean()) if len(rows) and lengths.mean() > 0 else 1.0
+        norms = self.k1 * (1 - self.b + self.b * lengths / average_length)
+
+        row_ids, frequencies = {}, {}
+        for row_id, count in enumerate(counts):
+            for term, frequency in count.items():
+                row_ids.setdefault(term, []).append(row_id)
+                frequencies.setdefault(term, []).append(frequency)
+
+        postings = {}
+        for term, ids in row_ids.items():
+            ids = np.array(ids, dtype=np.int64)
+            tf = np.array(frequencies[term], dtype=np.float32)
+            idf = bm25_idf(len(rows), len(ids))
+            postings[term] = (ids, idf * tf * (self.k1 + 1) / (tf + norms[ids]), idf)
+
+        # Only the fields of the search filters are kept per row
+        payloads = [{field: row.get(field) for field in FILTER_PAYLOAD_INDEXES} for row in rows]
+        return LexicalSnapshot(version, len(rows), postings, payloads)
+
+    def search(self, query: str, limit: int = 10, search_filter: SearchFilter | None = None, snapshot: LexicalSnapshot | None = None) -> list:
+        """
+        Rank the rows by the BM25 score of a query.
+
+        Args:
+        - query (str): The query.
+        - limit (int): The maximum number of points to return. Defaults to 10.
+        - search_filter (SearchFilter | None): Only return the rows passing the filter. Defaults to None.
+        - snapshot (LexicalSnapshot | None): The data version to search. Defaults to the current one.
+
+        Returns:
+        - list: ScoredPoint objects with BM25 scores and no payload, best first, only rows matching a term.
+        """
+        snapshot = snapshot or self.snapshot
+        if limit <= 0:
+            return []
+        scores = np.zeros(snapshot.rows, dtype=np.float32)
+        for term in set(tokenize(query)):
+            posting = snapshot.postings.get(term)
+            if posting is not None:
+                scores[posting[0]] += posting[1]
+
+        candidates = np.flatnonzero(scores > 0)
+        if search_filter is not None:
+            candidates = np.array([row for row in candidates if search_filter.matches(snapshot.payloads[row])], dtype=np.int64)
+        if len(candidates) > limit:
+            candidates = candidates[np.argpartition(-scores[candidates], limit - 1)[:limit]]
+        order = sorted(candidates.tolist(), key=lambda row: (scores[row], row), reverse=True)
+        return [ScoredPoint(id=row, version=0, score=float(scores[row])) for row in order]
+
+    def confidence(self, query: str, point_id: int, snapshot: LexicalSnapshot | None = None) -> float:
+        """
+        Return how well a row matches a query lexically, from 0 to 1.
+
+        This is the share of the query's IDF carried by the terms the row contains, e.g. 1.0
+        when it contains every term. It is 0 unless those terms together are selective, i.e.
+        found together in less than half of the rows, so that a query made of common words
+        (or of the bigrams of a common Thai word) is never a confident match.
+
+        Args:
+        - query (str): The query.
+        - point_id (int): The row number, usually the top lexical hit.
+        - snapshot (LexicalSnapshot | None): The data version searched. Defaults to the current one.
+
+        Returns:
+        - float: The confidence.
+        """
+        snapshot = snapshot or self.snapshot
+        total, matched, rows = 0.0, 0.0, None
+        for term in set(tokenize(query)):
+            posting = snapshot.postings.get(term)
+            if posting is None:
+                total += bm25_idf(snapshot.rows, 0)
+                continue
+            ids, _, idf = posting
+            total += idf
+            position = np.searchsorted(ids, point_id)
+            if position < len(ids) and ids[position] == point_id:
+                matched += idf
+                rows = ids if rows is None else np.intersect1d(rows, ids, assume_unique=True)
+        if rows is None or total <= 0 or 2 * len(rows) >= snapshot.rows:
+            return 0.0
+        return matched / total
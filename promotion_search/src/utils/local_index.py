@@ -0,0 +1,171 @@
+import threading
+import numpy as np
+from qdrant_client.models import ScoredPoint
+from utils.filters import SearchFilter
+from utils.payload_store import metadata_to_payloads, project_payloads
+from utils.reranking import fuse_rankings
+from utils.vector_store import load_processed_file, processed_version
+
+class IndexSnapshot:
+    """An immutable view of one version of the processed data, swapped as a whole on reload."""
+
+    def __init__(self, version: str, vector_names: list[str], matrix: np.ndarray, payloads: list[dict]):
+        self.version = version
+        self.positions = {name: position for position, name in enumerate(vector_names)}
+        self.matrix = matrix
+        self.payloads = payloads
+
+class LocalIndex:
+    """
+    In-process vector index over the processed data of a raw file.
+
+    The named vectors are L2-normalized once at load time and stacked into one
+    (vectors, rows, dimension) matrix, so the cosine scores of every query against every
+    named vector are a single matrix multiply. Point ids are row numbers, as uploaded to Qdrant.
+    """
+
+    def __init__(self, file_name: str):
+        """
+        Initialize the LocalIndex and load the current processed data.
+
+        Args:
+        - file_name (str): The name of the raw CSV file, e.g. promotions_with_summary.csv.
+        """
+        self.file_name = file_name
+        self.snapshot = None
+        self._reload_lock = threading.Lock()
+        self.reload()
+
+    def reload(self) -> str:
+        """
+        Load the processed data again if it changed since the last load.
+
+        The new data is fully loaded before it replaces the current snapshot, so searches
+        running meanwhile keep using the previous version.
+
+        Returns:
+        - str: The version of the loaded data.
+        """
+        with self._reload_lock:
+            version = processed_version(self.file_name)
+            if self.snapshot is None or self.snapshot.version != version:
+                self.snapshot = self.load(version)
+            return self.snapshot.version
+
+    def load(self, version: str) -> IndexSnapshot:
+        """Read the memory-mapped processed data into a normalized matrix and a list of payloads."""
+        metadata, vectors, _ = load_processed_file(self.file_name, mmap=True)
+        vector_names = list(vectors)
+        dimensions = {array.shape[1] for array in vectors.values()}
+        if len(dimensions) > 1:
+            raise ValueError(f"Named vectors of {self.file_name} have different dimensions: {sorted(dimensions)}")
+
+        matrix = np.empty((len(vector_names), len(metadata), dimensions.pop() if dimensions else 0), dtype=np.float32)
+        for position, name in enumerate(vector_names):
+            matrix[position] = vectors[name]
+        norms = np.linalg.norm(matrix, axis=2, keepdims=True)
+        np.divide(matrix, norms, out=matrix, where=norms > 0)
+
+        return IndexSnapshot(version, vector_names, matrix, metadata_to_payloads(metadata))
+
+    def get_payloads(self, ids: list[int], fields: list[str]) -> dict:
+        """See PayloadStore.get_payloads."""
+        return project_payloads(self.snapshot.payloads, ids, fields)
+
+    def search(self,
+               pairs: list[tuple],
+               query_vectors: dict,
+               limit: int = 3,
+               snapshot: IndexSnapshot | None = None,
+               search_filter: SearchFilter | None = None) -> list[list]:
+        """
+        Search every (query, vector name) pair with one matrix multiply over all queries and vectors.
+
+        Args:
+        - pairs (list[tuple]): A list of (query, vector name) pairs.
+        - query_vectors (dict): A mapping from each query to its embedding.
+        - limit (int): The maximum number of points to return per pair. Defaults to 3.
+        - snapshot (IndexSnapshot | None): The data version to search. Defaults to the current one.
+        - search_filter (SearchFilter | None): Only return the rows passing the filter. Defaults to None.
+
+        Returns:
+        - list: A list of ScoredPoint lists with cosine scores and no payload, in the same order as the pairs.
+        """
+        snapshot = snapshot or self.snapshot
+        for _, col in pairs:
+            if col not in snapshot.positions:
+                raise ValueError(f"Unknown vector name: {col}")
+
+        queries = list(query_vectors)
+        rows = snapshot.matrix.shape[1]
+        allowed = None
+        if search_filter is not None:
+            allowed = np.fromiter((search_filter.matches(payload) for payload in snapshot.payloads), dtype=bool, count=rows)
+            limit = min(limit, int(allowed.sum()))
+        limit = min(limit, rows)
+        if not pairs or limit <= 0:
+            return [[] for _ in pairs]
+
+        query_matrix = np.asarray([query_vectors[query] for query in queries], dtype=np.float32)
+        norms = np.linalg.norm(query_matrix, axis=1, keepdims=True)
+        np.divide(query_matrix, norms, out=query_matrix, where=norms > 0)
+
+        # Scores of every row of every named vector against every query, shape (vectors, rows, queries)
+        scores = snapshot.matrix @ query_matrix.T
+        if allowed is not None:
+            # Filtered out rows can not enter the top-k
+            scores[:, ~allowed, :] = -np.inf
+        if limit < rows:
+            top = np.argpartition(-scores, limit - 1, axis=1)[:, :limit, :]
+        else:
+            top = np.broadcast_to(np.arange(rows)[None, :, None], scores.shape)
+        top_scores = np.take_along_axis(scores, top, axis=1)
+
+        query_positions = {query: position for position, query in enumerate(queries)}
+        results = []
+        for query, col in pairs:
+            position, query_position = snapshot.positions[col], query_positions[query]
+            ids, pair_scores = top[position, :, query_position], top_scores[position, :, query_position]
+            results.append([
+                ScoredPoint(id=int(ids[i]), version=0, score=float(pair_scores[i]))
+                for i in np.argsort(-pair_scores, kind="stable")
+            ])
+        return results
+
+    def search_fused(self,
+                     query_vectors: dict,
+                     embed_columns: list[str],
+                     limit: int = 3,
+                     threshold: float = 0.0,
+                     limit_per_vec: int = 3,
+                     fusion: str = "rrf",
+                     with_payload: bool | list[str] = False,
+                     search_filter: SearchFilter | None = None) -> list:
+        """
+        Search every (query, vector) pair and fuse the rankings the way a Qdrant fusion query does.
+
+        Args:
+        - query_vectors (dict): A mapping from each query to its embedding.
+        - embed_columns (list[str]): A list of embedding columns name.
+        - limit (int): The maximum number of fused points to return. Defaults to 3.
+        - threshold (float): The minimum cosine score for a point to enter the fusion. Defaults to 0.0.
+        - limit_per_vec (int): The number of candidates of each pair. Defaults to 3.
+        - fusion (str): "rrf" or "dbsf". Defaults to "rrf".
+        - with_payload (bool | list[str]): True for the whole payload, or the payload fields to return. Defaults to False.
+        - search_filter (SearchFilter | None): Only fuse the rows passing the filter. Defaults to None.
+
+        Returns:
+        - list: A list of ScoredPoint objects with fused scores, best first.
+        """
+        snapshot = self.snapshot
+        pairs = [(query, col) for query in query_vectors for col in embed_columns]
+        rankings = [
+            [point for point in points if point.score >= threshold]
+            for points in self.search(pairs, query_vectors, limit_per_vec, snapshot, search_filter)
+        ]
+        points = fuse_rankings(rankings, limit, fusion)
+        if with_payload:
+            payloads = project_payloads(snapshot.payloads, [point.id for point in points], with_payload)
+            for point in points:
+                point.payload = payloads.get(point.id)
+        return points
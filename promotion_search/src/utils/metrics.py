@@ -0,0 +1,167 @@
+import os
+import bisect
+import threading
+import time
+from contextlib import nullcontext
+from contextvars import ContextVar
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+# Upper bounds in seconds of the latency histogram buckets, from local lookups to slow OpenAI calls
+LATENCY_BUCKETS = [0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0]
+
+# Stage timings of the request being served, shared by the tasks and threads it starts
+_request_timings = ContextVar("request_timings", default=None)
+
+class Histogram:
+    """Cumulative histogram of observations per label value, in the Prometheus format."""
+
+    def __init__(self, buckets: list[float]):
+        self.buckets = buckets
+        self.series = {}
+
+    def observe(self, label: str, value: float) -> None:
+        """Add an observation to the series of a label value."""
+        series = self.series.get(label)
+        if series is None:
+            series = self.series.setdefault(label, [[0] * (len(self.buckets) + 1), 0.0])
+        series[0][bisect.bisect_left(self.buckets, value)] += 1
+        series[1] += value
+
+class _StageTimer:
+    """Context manager that records the duration of a stage in the histogram and the request timings."""
+
+    __slots__ = ("metrics", "stage", "start_time")
+
+    def __init__(self, metrics, stage: str):
+        self.metrics = metrics
+        self.stage = stage
+
+    def __enter__(self):
+        self.start_time = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        self.metrics.observe(self.stage, time.perf_counter() - self.start_time)
+        return False
+
+class Metrics:
+    """
+    Per-stage latency histograms and call counters, rendered in the Prometheus text format.
+
+    When disabled, timers are a shared no-op context manager and counters return at once,
+    so instrumented code pays about one attribute check per call.
+    """
+
+    def __init__(self, enabled: bool = True, log: bool = False, buckets: list[float] = LATENCY_BUCKETS):
+        """
+        Initialize the Metrics.
+
+        Args:
+        - enabled (bool): Record timings and counters. Defaults to True.
+        - log (bool): Print one JSON line with the stage timings of each request. Defaults to False.
+        - buckets (list[float]): The upper bounds of the latency buckets, in seconds. Defaults to LATENCY_BUCKETS.
+        """
+        self.enabled = enabled
+        self.log = log
+        self.stages = Histogram(buckets)
+        self.counters = {}
+        self.callbacks = []
+        self._lock = threading.Lock()
+
+    def timer(self, stage: str):
+        """
+        Return a context manager timing a stage, e.g. with METRICS.timer("embedding"): ...
+
+        Args:
+        - stage (str): The name of the stage.
+        """
+        if not self.enabled:
+            return _NULL_TIMER
+        return _StageTimer(self, stage)
+
+    def observe(self, stage: str, seconds: float) -> None:
+        """Record the duration of a stage, in the histogram and in the timings of the current request."""
+        if not self.enabled:
+            return
+        with self._lock:
+            self.stages.observe(stage, seconds)
+        timings = _request_timings.get()
+        if timings is not None:
+            timings[stage] = timings.get(stage, 0.0) + seconds
+
+    def count(self, name: str, amount: int = 1, **labels) -> None:
+        """
+        Increment a counter, e.g. METRICS.count("qdrant_requests_total", method="search_batch").
+
+        Args:
+        - name (str): The name of the counter.
+        - amount (int): The increment. Defaults to 1.
+        - labels: The labels of the series.
+        """
+        if not self.enabled:
+            return
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + amount
+
+    def add_callback(self, callback) -> None:
+        """
+        Register a function called at render time that returns counters kept elsewhere, e.g. cache stats.
+
+        Args:
+        - callback (Callable[[], list[tuple]]): Returns (name, labels dict, value) tuples.
+        """
+        self.callbacks.append(callback)
+
+    def start_request(self) -> dict:
+        """Start collecting the stage timings of a request in the current context and return them."""
+        timings = {}
+        if self.enabled:
+            _request_timings.set(timings)
+        return timings
+
+    def server_timing(self, timings: dict) -> str:
+        """Format stage timings as a Server-Timing header value, in milliseconds."""
+        return ", ".join(f"{stage};dur={1000 * seconds:.2f}" for stage, seconds in timings.items())
+
+    def render(self) -> str:
+        """Return every metric in the Prometheus text exposition format."""
+        lines = []
+        with self._lock:
+            stages = {label: (list(buckets), total) for label, (buckets, total) in self.stages.series.items()}
+            counters = dict(self.counters)
+
+        lines.append("# HELP search_stage_seconds Duration of each stage of a search.")
+        lines.append("# TYPE search_stage_seconds histogram")
+        for stage, (buckets, total) in sorted(stages.items()):
+            cumulative = 0
+            for bound, count in zip(self.stages.buckets + [float("inf")], buckets):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                lines.append(f'search_stage_seconds_bucket{{stage="{stage}",le="{le}"}} {cumulative}')
+            lines.append(f'search_stage_seconds_sum{{stage="{stage}"}} {total}')
+            lines.append(f'search_stage_seconds_count{{stage="{stage}"}} {cumulative}')
+
+        for callback in self.callbacks:
+            for name, labels, value in callback():
+                counters[(name, tuple(sorted(labels.items())))] = value
+
+        previous = None
+        for (name, labels), value in sorted(counters.items()):
+            if name != previous:
+                lines.append(f"# TYPE {name} counter")
+                previous = name
+            label_text = ",".join(f'{key}="{label}"' for key, label in labels)
+            lines.append(f"{name}{{{label_text}}} {value}" if label_text else f"{name} {value}")
+        return "\n".join(lines) + "\n"
+
+_NULL_TIMER = nullcontext()
+
+# Process-wide metrics shared by the searchers, the embedder and the service
+METRICS = Metrics(
+    enabled=os.environ.get('METRICS_ENABLED', 'true').lower() == 'true',
+    log=os.environ.get('METRICS_LOG', 'false').lower() == 'true',
+)
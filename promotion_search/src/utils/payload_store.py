@@ -0,0 +1,75 @@
+import threading
+import pandas as pd
+from utils.filters import derive_filter_fields
+from utils.vector_store import load_processed_metadata, processed_version
+
+
+def metadata_to_payloads(metadata: pd.DataFrame) -> list[dict]:
+    """
+    Convert processed metadata to the payloads uploaded to Qdrant, one per row.
+
+    Args:
+    - metadata (pd.DataFrame): The metadata of the processed data.
+
+    Returns:
+    - list[dict]: The payload of each row, None for missing values, without the content hashes
+      and with the fields used by search filters.
+    """
+    metadata = metadata.astype(object).where(pd.notnull(metadata), None)
+    return [
+        {**{key: value for key, value in row.items() if not key.startswith('hash_')}, **derive_filter_fields(row)}
+        for row in metadata.to_dict(orient="records")
+    ]
+
+
+def project_payloads(payloads: list[dict], ids: list[int], fields: list[str] | bool) -> dict:
+    """Return the given fields (True for every field) of the payloads of point ids (row numbers), skipping unknown ids."""
+    return {
+        point_id: dict(payloads[point_id]) if fields is True else {field: payloads[point_id].get(field) for field in fields}
+        for point_id in ids
+        if 0 <= point_id < len(payloads)
+    }
+
+
+class PayloadStore:
+    """
+    In-process payloads of the processed data of a raw file, keyed by point id (row number).
+
+    Only valid while the Qdrant collection holds the same processed data, i.e. on the node
+    that ran the upload.
+    """
+
+    def __init__(self, file_name: str):
+        """
+        Initialize the PayloadStore and load the current processed metadata.
+
+        Args:
+        - file_name (str): The name of the raw CSV file, e.g. promotions_with_summary.csv.
+        """
+        self.file_name = file_name
+        self.version = None
+        self.payloads = []
+        self._reload_lock = threading.Lock()
+        self.reload()
+
+    def reload(self) -> str:
+        """Load the processed metadata again if it changed since the last load, and return its version."""
+        with self._reload_lock:
+            version = processed_version(self.file_name)
+            if version != self.version:
+                self.payloads = metadata_to_payloads(load_processed_metadata(self.file_name))
+                self.version = version
+            return self.version
+
+    def get_payloads(self, ids: list[int], fields: list[str]) -> dict:
+        """
+        Return the given payload fields of points.
+
+        Args:
+        - ids (list[int]): The point ids.
+        - fields (list[str]): The payload fields to return.
+
+        Returns:
+        - dict: A mapping from each known point id to its projected payload.
+        """
+        return project_payloads(self.payloads, ids, fields)
@@ -0,0 +1,104 @@
+from qdrant_client import models
+
+# "scalar" keeps one int8 per dimension, "binary" one bit per dimension, "none" the float32 vector
+QUANTIZATION_MODES = ["none", "scalar", "binary"]
+
+
+def parse_vector_settings(value: str | None) -> dict:
+    """
+    Parse a per named vector setting such as "vector_shop=256,vector_summary_text=1024".
+
+    Args:
+    - value (str | None): Comma-separated name=value pairs, where the name "*" applies to every other vector.
+
+    Returns:
+    - dict: A mapping from vector name (or "*") to its value as a string.
+    """
+    settings = {}
+    for item in (value or "").split(","):
+        if not item.strip():
+            continue
+        name, _, setting = item.partition("=")
+        if not setting.strip():
+            raise ValueError("Invalid vector setting: {}".format(item))
+        settings[name.strip()] = setting.strip()
+    return settings
+
+
+def get_vector_setting(settings: dict, vector_name: str, default=None):
+    """Return the setting of a named vector, falling back to the "*" setting and then to the default."""
+    return settings.get(vector_name, settings.get("*", default))
+
+
+def truncated_dimension(settings: dict, vector_name: str, dimension: int) -> int:
+    """
+    Return the dimension a named vector is truncated to.
+
+    text-embedding-3 embeddings can be shortened by keeping their leading dimensions, which
+    is what the dimensions parameter of the embeddings endpoint does before normalizing.
+    Qdrant normalizes cosine vectors itself, so slicing is enough.
+
+    Args:
+    - settings (dict): The parsed VECTOR_DIMENSIONS setting.
+    - vector_name (str): The name of the vector.
+    - dimension (int): The full dimension of the embeddings.
+
+    Returns:
+    - int: The configured dimension, at most the full dimension.
+    """
+    return min(int(get_vector_setting(settings, vector_name, dimension)), dimension)
+
+
+def get_quantization_mode(settings: dict, vector_name: str) -> str:
+    """Return the quantization mode of a named vector from the parsed VECTOR_QUANTIZATION setting."""
+    mode = get_vector_setting(settings, vector_name, "none")
+    if mode not in QUANTIZATION_MODES:
+        raise ValueError("Invalid quantization mode: {}".format(mode))
+    return mode
+
+
+def quantization_config(mode: str):
+    """
+    Return the Qdrant quantization config of a mode, with the quantized vectors kept in RAM.
+
+    Args:
+    - mode (str): "none", "scalar" or "binary".
+
+    Returns:
+    - ScalarQuantization | BinaryQuantization | None: The config, or None for full precision.
+    """
+    if mode == "scalar":
+        return models.ScalarQuantization(
+            scalar=models.ScalarQuantizationConfig(type=models.ScalarType.INT8, quantile=0.99, always_ram=True)
+        )
+    if mode == "binary":
+        return models.BinaryQuantization(binary=models.BinaryQuantizationConfig(always_ram=True))
+    return None
+
+
+def quantization_search_params(mode: str, rescore: bool = True, oversampling: float = 2.0):
+    """
+    Return the search params of a quantized vector.
+
+    Args:
+    - mode (str): "none", "scalar" or "binary".
+    - rescore (bool): Rescore the candidates with the original vectors. Defaults to True.
+    - oversampling (float): How many more candidates than the limit to fetch before rescoring. Defaults to 2.0.
+
+    Returns:
+    - SearchParams | None: The params, or None for full precision.
+    """
+    if mode == "none":
+        return None
+    return models.SearchParams(
+        quantization=models.QuantizationSearchParams(ignore=False, rescore=rescore, oversampling=oversampling)
+    )
+
+
+def vector_bytes(dimension: int, mode: str) -> float:
+    """Return the RAM used by one vector of a dimension in a quantization mode, excluding the index graph."""
+    if mode == "scalar":
+        return dimension
+    if mode == "binary":
+        return dimension / 8
+    return 4 * dimension
@@ -0,0 +1,102 @@
+import heapq
+import numpy as np
+from qdrant_client.models import ScoredPoint
+
+# Rank constant of reciprocal rank fusion, the same as Qdrant's
+RRF_K = 2
+
+
+def point_to_record(point, columns: list[str], payload: dict | None = None) -> dict:
+    """
+    Convert a ScoredPoint to a dictionary holding only the given columns.
+
+    Args:
+    - point (ScoredPoint): A ScoredPoint object.
+    - columns (list[str]): The fields to keep, "id" and "score" or payload keys.
+    - payload (dict | None): The payload of the point, if it was fetched separately. Defaults to the point's payload.
+
+    Returns:
+    - dict: The selected fields, None for fields missing from the payload.
+    """
+    payload = payload if payload is not None else point.payload or {}
+    record = {}
+    for col in columns:
+        if col == "id":
+            record[col] = point.id
+        elif col == "score":
+            record[col] = point.score
+        else:
+            record[col] = payload.get(col)
+    return record
+
+
+def top_k_points(scored_points, limit: int, threshold: float):
+    """
+    Keep the best score of each id above the threshold and return the top points.
+
+    Args:
+    - scored_points (list[ScoredPoint]): The candidates, possibly with several points per id.
+    - limit (int): The maximum number of points to return.
+    - threshold (float): The minimum score for including a point.
+
+    Returns:
+    - list: The best ScoredPoint of each id, sorted by score then id, descending.
+    """
+    best = {}
+    for point in scored_points:
+        if point.score < threshold:
+            continue
+        current = best.get(point.id)
+        if current is None or point.score > current.score:
+            best[point.id] = point
+
+    return heapq.nlargest(limit, best.values(), key=lambda point: (point.score, point.id))
+
+
+def fuse_rankings(rankings: list[list], limit: int, fusion: str = "rrf", weights: list[float] | None = None) -> list:
+    """
+    Fuse several rankings the way a Qdrant fusion query does.
+
+    Args:
+    - rankings (list[list[ScoredPoint]]): The rankings to fuse, each best first.
+    - limit (int): The maximum number of fused points to return.
+    - fusion (str): "rrf" (reciprocal rank) or "dbsf" (distribution-based score fusion). Defaults to "rrf".
+    - weights (list[float] | None): The weight of each ranking. Defaults to 1.0 each.
+
+    Returns:
+    - list: ScoredPoint objects without payload, with fused scores, sorted by score then id, descending.
+    """
+    fused = {}
+    for position, points in enumerate(rankings):
+        if not points:
+            continue
+        weight = weights[position] if weights is not None else 1.0
+        if fusion == "rrf":
+            scores = [1.0 / (rank + RRF_K) for rank in range(len(points))]
+        else:
+            # Distribution-based score fusion: scale by mean +/- 3 standard deviations
+            values = np.array([point.score for point in points])
+            std = values.std(ddof=1) if len(values) > 1 else 0.0
+            low, high = values.mean() - 3 * std, values.mean() + 3 * std
+            scores = [float((value - low) / (high - low)) if high > low else 0.5 for value in values]
+        for point, score in zip(points, scores):
+            fused[point.id] = fused.get(point.id, 0.0) + weight * score
+
+    best = heapq.nlargest(limit, fused.items(), key=lambda item: (item[1], item[0]))
+    return [ScoredPoint(id=point_id, version=0, score=score) for point_id, score in best]
+
+
+def rerank(scored_points, limit: int = 3, threshold: float = 0.5, columns: list[str] = ["id", "score"]) -> list[dict]:
+    """
+    Rerank the results of several searches: threshold, keep the best score per id and select the top ones.
+
+    Args:
+    - scored_points (list[ScoredPoint]): The candidates of every search.
+    - limit (int): The maximum number of payload to return. Defaults to 3.
+    - threshold (float): The minimum score threshold for including a payload. Defaults to 0.5.
+    - columns (list[str]): The fields to return for each payload. Defaults to ["id", "score"].
+
+    Returns:
+    - list: A list of dictionaries, best first.
+    """
+    return [point_to_record(point, columns) for point in top_k_points(scored_points, limit, threshold)]
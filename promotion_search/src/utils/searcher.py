@@ -1,30 +1,259 @@
 import os
-import pandas as pd
-from concurrent.futures import ThreadPoolExecutor, as_completed
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
-from qdrant_client import QdrantClient
+from qdrant_client import QdrantClient, models
 from utils.embedder import OpenAIEmbedder
+from utils.cache import EMBEDDING_CACHE, ResultCache
+from utils.reranking import fuse_rankings, point_to_record, top_k_points
+from utils.metrics import METRICS
+from utils.single_flight import SingleFlight
+from utils.filters import SearchFilter
+from utils.quantization import get_quantization_mode, parse_vector_settings, quantization_search_params, truncated_dimension
 
 # Load environment variables
 load_dotenv()
 
+# "batch" sends all (query, vector) searches in one request, "fanout" sends one request per pair
+SEARCH_MODES = ["batch", "fanout"]
+
+# Server-side fusion of the rankings of every (query, vector) pair: reciprocal rank or distribution-based score fusion
+FUSION_MODES = {"rrf": models.Fusion.RRF, "dbsf": models.Fusion.DBSF}
+
+# "qdrant" searches the Qdrant collection, "local" searches the processed data in-process with NumPy
+SEARCH_BACKENDS = ["qdrant", "local"]
+
+# "hybrid" fuses BM25 and vector rankings, "auto" also answers from BM25 alone when every query has a confident match
+LEXICAL_MODES = ["off", "hybrid", "auto"]
+
 class NeuralSearcher:
     """Class for performing searches using QdrantClient."""
 
-    def __init__(self, collection_name: str):
+    def __init__(self, collection_name: str, backend: str | None = None):
         """
         Initialize the NeuralSearcher.
 
         Args:
         - collection_name (str): The name of the collection to search in.
+        - backend (str | None): "qdrant" or "local", see SEARCH_BACKENDS. Defaults to SEARCH_BACKEND.
         """
 
         self.collection_name = collection_name
         self.qdrant_url = os.environ.get('QDRANT_URL')
         self.qdrant_api_key = os.environ.get('QDRANT_API_KEY')
-        self.qdrant_client = QdrantClient(url=self.qdrant_url, api_key=self.qdrant_api_key, prefer_grpc=True)
-        self.openai_embedder = OpenAIEmbedder()
-        
+        self.backend = backend or os.environ.get('SEARCH_BACKEND', 'qdrant')
+        self.qdrant_client = self.create_qdrant_client()
+        self.processed_file = os.environ.get('LOCAL_INDEX_FILE', 'promotions_with_summary.csv')
+        self.local_index = self.create_local_index()
+        self.payload_store = self.create_payload_store()
+        self.lexical = os.environ.get('SEARCH_LEXICAL', 'off')
+        self.lexical_limit = int(os.environ.get('LEXICAL_LIMIT', 10))
+        self.lexical_weight = float(os.environ.get('LEXICAL_WEIGHT', 1.0))
+        self.lexical_confidence = float(os.environ.get('LEXICAL_CONFIDENCE', 1.0))
+        self._lexical_lock = threading.Lock()
+        self.lexical_index = self.create_lexical_index() if self.get_lexical_mode() != "off" else None
+        self.openai_embedder = self.create_embedder()
+        self.embedding_cache = EMBEDDING_CACHE
+        self.search_mode = os.environ.get('SEARCH_MODE', 'batch')
+        self.fusion = os.environ.get('SEARCH_FUSION') or None
+        self.search_latency = {}
+        self._latency_lock = threading.Lock()
+
+        # Truncated dimension and quantization of each named vector, as set for the uploader
+        self.vector_dimensions = parse_vector_settings(os.environ.get('VECTOR_DIMENSIONS'))
+        self.vector_quantization = parse_vector_settings(os.environ.get('VECTOR_QUANTIZATION'))
+        self.quantization_rescore = os.environ.get('QUANTIZATION_RESCORE', 'true').lower() == 'true'
+        self.quantization_oversampling = float(os.environ.get('QUANTIZATION_OVERSAMPLING', 2.0))
+
+        # The collection name may be an alias moved by the uploader to a new versioned collection
+        self.alias_check_interval = float(os.environ.get('ALIAS_CHECK_INTERVAL', 30))
+        self.collection_version = None
+        self.version_checked_at = 0.0
+        self.version_listeners = []
+        self._version_lock = threading.Lock()
+
+        # Reranked results of repeated searches, dropped when the collection version changes
+        self.result_cache = ResultCache(
+            max_size=int(os.environ.get('RESULT_CACHE_SIZE', 1024)),
+            ttl=float(os.environ.get('RESULT_CACHE_TTL', 300)),
+        )
+        self.add_version_listener(lambda previous, version: self.result_cache.clear())
+        if self.payload_store is not None and self.payload_store is not self.local_index:
+            self.add_version_listener(lambda previous, version: self.payload_store.reload())
+        self.add_version_listener(self.reload_lexical_index)
+
+        # Concurrent callers for the same embedding or search wait for the call in flight
+        self.embedding_flight = self.create_single_flight()
+        self.search_flight = self.create_single_flight()
+
+    def create_qdrant_client(self):
+        """Create the Qdrant client used for searches."""
+        return QdrantClient(url=self.qdrant_url, api_key=self.qdrant_api_key, prefer_grpc=True)
+
+    def create_embedder(self):
+        """Create the embedder used for queries."""
+        return OpenAIEmbedder()
+
+    def create_local_index(self):
+        """Create the in-process index of the local backend, or None for the Qdrant backend."""
+        if self.backend not in SEARCH_BACKENDS:
+            raise ValueError("Invalid search backend: {}".format(self.backend))
+        if self.backend != "local":
+            return None
+        # imported here: the processed data is read with pandas, which the Qdrant backend does not need
+        from utils.local_index import LocalIndex
+        return LocalIndex(self.processed_file)
+
+    def create_payload_store(self):
+        """
+        Create the source of the payloads of the final results, or None to retrieve them from Qdrant.
+
+        The local backend holds the payloads already. With PAYLOAD_STORE=local, the Qdrant
+        backend reads them from the processed data, which must be the data uploaded to the collection.
+        """
+        if self.local_index is not None:
+            return self.local_index
+        if os.environ.get('PAYLOAD_STORE', 'qdrant') == 'local':
+            from utils.payload_store import PayloadStore
+            return PayloadStore(self.processed_file)
+        return None
+
+    def create_single_flight(self):
+        """Create the single-flight group used to coalesce concurrent calls."""
+        return SingleFlight()
+
+    def find_alias_target(self, aliases) -> str:
+        """Return the collection the alias points to in a get_aliases response, or the collection name if it is not an alias."""
+        for alias in aliases.aliases:
+            if alias.alias_name == self.collection_name:
+                return alias.collection_name
+        return self.collection_name
+
+    def resolve_collection_version(self) -> str:
+        """
+        Return the collection the alias currently points to, or the collection name if it is not an alias.
+
+        With the local backend, reload the processed data if it changed and return its version instead.
+        """
+        if self.local_index is not None:
+            return self.local_index.reload()
+        METRICS.count("qdrant_requests_total", method="get_aliases")
+        return self.find_alias_target(self.qdrant_client.get_aliases())
+
+    def create_lexical_index(self):
+        """Build the BM25 index of the processed data of LOCAL_INDEX_FILE, see utils.lexical_index."""
+        from utils.lexical_index import LexicalIndex
+        return LexicalIndex(self.processed_file)
+
+    def get_lexical_index(self):
+        """Return the lexical index, built on first use when SEARCH_LEXICAL did not build it at startup."""
+        with self._lexical_lock:
+            if self.lexical_index is None:
+                self.lexical_index = self.create_lexical_index()
+            return self.lexical_index
+
+    def reload_lexical_index(self, previous: str | None, version: str) -> None:
+        """Rebuild the lexical index, if any, when the collection moves to a new version."""
+        if self.lexical_index is not None:
+            self.lexical_index.reload()
+
+    def add_version_listener(self, callback) -> None:
+        """
+        Register a function called when the alias moves to a new collection version.
+
+        Args:
+        - callback (Callable[[str | None, str], None]): Called with the previous and the new version.
+        """
+        self.version_listeners.append(callback)
+
+    def check_collection_version(self, force: bool = False) -> bool:
+        """
+        Re-resolve the alias at most once per ALIAS_CHECK_INTERVAL seconds and notify the
+        version listeners when it points to a new collection.
+
+        Args:
+        - force (bool): Resolve the alias even if the interval has not elapsed. Defaults to False.
+
+        Returns:
+        - bool: True if the collection version changed.
+        """
+        if not self.version_check_due(force):
+            return False
+        return self.set_collection_version(self.resolve_collection_version())
+
+    def version_check_due(self, force: bool = False) -> bool:
+        """Return True, and restart the interval, if the alias should be resolved again."""
+        now = time.monotonic()
+        with self._version_lock:
+            if not force and now - self.version_checked_at < self.alias_check_interval:
+                return False
+            self.version_checked_at = now
+            return True
+
+    def set_collection_version(self, version: str) -> bool:
+        """Record the resolved collection version and notify the version listeners if it changed."""
+        with self._version_lock:
+            previous, self.collection_version = self.collection_version, version
+        if previous is None or previous == version:
+            return False
+
+        for callback in self.version_listeners:
+            callback(previous, version)
+        return True
+
+    def embed_queries(self, queries: list[str]) -> dict:
+        """
+        Embed the distinct queries once, reusing cached embeddings and the embeddings in flight for other callers.
+
+        Args:
+        - queries (list[str]): A list of queries, possibly with duplicates.
+
+        Returns:
+        - dict: A mapping from each query to its embedding.
+        """
+        with METRICS.timer("embedding"):
+            query_vectors, missing = self.lookup_embeddings(queries)
+
+            # Embed every cache miss not already in flight in one batched request
+            if missing:
+                embeddings = self.embedding_flight.do_many(self.embedding_keys(missing), self.embed_texts)
+                self.store_embeddings(missing, embeddings, query_vectors)
+
+        return query_vectors
+
+    def embedding_keys(self, queries: list[str]) -> list[tuple]:
+        """Return the single-flight keys of queries, the same (model, normalized text) as the embedding cache."""
+        model = self.openai_embedder.OPENAI_EMBEDDING_MODEL
+        return [(model, self.embedding_cache.normalize(query)) for query in queries]
+
+    def embed_texts(self, keys: list[tuple]) -> list:
+        """Embed the texts of single-flight keys in one batched request."""
+        return self.openai_embedder.get_embeddings([text for _, text in keys])
+
+    def lookup_embeddings(self, queries: list[str]):
+        """
+        Look up the distinct queries in the embedding cache.
+
+        Returns:
+        - tuple: A mapping from each cached query to its embedding, and the list of queries to embed.
+        """
+        model = self.openai_embedder.OPENAI_EMBEDDING_MODEL
+        query_vectors = {query: None for query in queries}
+        missing = []
+        for query in query_vectors:
+            query_vectors[query] = self.embedding_cache.get(model, query)
+            if query_vectors[query] is None:
+                missing.append(query)
+        return query_vectors, missing
+
+    def store_embeddings(self, queries: list[str], embeddings: list, query_vectors: dict) -> None:
+        """Add new query embeddings to the cache and to the query mapping."""
+        model = self.openai_embedder.OPENAI_EMBEDDING_MODEL
+        for query, embedding in zip(queries, embeddings):
+            self.embedding_cache.put(model, query, embedding)
+            query_vectors[query] = embedding
+
     def scored_points_to_list(self, scored_points):
         """
         Convert a list of ScoredPoint objects to a list of dictionaries.
@@ -38,10 +267,16 @@ class NeuralSearcher:
         return [{
             'id': point.id,
             'score': point.score,
-            **point.payload  # Unpack all key-value pairs from the payload object
+            **(point.payload or {})  # Unpack all key-value pairs from the payload object
         } for point in scored_points]
     
-    def search(self, text: str, vector_name: str, limit: int = 3):
+    def search(self,
+               text: str,
+               vector_name: str,
+               limit: int = 3,
+               query_vector: list[float] | None = None,
+               with_payload: bool | list[str] = False,
+               search_filter: SearchFilter | None = None):
         """
         Perform a search using the provided text query.
 
@@ -49,22 +284,309 @@ class NeuralSearcher:
         - text (str): The text query to search for.
         - vector_name (str): The name of the vector to use for the search.
         - limit (int): The maximum number of payload to return. Defaults to 3.
+        - query_vector (list[float] | None): The embedding of the text, if already computed. Defaults to None.
+        - with_payload (bool | list[str]): True for the whole payload, or the payload fields to return.
+          Defaults to False, ids and scores only.
+        - search_filter (SearchFilter | None): Only return the promotions passing the filter, applied inside the vector search. Defaults to None.
 
         Returns:
         - ScoredPoint: A list of ScoredPoint objects.
         """
+        if query_vector is None:
+            query_vector = self.embed_queries([text])[text]
+
+        if self.local_index is not None:
+            points = self.local_index.search([(text, vector_name)], {text: query_vector}, limit, search_filter=search_filter)[0]
+            return self.attach_payloads(points, with_payload)
 
+        METRICS.count("qdrant_requests_total", method="search")
         search_result = self.qdrant_client.search(
             collection_name=self.collection_name,
-            query_vector=(vector_name, self.openai_embedder.get_embedding(text)),
+            query_vector=(vector_name, self.vector_query(vector_name, query_vector)),
+            query_filter=self.qdrant_filter(search_filter),
             limit=limit,
+            search_params=self.vector_search_params(vector_name),
             with_vectors=False,
-            with_payload=True
+            with_payload=with_payload
         )
 
         return search_result
+
+    def attach_payloads(self, points, with_payload: bool | list[str]):
+        """Set the payloads of points found by the local backend, which returns ids and scores only."""
+        if with_payload:
+            payloads = self.local_index.get_payloads([point.id for point in points], with_payload)
+            for point in points:
+                point.payload = payloads.get(point.id)
+        return points
+
+    def qdrant_filter(self, search_filter: SearchFilter | None):
+        """Return the Qdrant filter of a SearchFilter, or None."""
+        return search_filter.to_qdrant() if search_filter is not None else None
+
+    def vector_query(self, vector_name: str, query_vector: list[float]) -> list[float]:
+        """Truncate a query embedding to the dimension of a named vector in the collection."""
+        return query_vector[:truncated_dimension(self.vector_dimensions, vector_name, len(query_vector))]
+
+    def vector_search_params(self, vector_name: str):
+        """Return the quantization search params of a named vector, or None if it is not quantized."""
+        mode = get_quantization_mode(self.vector_quantization, vector_name)
+        return quantization_search_params(mode, self.quantization_rescore, self.quantization_oversampling)
     
-    def get_context(self, queries: list[str], embed_columns: list[str], limit_per_vec: int = 3):
+    def search_batch(self, pairs: list[tuple], query_vectors: dict, limit: int = 3, search_filter: SearchFilter | None = None):
+        """
+        Search every (query, vector name) pair in a single Qdrant batch request.
+
+        Args:
+        - pairs (list[tuple]): A list of (query, vector name) pairs.
+        - query_vectors (dict): A mapping from each query to its embedding.
+        - limit (int): The maximum number of payload to return per pair. Defaults to 3.
+        - search_filter (SearchFilter | None): Only return the promotions passing the filter, applied inside the vector search. Defaults to None.
+
+        Returns:
+        - list: A list of ScoredPoint lists without payload, in the same order as the pairs.
+        """
+        requests = self.build_search_requests(pairs, query_vectors, limit, search_filter)
+        METRICS.count("qdrant_requests_total", method="search_batch")
+        return self.qdrant_client.search_batch(collection_name=self.collection_name, requests=requests)
+
+    def build_search_requests(self, pairs: list[tuple], query_vectors: dict, limit: int = 3, search_filter: SearchFilter | None = None):
+        """Build one SearchRequest per (query, vector name) pair."""
+        query_filter = self.qdrant_filter(search_filter)
+        return [
+            models.SearchRequest(
+                vector=models.NamedVector(name=col, vector=self.vector_query(col, query_vectors[query])),
+                filter=query_filter,
+                limit=limit,
+                params=self.vector_search_params(col),
+                with_vector=False,
+                with_payload=False,
+            )
+            for query, col in pairs
+        ]
+
+    def search_fanout(self, pairs: list[tuple], query_vectors: dict, limit: int = 3, search_filter: SearchFilter | None = None):
+        """
+        Search every (query, vector name) pair with one request each, sent from a thread pool.
+
+        Args:
+        - pairs (list[tuple]): A list of (query, vector name) pairs.
+        - query_vectors (dict): A mapping from each query to its embedding.
+        - limit (int): The maximum number of payload to return per pair. Defaults to 3.
+        - search_filter (SearchFilter | None): Only return the promotions passing the filter, applied inside the vector search. Defaults to None.
+
+        Returns:
+        - list: A list of ScoredPoint lists, in the same order as the pairs.
+        """
+        with ThreadPoolExecutor() as executor:
+            futures = [
+                executor.submit(self.search, text=query, vector_name=col, limit=limit, query_vector=query_vectors[query],
+                                search_filter=search_filter)
+                for query, col in pairs
+            ]
+            return [future.result() for future in futures]
+
+    def search_pairs(self,
+                     queries: list[str],
+                     embed_columns: list[str],
+                     limit_per_vec: int = 3,
+                     mode: str | None = None,
+                     search_filter: SearchFilter | None = None):
+        """
+        Search every combination of the distinct queries and the embedding columns.
+
+        Args:
+        - queries (list[str]): A list of queries.
+        - embed_columns (list[str]): A list of embedding columns name.
+        - limit_per_vec (int): The maximum number of payload to return each time retrieved from the vector. Defaults to 3.
+        - mode (str | None): "batch" for one batch request or "fanout" for one request per pair. Defaults to SEARCH_MODE.
+          Ignored by the local backend, which searches every pair at once.
+        - search_filter (SearchFilter | None): Only return the promotions passing the filter, applied inside the vector search. Defaults to None.
+
+        Returns:
+        - dict: A mapping from each (query, column) pair to its list of ScoredPoint objects.
+        """
+        mode = self.get_search_mode(mode)
+
+        # Pick up a new collection version behind the alias
+        self.check_collection_version()
+
+        # Embed each distinct query once and reuse it for every vector
+        query_vectors = self.embed_queries(queries)
+        pairs = [(query, col) for query in query_vectors for col in embed_columns]
+
+        start_time = time.perf_counter()
+        if self.local_index is not None:
+            mode = "local"
+            results = self.local_index.search(pairs, query_vectors, limit_per_vec, search_filter=search_filter)
+        elif mode == "batch":
+            results = self.search_batch(pairs, query_vectors, limit_per_vec, search_filter)
+        else:
+            results = self.search_fanout(pairs, query_vectors, limit_per_vec, search_filter)
+        self.record_latency(mode, time.perf_counter() - start_time)
+
+        return dict(zip(pairs, results))
+
+    def get_search_mode(self, mode: str | None = None) -> str:
+        """Return the requested search mode, or SEARCH_MODE, after validating it."""
+        mode = mode or self.search_mode
+        if mode not in SEARCH_MODES:
+            raise ValueError("Invalid search mode: {}".format(mode))
+        return mode
+
+    def get_lexical_mode(self, lexical: str | None = None) -> str:
+        """Return the requested lexical mode, or SEARCH_LEXICAL, after validating it."""
+        lexical = lexical or self.lexical
+        if lexical not in LEXICAL_MODES:
+            raise ValueError("Invalid lexical mode: {}".format(lexical))
+        return lexical
+
+    def search_lexical(self, queries: list[str], search_filter: SearchFilter | None = None) -> dict:
+        """
+        Rank the promotions by the BM25 score of each distinct query.
+
+        Args:
+        - queries (list[str]): A list of queries.
+        - search_filter (SearchFilter | None): Only return the promotions passing the filter. Defaults to None.
+
+        Returns:
+        - dict: A mapping from each distinct query to at most LEXICAL_LIMIT ScoredPoint objects, best first.
+        """
+        lexical_index = self.get_lexical_index()
+        snapshot = lexical_index.snapshot
+        with METRICS.timer("lexical"):
+            return {
+                query: lexical_index.search(query, self.lexical_limit, search_filter, snapshot)
+                for query in dict.fromkeys(queries)
+            }
+
+    def is_lexical_confident(self, lexical_rankings: dict) -> bool:
+        """Return True if the top lexical hit of every query reaches LEXICAL_CONFIDENCE, see LexicalIndex.confidence."""
+        lexical_index = self.get_lexical_index()
+        return all(
+            points and lexical_index.confidence(query, points[0].id) >= self.lexical_confidence
+            for query, points in lexical_rankings.items()
+        )
+
+    def search_hybrid(self,
+                      queries: list[str],
+                      embed_columns: list[str],
+                      limit: int = 3,
+                      threshold: float = 0.0,
+                      limit_per_vec: int = 3,
+                      mode: str | None = None,
+                      lexical: str = "hybrid",
+                      search_filter: SearchFilter | None = None):
+        """
+        Fuse the BM25 ranking of each query with the vector rankings of every (query, vector) pair.
+
+        With lexical="auto", the queries are answered from the BM25 rankings alone, without
+        embedding them, when every query has a confident lexical match, e.g. an exact shop name.
+
+        Args:
+        - queries (list[str]): A list of queries.
+        - embed_columns (list[str]): A list of embedding columns name.
+        - limit (int): The maximum number of fused points to return. Defaults to 3.
+        - threshold (float): The minimum cosine score for a point to enter the fusion. Defaults to 0.0.
+        - limit_per_vec (int): The number of candidates of each (query, vector) pair. Defaults to 3.
+        - mode (str | None): "batch" or "fanout", see search_pairs. Defaults to SEARCH_MODE.
+        - lexical (str): "hybrid" or "auto". Defaults to "hybrid".
+        - search_filter (SearchFilter | None): Only return the promotions passing the filter. Defaults to None.
+
+        Returns:
+        - list: A list of ScoredPoint objects with reciprocal rank fusion scores, best first.
+        """
+        lexical_rankings = self.search_lexical(queries, search_filter)
+        if lexical == "auto" and self.is_lexical_confident(lexical_rankings):
+            METRICS.count("search_lexical_total", path="lexical_only")
+            return fuse_rankings(list(lexical_rankings.values()), limit)
+
+        METRICS.count("search_lexical_total", path="hybrid")
+        results = self.search_pairs(queries, embed_columns, limit_per_vec, mode, search_filter)
+        return self.fuse_hybrid(results, lexical_rankings, limit, threshold)
+
+    def fuse_hybrid(self, results: dict, lexical_rankings: dict, limit: int, threshold: float):
+        """Fuse the vector rankings above the threshold and the lexical rankings, weighted by LEXICAL_WEIGHT."""
+        with METRICS.timer("rerank"):
+            rankings = [[point for point in points if point.score >= threshold] for points in results.values()]
+            weights = [1.0] * len(rankings) + [self.lexical_weight] * len(lexical_rankings)
+            return fuse_rankings(rankings + list(lexical_rankings.values()), limit, weights=weights)
+
+    def search_fused(self,
+                     queries: list[str],
+                     embed_columns: list[str],
+                     limit: int = 3,
+                     threshold: float = 0.0,
+                     limit_per_vec: int = 3,
+                     fusion: str = "rrf",
+                     with_payload: bool | list[str] = False,
+                     search_filter: SearchFilter | None = None):
+        """
+        Search every (query, vector) pair as a prefetch of one Qdrant query and fuse the rankings on the server.
+
+        Args:
+        - queries (list[str]): A list of queries.
+        - embed_columns (list[str]): A list of embedding columns name.
+        - limit (int): The maximum number of fused payload to return. Defaults to 3.
+        - threshold (float): The minimum cosine score for a point to enter the fusion. Defaults to 0.0.
+        - limit_per_vec (int): The number of candidates prefetched for each pair. Defaults to 3.
+        - fusion (str): "rrf" or "dbsf". Defaults to "rrf".
+        - with_payload (bool | list[str]): True for the whole payload, or the payload fields to return. Defaults to False.
+        - search_filter (SearchFilter | None): Only return the promotions passing the filter, applied inside the vector search. Defaults to None.
+
+        Returns:
+        - list: A list of ScoredPoint objects with fused scores, best first.
+        """
+        if fusion not in FUSION_MODES:
+            raise ValueError("Invalid fusion mode: {}".format(fusion))
+
+        # Pick up a new collection version behind the alias
+        self.check_collection_version()
+
+        # Embed each distinct query once and reuse it for every vector
+        query_vectors = self.embed_queries(queries)
+
+        start_time = time.perf_counter()
+        if self.local_index is not None:
+            points = self.local_index.search_fused(query_vectors, embed_columns, limit, threshold, limit_per_vec, fusion,
+                                                   with_payload, search_filter)
+            self.record_latency(f"local_fusion_{fusion}", time.perf_counter() - start_time)
+            return points
+
+        METRICS.count("qdrant_requests_total", method="query_points")
+        response = self.qdrant_client.query_points(
+            **self.build_fused_query(query_vectors, embed_columns, limit, threshold, limit_per_vec, fusion, with_payload,
+                                     search_filter)
+        )
+        self.record_latency(f"fusion_{fusion}", time.perf_counter() - start_time)
+
+        return response.points
+
+    def build_fused_query(self, query_vectors, embed_columns, limit, threshold, limit_per_vec, fusion, with_payload,
+                          search_filter=None):
+        """Build the arguments of a query_points call with a prefetch per (query, vector) pair, see search_fused."""
+        # The filter applies to each prefetch, so that every pair fetches its top candidates among the allowed points
+        query_filter = self.qdrant_filter(search_filter)
+        return dict(
+            collection_name=self.collection_name,
+            prefetch=[
+                models.Prefetch(query=self.vector_query(col, vector), using=col, filter=query_filter, limit=limit_per_vec,
+                                score_threshold=threshold, params=self.vector_search_params(col))
+                for vector in query_vectors.values()
+                for col in embed_columns
+            ],
+            query=models.FusionQuery(fusion=FUSION_MODES[fusion]),
+            limit=limit,
+            with_vectors=False,
+            with_payload=with_payload,
+        )
+
+    def get_context(self,
+                    queries: list[str],
+                    embed_columns: list[str],
+                    limit_per_vec: int = 3,
+                    mode: str | None = None,
+                    search_filter: SearchFilter | None = None):
         """
         Retrieve context information from a list of queries contained in each vector.
 
@@ -72,34 +594,37 @@ class NeuralSearcher:
         - queries (list[str]): A list of queries.
         - embed_columns (list[str]): A A list of embedding columns name.
         - limit_per_vec (int): The maximum number of payload to return each time retrieved from the vector. Defaults to 3.
+        - mode (str | None): "batch" or "fanout", see search_pairs. Defaults to SEARCH_MODE.
+        - search_filter (SearchFilter | None): Only return the promotions passing the filter, applied inside the vector search. Defaults to None.
 
         Returns:
         - list: A list of ScoredPoint objects.
         """
+        results = self.search_pairs(queries, embed_columns, limit_per_vec, mode, search_filter)
 
-        # Define a nested function to perform the search operation
-        def search_points(query, col):
-            return self.search(text=query, vector_name=col, limit=limit_per_vec)
+        # Return the aggregated scored_points list
+        return [point for points in results.values() for point in points]
 
-        # Initialize an empty list to store the scored points
-        scored_points = []
+    def record_latency(self, mode: str, seconds: float) -> None:
+        """Add the duration of a vector search to the latency statistics of its mode and to the metrics."""
+        METRICS.observe("vector_search", seconds)
+        with self._latency_lock:
+            stats = self.search_latency.setdefault(mode, {"calls": 0, "total": 0.0, "last": 0.0})
+            stats["calls"] += 1
+            stats["total"] += seconds
+            stats["last"] = seconds
 
-        # Use ThreadPoolExecutor to parallelize the search operation
-        with ThreadPoolExecutor() as executor:
-            # Create a list to store the futures returned by executor.submit()
-            futures = []
-            # Submit tasks for each query and column combination
-            for query in queries:
-                for col in embed_columns:
-                    futures.append(executor.submit(search_points, query, col))
-            
-            # Iterate over completed futures
-            for future in as_completed(futures):
-                # Retrieve and extend the scored_points list with the results
-                scored_points.extend(future.result())
-
-        # Return the aggregated scored_points list
-        return scored_points
+    def get_latency_stats(self) -> dict:
+        """Return the number of vector searches and their average and last latency (ms) per search mode."""
+        with self._latency_lock:
+            return {
+                mode: {
+                    "calls": stats["calls"],
+                    "avg_ms": 1000 * stats["total"] / stats["calls"],
+                    "last_ms": 1000 * stats["last"],
+                }
+                for mode, stats in self.search_latency.items()
+            }
 
     def get_context_reranked(self,
                              queries: list[str],
@@ -110,7 +635,11 @@ class NeuralSearcher:
                              columns: list[str] = ["id", 
                                                    "score",
                                                    "promotion_title",
-                                                   "summary_text"]):
+                                                   "summary_text"],
+                             mode: str | None = None,
+                             fusion: str | None = None,
+                             search_filter: SearchFilter | None = None,
+                             lexical: str | None = None):
         """
         Rerank and select context embeddings based on the queries and embedding columns.
 
@@ -120,27 +649,101 @@ class NeuralSearcher:
         - limit (int): The maximum number of payload to return. Defaults to 3.
         - threshold (float): The minimum score threshold for including a payload. Defaults to 0.5.
         - limit_per_vec (int): The maximum number of payload to return each time retrieved from the vector. Defaults to 3.
+        - columns (list[str]): The fields to return for each payload.
+        - mode (str | None): "batch" or "fanout", see search_pairs. Defaults to SEARCH_MODE.
+        - fusion (str | None): "rrf" or "dbsf" to fuse the rankings on the server with search_fused,
+          in which case the returned scores are fused scores. Defaults to SEARCH_FUSION (client-side max score).
+        - search_filter (SearchFilter | None): Only return the promotions passing the filter, applied inside the vector search. Defaults to None.
+        - lexical (str | None): "hybrid" or "auto" to fuse BM25 and vector rankings with search_hybrid, in which
+          case fusion is ignored and the returned scores are fused scores, or "off". Defaults to SEARCH_LEXICAL.
 
         Returns:
         - list: A list of reranked ScoredPoint objects as dictionaries.
         """
-        scored_points = self.get_context(queries, embed_columns, limit)
-        
-        # Convert the list of ScoredPoint objects to a DataFrame
-        df = pd.DataFrame(self.scored_points_to_list(scored_points))
+        fusion = fusion or self.fusion
+        lexical = self.get_lexical_mode(lexical)
+
+        # Answer repeated searches from the result cache, once the alias has been checked
+        self.check_collection_version()
+        key = self.result_cache.make_key(queries, embed_columns, limit=limit, threshold=threshold,
+                                         limit_per_vec=limit_per_vec, columns=tuple(columns), fusion=fusion,
+                                         search_filter=search_filter.key() if search_filter is not None else None,
+                                         lexical=lexical)
+        result = self.result_cache.get(key)
+        if result is None:
+            # Identical searches arriving meanwhile wait for this one instead of searching again
+            def compute():
+                result = self.rerank_context(queries, embed_columns, limit, threshold, limit_per_vec, columns, mode, fusion,
+                                             search_filter, lexical)
+                self.result_cache.put(key, result)
+                return result
+            result = [dict(record) for record in self.search_flight.do(key, compute)]
+        return result
+
+    def rerank_context(self, queries, embed_columns, limit, threshold, limit_per_vec, columns, mode, fusion, search_filter=None,
+                       lexical="off"):
+        """
+        Search and rerank without the result cache, see get_context_reranked.
 
-        # Filter the DataFrame based on the threshold
-        df = df[df['score'] >= threshold]
+        The searches return ids and scores only; the payload fields of the final points are
+        fetched afterwards, see fetch_payloads.
+        """
+        payload_fields = [col for col in columns if col not in ["id", "score"]]
+        if lexical != "off":
+            points = self.search_hybrid(queries, embed_columns, limit, threshold, limit_per_vec, mode, lexical, search_filter)
+        elif fusion:
+            points = self.search_fused(queries, embed_columns, limit, threshold, limit_per_vec, fusion,
+                                       self.fused_payload(payload_fields), search_filter)
+        else:
+            scored_points = self.get_context(queries, embed_columns, limit_per_vec, mode=mode, search_filter=search_filter)
+            points = self.rerank_points(scored_points, limit, threshold)
 
-        # Sort the DataFrame by id and score, keep the last row for each id
-        df = df.sort_values(['score', 'id'], ascending=False).drop_duplicates('id', keep='first')
+        return self.points_to_records(points, columns, self.fetch_payloads(points, payload_fields))
 
-        # Select the top rows based on the limit
-        df = df.head(limit)
+    def fused_payload(self, payload_fields: list[str]) -> bool | list[str]:
+        """Return the payload a fused query should return; it only returns the final points, so it can carry their fields."""
+        return payload_fields if self.payload_store is None and payload_fields else False
 
-        # Convert the DataFrame to a list of dictionaries
-        result = df[columns].to_dict(orient='records')
-        return result
+    def rerank_points(self, scored_points, limit: int, threshold: float):
+        """Filter by threshold, keep the best score of each id and select the top points, see utils.reranking.top_k_points."""
+        with METRICS.timer("rerank"):
+            return top_k_points(scored_points, limit, threshold)
+
+    def payload_ids(self, points, payload_fields: list[str]) -> list:
+        """Return the ids of the points whose payload fields still have to be fetched."""
+        if not payload_fields:
+            return []
+        return [point.id for point in points if point.payload is None]
+
+    def fetch_payloads(self, points, payload_fields: list[str]) -> dict:
+        """
+        Fetch the payload fields of the final points from the payload store, or with one Qdrant retrieve call.
+
+        Args:
+        - points (list[ScoredPoint]): The final points, best first.
+        - payload_fields (list[str]): The payload fields to return.
+
+        Returns:
+        - dict: A mapping from point id to its projected payload.
+        """
+        ids = self.payload_ids(points, payload_fields)
+        if not ids:
+            return {}
+        with METRICS.timer("payload"):
+            if self.payload_store is not None:
+                return self.payload_store.get_payloads(ids, payload_fields)
+            METRICS.count("qdrant_requests_total", method="retrieve")
+            retrieved = self.qdrant_client.retrieve(
+                collection_name=self.collection_name,
+                ids=ids,
+                with_payload=payload_fields,
+                with_vectors=False,
+            )
+            return {point.id: point.payload for point in retrieved}
+
+    def points_to_records(self, points, columns: list[str], payloads: dict) -> list[dict]:
+        """Convert the final points to dictionaries holding only the given columns."""
+        return [point_to_record(point, columns, payloads.get(point.id)) for point in points]
 
 # # Example usage
 # from utils.searcher import NeuralSearcher
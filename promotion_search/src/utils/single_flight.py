@@ -0,0 +1,150 @@
+import asyncio
+import threading
+
+class _Call:
+    """An in-flight computation shared by the callers of SingleFlight."""
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+def check_results(owned: list, results) -> list:
+    """Return the results of a do_many computation as a list, or raise ValueError if there is not one per key."""
+    results = list(results)
+    if len(results) != len(owned):
+        raise ValueError("Expected {} results, one per key, got {}".format(len(owned), len(results)))
+    return results
+
+class SingleFlight:
+    """
+    Coalesce identical in-flight computations across threads.
+
+    While a computation for a key is running, later callers for the same key wait for its
+    result (or its error) instead of starting their own.
+    """
+
+    def __init__(self):
+        self.calls = 0
+        self.shared = 0
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, fn, *args, **kwargs):
+        """
+        Run fn(*args, **kwargs) unless a computation for the key is already in flight, and return its result.
+
+        Args:
+        - key (Hashable): The key identifying the computation.
+        - fn (Callable): The function to run.
+
+        Returns:
+        - Any: The result of the computation, shared by every concurrent caller.
+        """
+        return self.do_many([key], lambda keys: [fn(*args, **kwargs)])[0]
+
+    def do_many(self, keys: list, fn) -> list:
+        """
+        Compute several keys at once, joining the computations already in flight for some of them.
+
+        Args:
+        - keys (list[Hashable]): The keys to compute, possibly with duplicates.
+        - fn (Callable[[list], list]): Computes the results of the keys no one else is computing, in order.
+          A wrong number of results raises ValueError to every caller waiting for these keys.
+
+        Returns:
+        - list: The result of each key, in the same order as the keys.
+        """
+        with self._lock:
+            owned = []
+            for key in dict.fromkeys(keys):
+                if key in self._calls:
+                    self.shared += 1
+                else:
+                    self._calls[key] = _Call()
+                    owned.append(key)
+            calls = {key: self._calls[key] for key in keys}
+            if owned:
+                self.calls += 1
+
+        if owned:
+            try:
+                for key, result in zip(owned, check_results(owned, fn(owned))):
+                    calls[key].result = result
+            except BaseException as e:
+                for key in owned:
+                    calls[key].error = e
+                raise
+            finally:
+                with self._lock:
+                    for key in owned:
+                        del self._calls[key]
+                for key in owned:
+                    calls[key].event.set()
+
+        results = []
+        for key in keys:
+            call = calls[key]
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            results.append(call.result)
+        return results
+
+    def get_stats(self) -> dict:
+        """Return the number of computations run and of keys served by another caller's computation."""
+        return {"calls": self.calls, "shared": self.shared, "in_flight": len(self._calls)}
+
+class AsyncSingleFlight(SingleFlight):
+    """
+    Coalesce identical in-flight coroutines within an event loop.
+
+    The computation runs in its own task, so cancelling one caller neither cancels the
+    computation nor the other callers waiting for it.
+    """
+
+    async def do(self, key, fn, *args, **kwargs):
+        """See SingleFlight.do, with fn a coroutine function."""
+        async def compute(keys):
+            return [await fn(*args, **kwargs)]
+        return (await self.do_many([key], compute))[0]
+
+    async def do_many(self, keys: list, fn) -> list:
+        """See SingleFlight.do_many, with fn a coroutine function."""
+        loop = asyncio.get_running_loop()
+        owned = []
+        for key in dict.fromkeys(keys):
+            if key in self._calls:
+                self.shared += 1
+            else:
+                self._calls[key] = loop.create_future()
+                owned.append(key)
+        futures = [self._calls[key] for key in keys]
+
+        if owned:
+            self.calls += 1
+            task = asyncio.ensure_future(fn(owned))
+            task.add_done_callback(lambda task: self._resolve(owned, task))
+
+        return [await asyncio.shield(future) for future in futures]
+
+    def _resolve(self, owned: list, task: asyncio.Task) -> None:
+        """Hand the outcome of a finished computation to the futures of its keys."""
+        futures = [self._calls.pop(key) for key in owned]
+        results = None
+        if task.cancelled():
+            error = asyncio.CancelledError()
+        else:
+            error = task.exception()
+        if error is None:
+            try:
+                results = check_results(owned, task.result())
+            except ValueError as e:
+                error = e
+        for i, future in enumerate(futures):
+            if error is not None:
+                future.set_exception(error)
+                # Do not log the error as unretrieved when every waiter was cancelled
+                future.exception()
+            else:
+                future.set_result(results[i])
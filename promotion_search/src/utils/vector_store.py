@@ -0,0 +1,231 @@
+import os
+import ast
+import json
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+
+# Root directory of the processed data
+PROCESSED_DATA_DIR = os.path.join(os.path.dirname(__file__), "../../data/processed")
+
+MANIFEST_FILE = "manifest.json"
+METADATA_FILE = "metadata.parquet"
+
+
+def get_processed_path(file_name: str) -> str:
+    """
+    Return the directory holding the processed data of a raw file.
+
+    Args:
+    - file_name (str): The name of the raw CSV file, e.g. promotions_with_summary.csv.
+
+    Returns:
+    - str: The path of data/processed/<file name without extension>.
+    """
+    return os.path.join(PROCESSED_DATA_DIR, os.path.splitext(file_name)[0])
+
+
+def vector_file(vector_name: str) -> str:
+    """Return the file name of a named vector array."""
+    return f"{vector_name}.npy"
+
+
+def save_processed(path: str, metadata: pd.DataFrame, vectors: dict, manifest: dict | None = None) -> None:
+    """
+    Save processed data as a columnar metadata file and one float32 array per named vector.
+
+    Files are written under temporary names and moved into place, with the manifest last,
+    so a reader never sees a partially written dataset.
+
+    Args:
+    - path (str): The processed data directory.
+    - metadata (pd.DataFrame): The non-vector columns, one row per point.
+    - vectors (dict): A mapping from vector name (e.g. vector_shop) to an array of shape (rows, dimension).
+    - manifest (dict | None): Extra information to record in the manifest, e.g. the embedding model.
+    """
+    os.makedirs(path, exist_ok=True)
+
+    # Store every metadata column as nullable strings, the payload type expected by the uploader
+    metadata = metadata.reset_index(drop=True).astype("string")
+    tmp_path = os.path.join(path, METADATA_FILE + ".tmp")
+    metadata.to_parquet(tmp_path, index=False)
+    os.replace(tmp_path, os.path.join(path, METADATA_FILE))
+
+    dimensions = {}
+    for name, array in vectors.items():
+        array = np.ascontiguousarray(array, dtype=np.float32)
+        if array.shape[0] != len(metadata):
+            raise ValueError(f"Vector {name} has {array.shape[0]} rows, metadata has {len(metadata)}")
+        tmp_path = os.path.join(path, vector_file(name) + ".tmp")
+        with open(tmp_path, "wb") as f:
+            np.save(f, array)
+        os.replace(tmp_path, os.path.join(path, vector_file(name)))
+        dimensions[name] = int(array.shape[1])
+
+    # Remove the arrays of vectors that are no longer part of the dataset
+    for file in os.listdir(path):
+        if file.startswith("vector_") and file.endswith(".npy") and file[:-len(".npy")] not in vectors:
+            os.remove(os.path.join(path, file))
+
+    manifest = {
+        **(manifest or {}),
+        "rows": len(metadata),
+        "vectors": dimensions,
+    }
+    tmp_path = os.path.join(path, MANIFEST_FILE + ".tmp")
+    with open(tmp_path, "w") as f:
+        json.dump(manifest, f, indent=4)
+    os.replace(tmp_path, os.path.join(path, MANIFEST_FILE))
+
+
+def load_processed(path: str, mmap: bool = True):
+    """
+    Load processed data saved by save_processed.
+
+    Args:
+    - path (str): The processed data directory.
+    - mmap (bool): Memory-map the vector arrays instead of reading them into memory. Defaults to True.
+
+    Returns:
+    - tuple: The metadata DataFrame, a mapping from vector name to float32 array, and the manifest.
+    """
+    with open(os.path.join(path, MANIFEST_FILE), "r") as f:
+        manifest = json.load(f)
+
+    metadata = pd.read_parquet(os.path.join(path, METADATA_FILE))
+    vectors = {
+        name: np.load(os.path.join(path, vector_file(name)), mmap_mode="r" if mmap else None)
+        for name in manifest["vectors"]
+    }
+    return metadata, vectors, manifest
+
+
+def load_legacy_csv(csv_path: str):
+    """
+    Load processed data from the former CSV format, where vectors are stored as list strings.
+
+    Args:
+    - csv_path (str): The path of the processed CSV file.
+
+    Returns:
+    - tuple: The metadata DataFrame, a mapping from vector name to float32 array, and an empty manifest.
+    """
+    df = pd.read_csv(csv_path, dtype=str)
+    vector_columns = [col for col in df.columns if col.startswith('vector_')]
+    vectors = {
+        col: np.array([ast.literal_eval(value) for value in df[col]], dtype=np.float32)
+        for col in vector_columns
+    }
+    return df.drop(columns=vector_columns), vectors, {}
+
+
+def processed_exists(file_name: str) -> bool:
+    """Check if processed data exists for a raw file, in either format."""
+    return (os.path.exists(os.path.join(get_processed_path(file_name), MANIFEST_FILE))
+            or os.path.exists(os.path.join(PROCESSED_DATA_DIR, file_name)))
+
+
+def load_processed_file(file_name: str, mmap: bool = True):
+    """
+    Load the processed data of a raw file, falling back to the former CSV format.
+
+    Args:
+    - file_name (str): The name of the raw CSV file.
+    - mmap (bool): Memory-map the vector arrays. Defaults to True.
+
+    Returns:
+    - tuple: The metadata DataFrame, a mapping from vector name to float32 array, and the manifest.
+    """
+    path = get_processed_path(file_name)
+    if os.path.exists(os.path.join(path, MANIFEST_FILE)):
+        return load_processed(path, mmap=mmap)
+    return load_legacy_csv(os.path.join(PROCESSED_DATA_DIR, file_name))
+
+
+def processed_version(file_name: str) -> str:
+    """
+    Return a version string of a raw file's processed data that changes whenever it is saved again.
+
+    Args:
+    - file_name (str): The name of the raw CSV file.
+
+    Returns:
+    - str: The modification time of the manifest, written last by save_processed, or of the legacy CSV file.
+    """
+    path = os.path.join(get_processed_path(file_name), MANIFEST_FILE)
+    if not os.path.exists(path):
+        path = os.path.join(PROCESSED_DATA_DIR, file_name)
+    return str(os.stat(path).st_mtime_ns)
+
+
+def load_processed_metadata(file_name: str, columns: list[str] | None = None) -> pd.DataFrame:
+    """
+    Load the metadata of a raw file's processed data, without its vectors.
+
+    Args:
+    - file_name (str): The name of the raw CSV file.
+    - columns (list[str] | None): The columns to read. Defaults to every column.
+
+    Returns:
+    - pd.DataFrame: The metadata, one row per point.
+    """
+    path = get_processed_path(file_name)
+    if os.path.exists(os.path.join(path, MANIFEST_FILE)):
+        return pd.read_parquet(os.path.join(path, METADATA_FILE), columns=columns)
+    metadata, _, _ = load_legacy_csv(os.path.join(PROCESSED_DATA_DIR, file_name))
+    return metadata if columns is None else metadata[columns]
+
+
+def load_manifest(file_name: str) -> dict:
+    """
+    Return the manifest of a raw file's processed data, without loading the data itself.
+
+    Args:
+    - file_name (str): The name of the raw CSV file.
+
+    Returns:
+    - dict: The manifest, with at least the number of rows and the dimension of each named vector.
+    """
+    path = get_processed_path(file_name)
+    if os.path.exists(os.path.join(path, MANIFEST_FILE)):
+        with open(os.path.join(path, MANIFEST_FILE), "r") as f:
+            return json.load(f)
+    metadata, vectors, _ = load_legacy_csv(os.path.join(PROCESSED_DATA_DIR, file_name))
+    return {
+        "rows": len(metadata),
+        "vectors": {name: int(array.shape[1]) for name, array in vectors.items()},
+    }
+
+
+def iter_processed_rows(file_name: str, batch_size: int = 256):
+    """
+    Stream the processed data of a raw file row by row, reading at most one batch of metadata at a time.
+
+    Args:
+    - file_name (str): The name of the raw CSV file.
+    - batch_size (int): The number of metadata rows decoded at once. Defaults to 256.
+
+    Yields:
+    - tuple: The row index, the metadata of the row as a dict (None for missing values),
+      and a mapping from vector name to the row's float32 vector.
+    """
+    path = get_processed_path(file_name)
+    if not os.path.exists(os.path.join(path, MANIFEST_FILE)):
+        metadata, vectors, _ = load_legacy_csv(os.path.join(PROCESSED_DATA_DIR, file_name))
+        metadata = metadata.astype(object).where(pd.notnull(metadata), None)
+        for index, row in enumerate(metadata.to_dict(orient="records")):
+            yield index, row, {name: array[index] for name, array in vectors.items()}
+        return
+
+    with open(os.path.join(path, MANIFEST_FILE), "r") as f:
+        manifest = json.load(f)
+    vectors = {
+        name: np.load(os.path.join(path, vector_file(name)), mmap_mode="r")
+        for name in manifest["vectors"]
+    }
+
+    index = 0
+    for batch in pq.ParquetFile(os.path.join(path, METADATA_FILE)).iter_batches(batch_size=batch_size):
+        for row in batch.to_pylist():
+            yield index, row, {name: array[index] for name, array in vectors.items()}
+            index += 1
@@ -0,0 +1,33 @@
+import os
+import sys
+
+import pandas as pd
+import pytest
+
+# The modules of src are imported the way the scripts import them, e.g. "from utils.filters import ..."
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+from utils import vector_store
+
+# Metadata columns read by the payload store, the local index and the lexical index
+METADATA_COLUMNS = ["promotion_title", "shop", "special_day", "summary_text",
+                    "start_date", "end_date", "credit_card", "promotion_category"]
+
+
+@pytest.fixture
+def save_processed(tmp_path, monkeypatch):
+    """Return a function saving processed data of a raw file under a temporary data/processed."""
+    monkeypatch.setattr(vector_store, "PROCESSED_DATA_DIR", str(tmp_path))
+
+    def save(file_name, rows, vectors):
+        metadata = pd.DataFrame([{column: row.get(column) for column in METADATA_COLUMNS} for row in rows])
+        path = vector_store.get_processed_path(file_name)
+        vector_store.save_processed(path, metadata, vectors)
+        # the version is the modification time of the manifest, make sure that each save changes it
+        manifest = os.path.join(path, vector_store.MANIFEST_FILE)
+        stat = os.stat(manifest)
+        os.utime(manifest, ns=(stat.st_atime_ns, stat.st_mtime_ns + save.saves * 1000))
+        save.saves += 1
+
+    save.saves = 1
+    return save
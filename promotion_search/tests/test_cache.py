@@ -0,0 +1,71 @@
+import pytest
+
+from utils import cache
+from utils.cache import EmbeddingCache, LRUCache, ResultCache
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(cache.time, "monotonic", lambda: now[0])
+    return now
+
+
+def test_least_recently_used_entry_is_evicted():
+    lru = LRUCache(max_size=2)
+    lru.put_key("a", 1)
+    lru.put_key("b", 2)
+    assert lru.get_key("a") == 1
+    lru.put_key("c", 3)
+    assert lru.get_key("b") is None
+    assert (lru.get_key("a"), lru.get_key("c")) == (1, 3)
+    assert lru.get_stats()["evictions"] == 1
+
+
+def test_entries_expire_after_ttl(clock):
+    lru = LRUCache(ttl=10)
+    lru.put_key("a", 1)
+    clock[0] += 10
+    assert lru.get_key("a") == 1
+    clock[0] += 0.1
+    assert lru.get_key("a") is None
+    assert lru.get_stats()["expirations"] == 1
+    assert lru.get_stats()["size"] == 0
+
+
+def test_stats_count_hits_misses_and_clears():
+    lru = LRUCache()
+    lru.put_key("a", 1)
+    lru.get_key("a")
+    lru.get_key("b")
+    lru.clear()
+    assert lru.get_key("a") is None
+    stats = lru.get_stats()
+    assert (stats["hits"], stats["misses"], stats["invalidations"]) == (1, 2, 1)
+    assert stats["hit_ratio"] == pytest.approx(1 / 3)
+
+
+def test_embedding_key_matches_the_text_sent_to_the_embedder():
+    embeddings = EmbeddingCache()
+    embeddings.put("model", "line one\nline two", [1.0])
+    assert embeddings.get("model", "line one line two") == [1.0]
+    # the embedder sends these texts as they are, so they are distinct inputs
+    assert embeddings.get("model", "line one  line two") is None
+    assert embeddings.get("model", "Line one line two") is None
+    assert embeddings.get("other-model", "line one line two") is None
+
+
+def test_result_key_ignores_query_spacing_case_order_and_duplicates():
+    key = ResultCache.make_key(["Cafe  Promotion", "hotel"], ["vector_shop", "vector_title"], limit=5)
+    assert key == ResultCache.make_key(["hotel", "cafe promotion", "hotel"], ["vector_title", "vector_shop"], limit=5)
+    assert key != ResultCache.make_key(["hotel", "cafe promotion"], ["vector_title", "vector_shop"], limit=6)
+
+
+def test_result_cache_returns_copies():
+    results = ResultCache()
+    record = {"id": 1, "score": 0.5}
+    results.put("key", [record])
+    record["score"] = 1.0
+    cached = results.get("key")
+    cached[0]["score"] = 2.0
+    assert results.get("key") == [{"id": 1, "score": 0.5}]
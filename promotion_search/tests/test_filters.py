@@ -0,0 +1,80 @@
+import pytest
+from qdrant_client import QdrantClient, models
+
+from utils.filters import SearchFilter, derive_filter_fields, make_search_filter, parse_date_timestamp
+
+DAY = 24 * 60 * 60
+JAN_1 = parse_date_timestamp("2024-01-01")
+
+PAYLOADS = [
+    {"start_timestamp": JAN_1, "end_timestamp": JAN_1 + 31 * DAY - 1, "credit_cards": ["thepassion"], "promotion_category": "Dining"},
+    {"start_timestamp": JAN_1 + 31 * DAY, "end_timestamp": None, "credit_cards": ["thepassion", "wisdom"], "promotion_category": "Travel"},
+    {"start_timestamp": None, "end_timestamp": JAN_1 + 10 * DAY - 1, "credit_cards": ["wisdom"], "promotion_category": "Dining"},
+    {"start_timestamp": None, "end_timestamp": None, "credit_cards": [], "promotion_category": "Shopping"},
+]
+
+FILTERS = [
+    SearchFilter(active_at=JAN_1 + 5 * DAY),
+    SearchFilter(active_at=JAN_1 + 40 * DAY),
+    SearchFilter(active_at=JAN_1 + 31 * DAY - 1),
+    SearchFilter(cards=["KbankThePassion"]),
+    SearchFilter(cards=["Wisdom", "unknown"]),
+    SearchFilter(categories=["Dining"]),
+    SearchFilter(active_at=JAN_1 + 5 * DAY, cards=["KbankWisdom"], categories=["Dining", "Travel"]),
+]
+
+
+@pytest.fixture(scope="module")
+def client():
+    client = QdrantClient(":memory:")
+    client.create_collection("promotions", vectors_config=models.VectorParams(size=2, distance=models.Distance.COSINE))
+    client.upsert("promotions", points=[
+        models.PointStruct(id=i, vector=[1.0, 0.0], payload=payload) for i, payload in enumerate(PAYLOADS)
+    ])
+    return client
+
+
+def test_derive_filter_fields_bounds_inclusive_days():
+    fields = derive_filter_fields({"start_date": "2024-01-01", "end_date": "2024-01-31", "credit_card": 'The Passion\n"Wisdom"\nThe Passion'})
+    assert fields["start_timestamp"] == JAN_1
+    assert fields["end_timestamp"] == JAN_1 + 31 * DAY - 1
+    assert fields["credit_cards"] == ["thepassion", "wisdom"]
+
+
+def test_derive_filter_fields_missing_dates_are_unbounded():
+    fields = derive_filter_fields({"start_date": "-", "end_date": None, "credit_card": None})
+    assert fields == {"start_timestamp": None, "end_timestamp": None, "credit_cards": []}
+
+
+def test_make_search_filter_returns_none_for_empty_filter():
+    assert make_search_filter() is None
+    assert make_search_filter(cards=[" "], categories=[""]) is None
+    assert make_search_filter(cards=["Wisdom"]).cards == ["wisdom"]
+
+
+def test_key_ignores_card_spelling_and_order():
+    assert SearchFilter(cards=["Wisdom", "KbankThePassion"]).key() == SearchFilter(cards=["the passion", "wisdom"]).key()
+
+
+@pytest.mark.parametrize("search_filter, expected", [
+    (FILTERS[0], [0, 2, 3]),
+    (FILTERS[1], [1, 3]),
+    (FILTERS[2], [0, 3]),
+    (FILTERS[3], [0, 1]),
+    (FILTERS[4], [1, 2]),
+    (FILTERS[5], [0, 2]),
+    (FILTERS[6], [2]),
+])
+def test_matches(search_filter, expected):
+    assert [i for i, payload in enumerate(PAYLOADS) if search_filter.matches(payload)] == expected
+
+
+def test_to_qdrant_empty_filter_has_no_conditions():
+    assert SearchFilter().to_qdrant().must == []
+
+
+@pytest.mark.parametrize("search_filter", FILTERS)
+def test_to_qdrant_agrees_with_matches(client, search_filter):
+    points, _ = client.scroll("promotions", scroll_filter=search_filter.to_qdrant(), limit=len(PAYLOADS))
+    expected = [i for i, payload in enumerate(PAYLOADS) if search_filter.matches(payload)]
+    assert sorted(point.id for point in points) == expected
@@ -0,0 +1,74 @@
+import math
+
+import pytest
+
+from utils.filters import SearchFilter
+from utils.lexical_index import BM25_B, BM25_K1, LexicalIndex, bm25_idf, tokenize
+
+FILE_NAME = "promotions.csv"
+
+ROWS = [
+    {"promotion_title": "Samsung S24 Ultra discount", "shop": "Banana IT", "promotion_category": "Shopping"},
+    {"promotion_title": "Dinner discount", "shop": "ICON SIAM", "promotion_category": "Dining"},
+    {"promotion_title": "Movie tickets", "shop": "Major Cineplex", "promotion_category": "Entertainment"},
+    {"promotion_title": "ส่วนลดร้านกาแฟ", "shop": "Cafe Amazon", "promotion_category": "Dining"},
+    {"promotion_title": "Hotel discount discount", "shop": "Agoda", "promotion_category": "Travel"},
+]
+
+
+@pytest.fixture
+def index(save_processed):
+    save_processed(FILE_NAME, ROWS, {})
+    return LexicalIndex(FILE_NAME)
+
+
+def test_tokenize_splits_words_and_thai_bigrams():
+    assert tokenize("Samsung S24-Ultra!") == ["samsung", "s24", "ultra"]
+    assert tokenize("ＩＣＯＮ SIAM") == ["icon", "siam"]
+    assert tokenize("กาแฟ") == ["กา", "าแ", "แฟ"]
+    assert tokenize("ร้าน coffee") == ["ร้", "้า", "าน", "coffee"]
+    assert tokenize(None) == []
+
+
+def bm25(term_frequency, document_length, average_length, idf):
+    norm = BM25_K1 * (1 - BM25_B + BM25_B * document_length / average_length)
+    return idf * term_frequency * (BM25_K1 + 1) / (term_frequency + norm)
+
+
+def test_scores_are_bm25(index):
+    lengths = [sum(len(tokenize(row.get(field))) for field in ["promotion_title", "shop"]) for row in ROWS]
+    average_length = sum(lengths) / len(lengths)
+    idf = bm25_idf(len(ROWS), 3)
+    assert idf == pytest.approx(math.log(1 + (5 - 3 + 0.5) / (3 + 0.5)))
+
+    points = index.search("discount")
+    assert [point.id for point in points] == [4, 1, 0]
+    assert points[0].score == pytest.approx(bm25(2, lengths[4], average_length, idf), rel=1e-5)
+    assert points[1].score == pytest.approx(bm25(1, lengths[1], average_length, idf), rel=1e-5)
+
+
+def test_exact_names_rank_first(index):
+    assert index.search("s24 ultra")[0].id == 0
+    assert index.search("major cineplex tickets")[0].id == 2
+    assert index.search("กาแฟ")[0].id == 3
+    assert index.search("nothing like this") == []
+
+
+def test_search_filter_and_limit(index):
+    assert [point.id for point in index.search("discount", search_filter=SearchFilter(categories=["Dining"]))] == [1]
+    assert len(index.search("discount", limit=2)) == 2
+    assert index.search("discount", limit=0) == []
+
+
+def test_confidence(index):
+    assert index.confidence("s24 ultra", 0) == pytest.approx(1.0)
+    assert 0 < index.confidence("s24 phone", 0) < 1
+    # common terms are never confident, even when every one matches
+    assert index.confidence("discount", 4) == 0.0
+
+
+def test_reload_rebuilds_on_a_new_version(index, save_processed):
+    version = index.reload()
+    save_processed(FILE_NAME, ROWS + [{"promotion_title": "Flight deal", "shop": "Thai Airways"}], {})
+    assert index.reload() != version
+    assert index.search("flight")[0].id == 5
@@ -0,0 +1,78 @@
+import numpy as np
+import pytest
+
+from utils.filters import SearchFilter
+from utils.local_index import LocalIndex
+
+FILE_NAME = "promotions.csv"
+
+
+def make_rows(n):
+    return [{"promotion_title": "promotion {}".format(i), "promotion_category": "Dining" if i % 2 else "Travel"} for i in range(n)]
+
+
+def make_vectors(n, seed=0):
+    rng = np.random.default_rng(seed)
+    return {"vector_title": rng.normal(size=(n, 8)), "vector_shop": rng.normal(size=(n, 8))}
+
+
+def cosine_top(vectors, query, limit):
+    scores = vectors @ query / (np.linalg.norm(vectors, axis=1) * np.linalg.norm(query))
+    order = np.argsort(-scores, kind="stable")[:limit]
+    return [int(i) for i in order], scores[order]
+
+
+def test_search_returns_the_cosine_top_k_of_each_pair(save_processed):
+    vectors = make_vectors(50)
+    save_processed(FILE_NAME, make_rows(50), vectors)
+    index = LocalIndex(FILE_NAME)
+    rng = np.random.default_rng(1)
+    query_vectors = {"a": rng.normal(size=8).tolist(), "b": rng.normal(size=8).tolist()}
+    pairs = [("a", "vector_title"), ("b", "vector_shop"), ("a", "vector_shop")]
+
+    results = index.search(pairs, query_vectors, limit=5)
+    for (query, column), points in zip(pairs, results):
+        ids, scores = cosine_top(vectors[column], np.array(query_vectors[query]), 5)
+        assert [point.id for point in points] == ids
+        assert [point.score for point in points] == pytest.approx(scores.tolist(), abs=1e-5)
+
+
+def test_search_applies_the_filter_inside_the_top_k(save_processed):
+    save_processed(FILE_NAME, make_rows(50), make_vectors(50))
+    index = LocalIndex(FILE_NAME)
+    query_vectors = {"a": np.ones(8).tolist()}
+    points, = index.search([("a", "vector_title")], query_vectors, limit=10, search_filter=SearchFilter(categories=["Dining"]))
+    assert len(points) == 10
+    assert all(point.id % 2 == 1 for point in points)
+
+
+def test_unknown_vector_name_is_rejected(save_processed):
+    save_processed(FILE_NAME, make_rows(5), make_vectors(5))
+    with pytest.raises(ValueError):
+        LocalIndex(FILE_NAME).search([("a", "vector_unknown")], {"a": np.ones(8).tolist()})
+
+
+def test_reload_swaps_in_the_new_version(save_processed):
+    save_processed(FILE_NAME, make_rows(10), make_vectors(10, seed=0))
+    index = LocalIndex(FILE_NAME)
+    old_snapshot = index.snapshot
+    old_version = index.reload()
+    assert index.snapshot is old_snapshot
+
+    new_vectors = make_vectors(20, seed=2)
+    save_processed(FILE_NAME, make_rows(20), new_vectors)
+    assert index.reload() != old_version
+    query_vectors = {"a": np.ones(8).tolist()}
+    points, = index.search([("a", "vector_shop")], query_vectors, limit=3)
+    assert [point.id for point in points] == cosine_top(new_vectors["vector_shop"], np.ones(8), 3)[0]
+    # a search that started before the reload keeps its version
+    old_points, = index.search([("a", "vector_shop")], query_vectors, limit=20, snapshot=old_snapshot)
+    assert len(old_points) == 10
+
+
+def test_search_fused_returns_the_requested_payload_fields(save_processed):
+    save_processed(FILE_NAME, make_rows(10), make_vectors(10))
+    index = LocalIndex(FILE_NAME)
+    points = index.search_fused({"a": np.ones(8).tolist()}, ["vector_title", "vector_shop"], limit=3, with_payload=["promotion_title"])
+    assert len(points) == 3
+    assert all(point.payload == {"promotion_title": "promotion {}".format(point.id)} for point in points)
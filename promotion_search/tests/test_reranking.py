@@ -0,0 +1,71 @@
+import random
+
+import pandas as pd
+import pytest
+from qdrant_client.models import ScoredPoint
+
+from utils.reranking import RRF_K, fuse_rankings, point_to_record, rerank, top_k_points
+
+COLUMNS = ["id", "score", "promotion_title"]
+
+
+def point(id, score, **payload):
+    return ScoredPoint(id=id, version=0, score=score, payload=payload or {"promotion_title": "title {}".format(id)})
+
+
+def rerank_pandas(scored_points, limit, threshold, columns):
+    """The DataFrame-based reranking that utils.reranking replaced."""
+    df = pd.DataFrame([{"id": point.id, "score": point.score, **point.payload} for point in scored_points])
+    df = df[df["score"] >= threshold]
+    df = df.sort_values(["score", "id"], ascending=False).drop_duplicates("id", keep="first")
+    df = df.head(limit)
+    return df[columns].to_dict(orient="records")
+
+
+@pytest.mark.parametrize("seed", range(5))
+@pytest.mark.parametrize("limit, threshold", [(3, 0.5), (5, 0.2), (50, 0.0)])
+def test_rerank_matches_the_pandas_reranking(seed, limit, threshold):
+    rng = random.Random(seed)
+    # scores on a coarse grid, so that ties between ids and within an id are common
+    points = [point(rng.randrange(15), rng.randrange(10) / 10) for _ in range(60)]
+    assert rerank(points, limit, threshold, COLUMNS) == rerank_pandas(points, limit, threshold, COLUMNS)
+
+
+def test_top_k_points_keeps_the_best_point_of_each_id():
+    points = [point(1, 0.6), point(2, 0.9), point(1, 0.8), point(3, 0.4)]
+    assert [(p.id, p.score) for p in top_k_points(points, 5, 0.5)] == [(2, 0.9), (1, 0.8)]
+
+
+def test_rerank_without_candidates_above_threshold():
+    assert rerank([], 3, 0.5) == []
+    assert rerank([point(1, 0.1)], 3, 0.5) == []
+
+
+def test_point_to_record_fills_missing_fields():
+    record = point_to_record(point(1, 0.5, shop="cafe"), ["id", "score", "shop", "summary_text"])
+    assert record == {"id": 1, "score": 0.5, "shop": "cafe", "summary_text": None}
+    assert point_to_record(point(1, 0.5, shop="cafe"), ["shop"], payload={"shop": "store"}) == {"shop": "store"}
+
+
+def test_rrf_sums_reciprocal_ranks():
+    rankings = [[point(1, 0.9), point(2, 0.8)], [point(2, 0.7), point(3, 0.6)], []]
+    fused = fuse_rankings(rankings, limit=10)
+    assert [p.id for p in fused] == [2, 1, 3]
+    assert fused[0].score == pytest.approx(1 / (1 + RRF_K) + 1 / RRF_K)
+    assert fused[1].score == pytest.approx(1 / RRF_K)
+    assert fused[2].score == pytest.approx(1 / (1 + RRF_K))
+    assert all(p.payload is None for p in fused)
+
+
+def test_rrf_weights_and_limit():
+    rankings = [[point(1, 0.9)], [point(2, 0.9)]]
+    assert [p.id for p in fuse_rankings(rankings, limit=1, weights=[1.0, 2.0])] == [2]
+    # equal scores are ordered by id, descending
+    assert [p.id for p in fuse_rankings(rankings, limit=2)] == [2, 1]
+
+
+def test_dbsf_scales_by_three_standard_deviations():
+    fused = fuse_rankings([[point(1, 0.9), point(2, 0.7), point(3, 0.5)]], limit=3, fusion="dbsf")
+    # mean 0.7, sample std 0.2: scores are scaled from [0.1, 1.3]
+    assert [(p.id, p.score) for p in fused] == [(1, pytest.approx(2 / 3)), (2, pytest.approx(0.5)), (3, pytest.approx(1 / 3))]
+    assert fuse_rankings([[point(1, 0.9)]], limit=1, fusion="dbsf")[0].score == 0.5
@@ -0,0 +1,154 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from utils.single_flight import AsyncSingleFlight, SingleFlight
+
+
+def release_when_shared(flight, release, shared=1):
+    """Let the computation finish once the other callers wait for it."""
+    def releaser():
+        while flight.get_stats()["shared"] < shared:
+            time.sleep(0.001)
+        release.set()
+    return releaser
+
+
+def run_concurrently(targets):
+    threads = [threading.Thread(target=target) for target in targets]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+
+def test_concurrent_callers_share_one_computation():
+    flight = SingleFlight()
+    started, release = threading.Event(), threading.Event()
+    calls, results = [], []
+
+    def compute():
+        calls.append(1)
+        started.set()
+        release.wait()
+        return "value"
+
+    def owner():
+        results.append(flight.do("key", compute))
+
+    def waiter():
+        started.wait()
+        results.append(flight.do("key", compute))
+
+    run_concurrently([owner, waiter, release_when_shared(flight, release)])
+    assert calls == [1]
+    assert results == ["value", "value"]
+    assert flight.get_stats() == {"calls": 1, "shared": 1, "in_flight": 0}
+
+
+def test_do_many_computes_only_the_keys_not_in_flight():
+    flight = SingleFlight()
+    started, release = threading.Event(), threading.Event()
+    computed, results = [], {}
+
+    def compute(keys):
+        computed.append(list(keys))
+        if keys == ["a"]:
+            started.set()
+            release.wait()
+        return [key.upper() for key in keys]
+
+    def first():
+        results["first"] = flight.do_many(["a"], compute)
+
+    def second():
+        started.wait()
+        results["second"] = flight.do_many(["b", "a", "b"], compute)
+
+    run_concurrently([first, second, release_when_shared(flight, release)])
+    assert computed == [["a"], ["b"]]
+    assert results == {"first": ["A"], "second": ["B", "A", "B"]}
+
+
+def test_error_is_raised_to_every_waiter_and_not_cached():
+    flight = SingleFlight()
+    started, release = threading.Event(), threading.Event()
+    errors = []
+
+    def fail():
+        started.set()
+        release.wait()
+        raise RuntimeError("boom")
+
+    def caller():
+        try:
+            flight.do("key", fail)
+        except RuntimeError as e:
+            errors.append(e)
+
+    def waiter():
+        started.wait()
+        caller()
+
+    run_concurrently([caller, waiter, release_when_shared(flight, release)])
+    assert len(errors) == 2 and errors[0] is errors[1]
+    assert flight.do("key", lambda: "retried") == "retried"
+
+
+@pytest.mark.parametrize("results", [["A"], ["A", "B", "C"]])
+def test_wrong_number_of_results_raises(results):
+    with pytest.raises(ValueError):
+        SingleFlight().do_many(["a", "b"], lambda keys: results)
+
+
+def test_async_callers_share_one_computation():
+    async def main():
+        flight = AsyncSingleFlight()
+        calls = []
+
+        async def compute(keys):
+            calls.append(list(keys))
+            await asyncio.sleep(0.01)
+            return [key.upper() for key in keys]
+
+        results = await asyncio.gather(flight.do_many(["a", "b"], compute), flight.do_many(["b", "c"], compute))
+        return calls, results, flight.get_stats()
+
+    calls, results, stats = asyncio.run(main())
+    assert calls == [["a", "b"], ["c"]]
+    assert results == [["A", "B"], ["B", "C"]]
+    assert stats == {"calls": 2, "shared": 1, "in_flight": 0}
+
+
+def test_async_cancelled_caller_does_not_cancel_the_others():
+    async def main():
+        flight = AsyncSingleFlight()
+
+        async def compute():
+            await asyncio.sleep(0.01)
+            return "value"
+
+        first = asyncio.ensure_future(flight.do("key", compute))
+        second = asyncio.ensure_future(flight.do("key", compute))
+        await asyncio.sleep(0)
+        first.cancel()
+        return await second, first.cancelled()
+
+    assert asyncio.run(main()) == ("value", True)
+
+
+@pytest.mark.parametrize("results", [["A"], ["A", "B", "C"]])
+def test_async_wrong_number_of_results_raises_to_every_waiter(results):
+    async def main():
+        flight = AsyncSingleFlight()
+
+        async def compute(keys):
+            await asyncio.sleep(0.01)
+            return results
+
+        return await asyncio.gather(flight.do_many(["a", "b"], compute), flight.do_many(["b"], compute), return_exceptions=True)
+
+    errors = asyncio.run(main())
+    assert all(isinstance(error, ValueError) for error in errors)
@@ -47,7 +47,7 @@ async def post_chat(body: NewChatPayload):
     new_chat = CHAT_DB.add_chat(new_chat)
     logging.info("Created new chat: {}".format(new_chat))
 
-    return new_chat
+    return new_chat.to_response()
 
 @router.get("/api/chat/{id}")
 async def get_chat(id: int):
@@ -56,7 +56,7 @@ async def get_chat(id: int):
         logging.warning("Chat not found: id = {}".format(id))
         raise HTTPException(status_code=404, detail="Chat not found")
     
-    return chat
+    return chat.to_response()
 
 @router.delete("/api/chat/{id}")
 async def delete_chat(id: int):
@@ -86,7 +86,7 @@ async def delete_chat(id: int):
     CHAT_DB.delete_chat(id)
     logging.info("Deleted chat: {}".format(id))
     
-    return chat
+    return chat.to_response()
 
 @router.get("/api/chat/{id}/message")
 async def get_chat_messages(id: int):
@@ -95,7 +95,7 @@ async def get_chat_messages(id: int):
         logging.warning("Chat not found: id = {}".format(id))
         raise HTTPException(status_code=404, detail="Chat not found")
     else:
-        return chat.chat_messages
+        return chat.get_messages_response()
 
 @router.get("/api/chat/{id}/assistant")
 async def get_chat_assistant(id: int):
@@ -104,4 +104,4 @@ async def get_chat_assistant(id: int):
         logging.warning("Chat not found: id = {}".format(id))
         raise HTTPException(status_code=404, detail="Chat not found")
     else:
-        return chat.assistant_logs
\ No newline at end of file
+        return chat.get_assistant_logs_response()
\ No newline at end of file
@@ -113,7 +113,7 @@ async def create_chat_message(id: int, body: NewChatMessagePayload):
             "Run created with id={}. Updated chat: {}".format(response["id"], chat.id)
         )
 
-    return chat
+    return chat.to_response()
 
 
 @router.get("/api/chat/{id}/get_context")
@@ -42,8 +42,8 @@ Banana IT: https://www.bnn.in.th/th/p/smartphone-and-accessories/smartphone/sams
         "action": "response_added",
         "context": chat.last_context,
         "promotions": chat.last_promotions,
-        "message": chat.chat_messages,
-        "assistant_logs": chat.assistant_logs,
+        "message": chat.get_messages_response(),
+        "assistant_logs": chat.get_assistant_logs_response(),
     }
 
 @router.post("/api/chat/{id}/create_promotions_text")
@@ -164,8 +164,8 @@ async def get_chat_response(id: int):
             "action": "no_run",
             "context": chat.last_context,
             "promotions": chat.last_promotions,
-            "message": chat.chat_messages,
-            "assistant_logs": chat.assistant_logs,
+            "message": chat.get_messages_response(),
+            "assistant_logs": chat.get_assistant_logs_response(),
         }
 
     run_id = chat.get_last_run_id()
@@ -179,8 +179,8 @@ async def get_chat_response(id: int):
             "action": "no_run",
             "context": chat.last_context,
             "promotions": chat.last_promotions,
-            "message": chat.chat_messages,
-            "assistant_logs": chat.assistant_logs,
+            "message": chat.get_messages_response(),
+            "assistant_logs": chat.get_assistant_logs_response(),
         }
 
     # get running status
@@ -207,8 +207,8 @@ async def get_chat_response(id: int):
             "action": "run_not_completed",
             "context": chat.last_context,
             "promotions": chat.last_promotions,
-            "message": chat.chat_messages,
-            "assistant_logs": chat.assistant_logs,
+            "message": chat.get_messages_response(),
+            "assistant_logs": chat.get_assistant_logs_response(),
         }
 
     chat.add_assistant_log(
@@ -255,8 +255,8 @@ async def get_chat_response(id: int):
             "action": "invalid_response",
             "context": chat.last_context,
             "promotions": chat.last_promotions,
-            "message": chat.chat_messages,
-            "assistant_logs": chat.assistant_logs,
+            "message": chat.get_messages_response(),
+            "assistant_logs": chat.get_assistant_logs_response(),
         }
         
     user_id = chat.user_id
@@ -279,7 +279,7 @@ async def get_chat_response(id: int):
         logging.info("Promotion choice: {}".format(promotion_choice))
         if promotion_choice:
             message_string = default_apologize_phrase
-            for _promotion in json.loads(chat.last_promotions):
+            for _promotion in chat.get_last_promotions() or []:
                 if promotion_choice == str(_promotion["id"]):
                     message_string = _promotion["summary_text"]
                     break
@@ -304,6 +304,6 @@ async def get_chat_response(id: int):
         "action": "response_added",
         "context": chat.last_context,
         "promotions": chat.last_promotions,
-        "message": chat.chat_messages,
-        "assistant_logs": chat.assistant_logs,
+        "message": chat.get_messages_response(),
+        "assistant_logs": chat.get_assistant_logs_response(),
     }
@@ -74,7 +74,7 @@ def create_context_details(id: int):
         CHAT_DB.update_chat(chat)
         logging.info("Run created with id={}. Updated chat: {}".format(response["id"],chat.id))
 
-    return chat
+    return chat.to_response()
 
 @router.get("/api/chat/{id}/get_context_details")
 async def get_context_details(id: int):
@@ -5,6 +5,7 @@ from fastapi import APIRouter, HTTPException
 from dotenv import load_dotenv
 from openai import OpenAI
 from server2.db import CHAT_DB, Chat
+from server2.chat.write_behind import CHAT_WRITER
 
 logging.basicConfig(level=logging.INFO)
 
@@ -19,16 +20,16 @@ client = OpenAI(
 
 @router.get("/api/chat/{id}")
 async def get_chat(id: int):
-    chat = CHAT_DB.get_chat_by_id(id)
+    chat = CHAT_WRITER.get_chat_by_id(id)
     if chat is None:
         logging.warning("Chat not found: id = {}".format(id))
         raise HTTPException(status_code=404, detail="Chat not found")
     
-    return chat
+    return chat.to_response()
 
 @router.delete("/api/chat/{id}")
 async def delete_chat(id: int):
-    chat = CHAT_DB.get_chat_by_id(id)
+    chat = CHAT_WRITER.get_chat_by_id(id)
 
     if chat is None:
         logging.warning("Chat not found: id = {}".format(id))
@@ -40,26 +41,27 @@ async def delete_chat(id: int):
     if response["deleted"]:
         logging.info("Deleted OpenAI thread: {}".format(thread_id))
 
-    # delete chat from database
+    # delete chat from database, with its changes not written yet
+    CHAT_WRITER.discard(id)
     CHAT_DB.delete_chat(id)
     logging.info("Deleted chat: {}".format(id))
     
-    return chat
+    return chat.to_response()
 
 @router.get("/api/chat/{id}/message")
 async def get_chat_messages(id: int):
-    chat = CHAT_DB.get_chat_by_id(id)
+    chat = CHAT_WRITER.get_chat_by_id(id)
     if chat is None:
         logging.warning("Chat not found: id = {}".format(id))
         raise HTTPException(status_code=404, detail="Chat not found")
     else:
-        return chat.chat_messages
+        return chat.get_messages_response()
 
 @router.get("/api/chat/{id}/assistant")
 async def get_chat_assistant(id: int):
-    chat = CHAT_DB.get_chat_by_id(id)
+    chat = CHAT_WRITER.get_chat_by_id(id)
     if chat is None:
         logging.warning("Chat not found: id = {}".format(id))
         raise HTTPException(status_code=404, detail="Chat not found")
     else:
-        return chat.assistant_logs
\ No newline at end of file
+        return chat.get_assistant_logs_response()
\ No newline at end of file
@@ -10,6 +10,7 @@ from dotenv import load_dotenv
 from typing_extensions import override
 from server2.chat.utils import send_activity, send_chat, send_error, get_elapsed_time, send_chat_delta, TimeLog
 from server2.db import CHAT_DB, Chat, USER_DB, CREDIT_CARD_DB
+from server2.chat.write_behind import CHAT_WRITER
 
 logging.basicConfig(level=logging.INFO)
 
@@ -22,7 +23,7 @@ client = OpenAI(
 
 async def add_assistant_log(chat, title, body, response_time, websocket: WebSocket):
     chat.add_assistant_log(title, body, response_time)
-    CHAT_DB.update_chat(chat)
+    CHAT_WRITER.mark_dirty(chat)
     logging.info("Updated chat: {}".format(chat.id))
     await send_activity(websocket, title, body, response_time)
 
@@ -212,7 +213,7 @@ async def get_context_details(chat, user, websocket: WebSocket):
     run = client.beta.threads.runs.list(thread_id, limit=1).data[0]
     run_id = run.id
     chat.add_run_id(run_id)
-    CHAT_DB.update_chat(chat)
+    CHAT_WRITER.mark_dirty(chat)
 
     # retrieve the run response from the last message of the thread
     start_time = time.time()
@@ -251,7 +252,7 @@ async def get_context_details(chat, user, websocket: WebSocket):
 
             logging.info(f"Context details found: chat_id={chat.id}")
             chat.set_last_context(response_body)
-            CHAT_DB.update_chat(chat)
+            CHAT_WRITER.mark_dirty(chat)
 
             if chat.chat_context == 2 or chat.chat_context == "2":
                 top_things = response_body["top_3_things"]
@@ -273,7 +274,7 @@ async def get_context_details(chat, user, websocket: WebSocket):
             await add_assistant_log(chat, "context_product_type_found", product_type, get_elapsed_time(start_time), websocket)
             logging.info(f"Context product type found: chat_id={chat.id} product_type: {product_type}")
             chat.set_last_context(response_body)
-            CHAT_DB.update_chat(chat)
+            CHAT_WRITER.mark_dirty(chat)
             await send_chat(websocket, "system", "กำลังค้นหาโปรโมชั่นที่เหมาะสมสำหรับคุณ", chat.chat_context, chat.last_context)
         else:
             chat.set_status("error")
@@ -473,7 +474,7 @@ Banana IT: https://www.bnn.in.th/th/p/smartphone-and-accessories/smartphone/sams
         promotion_choice = str(json.loads(response_content.text.value)["result"])
         if promotion_choice:
             message_string = default_apologize_phrase
-            for _promotion in json.loads(chat.last_promotions):
+            for _promotion in chat.get_last_promotions() or []:
                 if promotion_choice == str(_promotion["id"]):
                     message_string = _promotion["summary_text"]
                     break
@@ -527,7 +528,7 @@ async def process_message(data, websocket: WebSocket):
 
     # get chat data
     chat_id = data["chat_id"]
-    chat = CHAT_DB.get_chat_by_id(chat_id)
+    chat = CHAT_WRITER.get_chat_by_id(chat_id)
     if chat is None:
         logging.warning(f"Chat not found: id = {chat_id}")
         await send_error(websocket, "404", "Chat not found")
@@ -541,36 +542,40 @@ async def process_message(data, websocket: WebSocket):
         await send_error(websocket, "404", "User not found")
         return
 
-    # save user message
-    await add_user_message(chat, data["message"], websocket)
+    try:
+        # save user message
+        await add_user_message(chat, data["message"], websocket)
 
-    time_log = TimeLog()
+        time_log = TimeLog()
 
-    # interpret context
-    await get_context(chat, user, websocket)
-    time_log.log_time("context")
+        # interpret context
+        await get_context(chat, user, websocket)
+        time_log.log_time("context")
 
-    # compute context details
-    if chat.chat_context > 0:
-        await get_context_details(chat, user, websocket)
-        time_log.log_time("context_details")
+        # compute context details
+        if chat.chat_context > 0:
+            await get_context_details(chat, user, websocket)
+            time_log.log_time("context_details")
 
-        # search for promotions
-        await get_promotions(chat, user, websocket)
-        time_log.log_time("promotion")
+            # search for promotions
+            await get_promotions(chat, user, websocket)
+            time_log.log_time("promotion")
 
-        # send promotions
-        await get_promotions_details(chat, user, websocket)
-        time_log.log_time("promotion_details")
+            # send promotions
+            await get_promotions_details(chat, user, websocket)
+            time_log.log_time("promotion_details")
 
-        await add_assistant_log(chat,
-            "Final Report: TIME",
-            f"Total time: {time_log.total_time:.2f}s\nContext: {time_log.context_time:.2f}s\nContext Details: {time_log.context_details_time:.2f}s\nPromotion: {time_log.promotion_time:.2f}s\nPromotion Details: {time_log.promotion_details_time:.2f}s",
-            f"{time_log.total_time:.4f}",
-            websocket
-        )
+            await add_assistant_log(chat,
+                "Final Report: TIME",
+                f"Total time: {time_log.total_time:.2f}s\nContext: {time_log.context_time:.2f}s\nContext Details: {time_log.context_details_time:.2f}s\nPromotion: {time_log.promotion_time:.2f}s\nPromotion Details: {time_log.promotion_details_time:.2f}s",
+                f"{time_log.total_time:.4f}",
+                websocket
+            )
 
-        await get_token_report(chat, websocket)
+            await get_token_report(chat, websocket)
+    finally:
+        # write the changes of this turn now rather than at the next interval
+        CHAT_WRITER.request_flush()
 
 async def create_new_chat(data, websocket: WebSocket):
     start_time = time.time()
@@ -594,8 +599,8 @@ async def create_new_chat(data, websocket: WebSocket):
         "New chat created", 
         response_time = time.time() - start_time)
 
-    # record thread's info to database
-    new_chat = CHAT_DB.add_chat(new_chat)
+    # record thread's info to database, off the event loop
+    new_chat = await asyncio.to_thread(CHAT_DB.add_chat, new_chat)
     logging.info("Created new chat: {}".format(new_chat))
 
     # return chat information
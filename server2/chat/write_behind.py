@@ -0,0 +1,82 @@
+import os
+import logging
+import threading
+from dotenv import load_dotenv
+from server2.db import CHAT_DB, Chat
+
+logging.basicConfig(level=logging.INFO)
+
+load_dotenv()
+
+# seconds a changed chat waits at most before it is written, i.e. what a crash can lose
+# on top of the storage's own window (CHAT_JOURNAL_FSYNC_INTERVAL for the JSON backend)
+CHAT_FLUSH_INTERVAL = float(os.getenv("CHAT_FLUSH_INTERVAL", 0.5))
+
+
+class ChatWriteBehind:
+    """
+    Write-behind layer in front of CHAT_DB for the chat pipeline.
+
+    mark_dirty only records the chat, so the event loop never waits for the disk; a
+    background thread writes the dirty chats every CHAT_FLUSH_INTERVAL seconds or as soon
+    as a pipeline ends, and any number of changes to a chat in between is one update_chat.
+    """
+
+    def __init__(self, chat_db, interval=CHAT_FLUSH_INTERVAL):
+        self.chat_db = chat_db
+        self.interval = interval
+        # chats changed since their last write, by id
+        self.dirty: dict[int, Chat] = {}
+        # chats being written by the current flush, still newer than the storage
+        self.flushing: dict[int, Chat] = {}
+        self.lock = threading.Lock()
+        # one flush at a time, so that an older state of a chat never overwrites a newer one
+        self.flush_lock = threading.Lock()
+        self.wakeup = threading.Event()
+        self.flusher = threading.Thread(target=self.run, daemon=True)
+        self.flusher.start()
+
+    def mark_dirty(self, chat: Chat) -> None:
+        with self.lock:
+            self.dirty[chat.id] = chat
+
+    def discard(self, id: int) -> None:
+        with self.lock:
+            self.dirty.pop(id, None)
+
+    def get_chat_by_id(self, id: int) -> Chat | None:
+        # a chat not written yet is newer than the one in the storage
+        with self.lock:
+            chat = self.dirty.get(id) or self.flushing.get(id)
+        return chat if chat is not None else self.chat_db.get_chat_by_id(id)
+
+    def request_flush(self) -> None:
+        # write the dirty chats now rather than at the next interval, e.g. when a pipeline ends
+        self.wakeup.set()
+
+    def flush(self) -> int:
+        # write every dirty chat and wait for it, e.g. at shutdown
+        with self.flush_lock:
+            with self.lock:
+                self.flushing, self.dirty = self.dirty, {}
+
+            for chat in self.flushing.values():
+                try:
+                    self.chat_db.update_chat(chat)
+                except Exception as e:
+                    logging.warning("Failed to write chat {}, retrying at the next flush: {}".format(chat.id, e))
+                    with self.lock:
+                        self.dirty.setdefault(chat.id, chat)
+
+            with self.lock:
+                written, self.flushing = len(self.flushing), {}
+            return written
+
+    def run(self) -> None:
+        while True:
+            self.wakeup.wait(self.interval)
+            self.wakeup.clear()
+            self.flush()
+
+
+CHAT_WRITER = ChatWriteBehind(CHAT_DB)
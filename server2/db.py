@@ -1,5 +1,17 @@
+import os
+import copy
 import json
+import sys
+import shutil
+import sqlite3
 import logging
+import threading
+import time
+import weakref
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
 
 #### DATABASE SIMULATION ####
 # load user data from data/users.json, simulating a database
@@ -7,6 +19,8 @@ USER_DATA_PATH = "data/users.json"
 
 
 class User:
+    __slots__ = ("id", "name", "password", "description", "segment", "npl_status", "credit_cards")
+
     def __init__(self, name, password, description, segment, npl_status, credit_cards):
         self.id = 0
         self.name = name
@@ -27,6 +41,18 @@ class User:
             "credit_cards": self.credit_cards,
         }
 
+    def to_response(self):
+        # the user as served by the REST API, with the attribute names rather than the stored keys
+        return {
+            "id": self.id,
+            "name": self.name,
+            "password": self.password,
+            "description": self.description,
+            "segment": self.segment,
+            "npl_status": self.npl_status,
+            "credit_cards": self.credit_cards,
+        }
+
     @staticmethod
     def from_dict(data):
         new_user = User(
@@ -44,6 +70,8 @@ class User:
 class UserDB:
     def __init__(self, db_path):
         self.data: list[User] = []
+        # users by id, the first one wins as with a linear scan
+        self.index: dict[int, User] = {}
         self.db_path = db_path
         self.load_from_file(db_path)
 
@@ -54,6 +82,7 @@ class UserDB:
             for item in user_json:
                 user = User.from_dict(item)
                 self.data.append(user)
+                self.index.setdefault(user.id, user)
 
     def save_to_file(self, db_path) -> None:
         user_json = []
@@ -61,13 +90,11 @@ class UserDB:
             item = user.get_as_dict()
             user_json.append(item)
 
-            with open(db_path, "w") as f:
-                json.dump(user_json, f, indent=4)
+        with open(db_path, "w") as f:
+            json.dump(user_json, f, indent=4)
 
     def get_user_by_id(self, id: int) -> User | None:
-        for user in self.data:
-            if user.id == id:
-                return user
+        return self.index.get(id)
 
     def get_all_users_as_dict(self) -> list[dict]:
         users: list[dict] = []
@@ -78,12 +105,22 @@ class UserDB:
 
 # load chat sessions from data/chats.json, simulating a database
 CHAT_DATA_PATH = "data/chats.json"
+# chat mutations since the last snapshot of data/chats.json, one JSON line each
+CHAT_JOURNAL_PATH = "data/chats.journal.jsonl"
+# when journal writes reach the disk: "always" after every write, "interval" at most
+# CHAT_JOURNAL_FSYNC_INTERVAL seconds later, "never" whenever the OS flushes them
+CHAT_JOURNAL_FSYNC = os.getenv("CHAT_JOURNAL_FSYNC", "interval")
+CHAT_JOURNAL_FSYNC_INTERVAL = float(os.getenv("CHAT_JOURNAL_FSYNC_INTERVAL", 1.0))
+# the journal is compacted into a new snapshot in the background past this size
+CHAT_JOURNAL_COMPACT_BYTES = int(os.getenv("CHAT_JOURNAL_COMPACT_BYTES", 16 * 1024 * 1024))
 
 
 class ChatMessage:
+    __slots__ = ("type", "message")
+
     def __init__(self, user_type, message):
         if user_type in ["user", "assistant", "system"]:
-            self.type = user_type
+            self.type = sys.intern(user_type)
             self.message = message
         else:
             logging.warning("Invalid user type: {}".format(user_type))
@@ -92,12 +129,18 @@ class ChatMessage:
     def get_as_dict(self):
         return {"user_type": self.type, "message": self.message}
 
+    def to_response(self):
+        # the message as served by the REST API, with "type" rather than the stored "user_type"
+        return {"type": self.type, "message": self.message}
+
     @staticmethod
     def from_dict(data):
         return ChatMessage(data["user_type"], data["message"])
 
 
 class AssistantLog:
+    __slots__ = ("type", "message", "response_time")
+
     def __init__(self, chat_type, message, response_time):
         self.type = chat_type
         self.message = message
@@ -111,13 +154,125 @@ class AssistantLog:
         return AssistantLog(data["type"], data["message"], data["response_time"])
 
 
+class AssistantLogs:
+    """
+    The assistant logs of a chat, stored column by column: three lists rather than one object
+    per log, with the few distinct log types interned. It reads and writes like a list of
+    AssistantLog, which are created on access.
+    """
+
+    __slots__ = ("types", "messages", "response_times")
+
+    def __init__(self, logs=()):
+        self.types: list[str] = []
+        self.messages: list[str] = []
+        self.response_times: list = []
+        self.extend(logs)
+
+    def append(self, log: AssistantLog) -> None:
+        self.types.append(sys.intern(log.type) if type(log.type) is str else log.type)
+        self.messages.append(log.message)
+        self.response_times.append(log.response_time)
+
+    def extend(self, logs) -> None:
+        for log in logs:
+            self.append(log)
+
+    def __len__(self) -> int:
+        # the last column appended, so that a log being appended by another thread is not counted yet
+        return len(self.response_times)
+
+    def __iter__(self):
+        return map(AssistantLog, self.types, self.messages, self.response_times)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return list(map(AssistantLog, self.types[index], self.messages[index], self.response_times[index]))
+        return AssistantLog(self.types[index], self.messages[index], self.response_times[index])
+
+    def __setitem__(self, index, logs) -> None:
+        if isinstance(index, slice):
+            columns = AssistantLogs(logs)
+        else:
+            self.types[index]
+            columns, index = AssistantLogs([logs]), slice(index, index + 1 or None)
+        self.types[index] = columns.types
+        self.messages[index] = columns.messages
+        self.response_times[index] = columns.response_times
+
+    def __delitem__(self, index) -> None:
+        del self.types[index]
+        del self.messages[index]
+        del self.response_times[index]
+
+    def get_as_dict(self) -> list[dict]:
+        return [
+            {"type": chat_type, "message": message, "response_time": response_time}
+            for chat_type, message, response_time in zip(self.types, self.messages, self.response_times)
+        ]
+
+
+# value of a JsonAttribute set as a JSON string and not parsed yet
+UNPARSED = object()
+
+
+class JsonAttribute:
+    """
+    A chat attribute that reads and writes as a JSON string ("" standing for None), e.g.
+    Chat.last_context, but is kept as the parsed object. The string is only built when read,
+    usually when the chat is persisted, and kept until the next set; a string that is set is
+    parsed once when its value is first needed. The owner class declares the "_<name>_value"
+    and "_<name>_json" slots.
+    """
+
+    def __set_name__(self, owner, name):
+        self.value_slot = "_{}_value".format(name)
+        self.json_slot = "_{}_json".format(name)
+
+    def __get__(self, chat, owner=None):
+        if chat is None:
+            return self
+        text = getattr(chat, self.json_slot)
+        if text is None:
+            text = json.dumps(getattr(chat, self.value_slot))
+            setattr(chat, self.json_slot, text)
+        return text
+
+    def __set__(self, chat, text) -> None:
+        setattr(chat, self.json_slot, text)
+        setattr(chat, self.value_slot, UNPARSED)
+
+    def get_value(self, chat):
+        value = getattr(chat, self.value_slot)
+        if value is UNPARSED:
+            text = getattr(chat, self.json_slot)
+            value = json.loads(text) if text != "" else None
+            setattr(chat, self.value_slot, value)
+        return value
+
+    def set_value(self, chat, value) -> None:
+        # a copy, so that later changes of the caller's object do not reach the chat
+        setattr(chat, self.value_slot, copy.deepcopy(value))
+        setattr(chat, self.json_slot, None)
+
+
 class Chat:
+    __slots__ = (
+        "id", "user_id", "openai_thread_id", "chat_messages", "assistant_logs", "status", "chat_context",
+        "_last_context_value", "_last_context_json", "_last_promotions_value", "_last_promotions_json", "openai_run_id",
+        # the SQLite backend keeps the chats in use in a WeakValueDictionary
+        "__weakref__",
+    )
+
+    last_context = JsonAttribute()
+    last_promotions = JsonAttribute()
+
     def __init__(self, chat_id, user_id, thread_id):
         self.id: int = chat_id
         self.user_id: str = user_id
         self.openai_thread_id: str = thread_id
         self.chat_messages: list[ChatMessage] = []
-        self.assistant_logs: list[AssistantLog] = []
+        self.assistant_logs: AssistantLogs = AssistantLogs()
         self.status = "ready"
         self.chat_context = 0
         self.last_context = ""
@@ -129,15 +284,43 @@ class Chat:
             "id": self.id,
             "user_id": self.user_id,
             "openai_thread_id": self.openai_thread_id,
-            "chat_messages": [message.get_as_dict() for message in self.chat_messages],
-            "assistant_logs": [log.get_as_dict() for log in self.assistant_logs],
+            "chat_messages": self.get_messages_as_dict(),
+            "assistant_logs": self.get_assistant_logs_as_dict(),
             "status": self.status,
             "chat_context": self.chat_context,
             "last_context": self.last_context,
             "last_promotions": self.last_promotions,
-            "openai_run_id": self.openai_run_id,
+            "openai_run_id": list(self.openai_run_id),
         }
 
+    def get_messages_as_dict(self) -> list[dict]:
+        return [message.get_as_dict() for message in self.chat_messages]
+
+    def get_assistant_logs_as_dict(self) -> list[dict]:
+        return self.assistant_logs.get_as_dict()
+
+    def to_response(self):
+        # the chat as served by the REST API, get_as_dict being how it is stored
+        return {
+            "id": self.id,
+            "user_id": self.user_id,
+            "openai_thread_id": self.openai_thread_id,
+            "chat_messages": self.get_messages_response(),
+            "assistant_logs": self.get_assistant_logs_response(),
+            "status": self.status,
+            "chat_context": self.chat_context,
+            "last_context": self.last_context,
+            "last_promotions": self.last_promotions,
+            "openai_run_id": list(self.openai_run_id),
+        }
+
+    def get_messages_response(self) -> list[dict]:
+        return [message.to_response() for message in self.chat_messages]
+
+    def get_assistant_logs_response(self) -> list[dict]:
+        # the logs are served with the keys they are stored with
+        return self.assistant_logs.get_as_dict()
+
     @staticmethod
     def from_dict(data):
         new_chat = Chat(
@@ -148,9 +331,9 @@ class Chat:
         new_chat.chat_messages = [
             ChatMessage.from_dict(message) for message in data["chat_messages"]
         ]
-        new_chat.assistant_logs = [
+        new_chat.assistant_logs = AssistantLogs(
             AssistantLog.from_dict(log) for log in data["assistant_logs"]
-        ]
+        )
         new_chat.status = data["status"]
         new_chat.chat_context = data["chat_context"]
         new_chat.last_context = data["last_context"]
@@ -195,77 +378,290 @@ class Chat:
         return self.status == "ready"
 
     def set_last_context(self, context) -> None:
-        self.last_context = json.dumps(context)
+        Chat.last_context.set_value(self, context)
 
     def get_last_context(self) -> dict | None:
-        if self.last_context != "":
-            return json.loads(self.last_context)
-        else:
-            return None
+        # the parsed context is shared by every call, callers must not modify it
+        return Chat.last_context.get_value(self)
 
     def set_last_promotions(self, promotions) -> None:
-        self.last_promotions = json.dumps(promotions)
+        Chat.last_promotions.set_value(self, promotions)
 
     def get_last_promotions(self) -> dict | None:
-        if self.last_promotions != "":
-            return json.loads(self.last_promotions)
-        else:
-            return None
+        # the parsed promotions are shared by every call, callers must not modify them
+        return Chat.last_promotions.get_value(self)
+
+
+class ChatJournal:
+    """
+    Append-only file of chat mutations, one JSON object per line.
+
+    Every entry is absolute (a whole chat, field values, or list items from a position on),
+    so replaying entries that the snapshot already contains gives the same chats.
+    Compaction renames the journal to "<path>.old" while the snapshot is written, and
+    removes it once the snapshot is in place.
+    """
+
+    def __init__(self, path, fsync=CHAT_JOURNAL_FSYNC, fsync_interval=CHAT_JOURNAL_FSYNC_INTERVAL):
+        if fsync not in ["always", "interval", "never"]:
+            logging.warning("Invalid journal fsync policy: {}".format(fsync))
+            raise ValueError("Invalid journal fsync policy")
+        self.path = path
+        self.old_path = path + ".old"
+        self.fsync = fsync
+        self.fsync_interval = fsync_interval
+        self.file = None
+        self.size = os.path.getsize(path) if os.path.exists(path) else 0
+        self.unsynced = False
+        self.syncer = None
+        self.lock = threading.Lock()
+
+    def read(self) -> list[dict]:
+        entries = []
+        for path in [self.old_path, self.path]:
+            if not os.path.exists(path):
+                continue
+            with open(path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        entries.append(json.loads(line))
+                    except json.JSONDecodeError:
+                        # the last line is torn if the process died while appending it
+                        logging.warning("Ignoring the incomplete end of {}".format(path))
+                        break
+        return entries
+
+    def append(self, entries: list[dict]) -> None:
+        lines = "".join(json.dumps(entry, ensure_ascii=False) + "\n" for entry in entries)
+        with self.lock:
+            if self.file is None:
+                self.file = open(self.path, "a", encoding="utf-8")
+            self.file.write(lines)
+            self.file.flush()
+            self.size = self.file.tell()
+
+            if self.fsync == "always":
+                os.fsync(self.file.fileno())
+            elif self.fsync == "interval":
+                self.unsynced = True
+                if self.syncer is None:
+                    self.syncer = threading.Thread(target=self.sync_periodically, daemon=True)
+                    self.syncer.start()
+
+    def sync(self) -> None:
+        with self.lock:
+            if self.file is not None and self.unsynced:
+                os.fsync(self.file.fileno())
+                self.unsynced = False
+
+    def sync_periodically(self) -> None:
+        while True:
+            time.sleep(self.fsync_interval)
+            self.sync()
+
+    def close(self) -> None:
+        with self.lock:
+            if self.file is not None:
+                self.file.flush()
+                os.fsync(self.file.fileno())
+                self.file.close()
+                self.file = None
+                self.unsynced = False
+
+    def rotate(self) -> None:
+        """Move the entries to the old journal and start an empty one."""
+        self.close()
+        with self.lock:
+            if not os.path.exists(self.path):
+                pass
+            elif os.path.exists(self.old_path):
+                # a previous compaction did not finish, its entries must be kept first
+                with open(self.path, "rb") as src, open(self.old_path, "ab") as dst:
+                    shutil.copyfileobj(src, dst)
+                    dst.flush()
+                    os.fsync(dst.fileno())
+                os.remove(self.path)
+            else:
+                os.replace(self.path, self.old_path)
+            self.size = 0
+
+    def remove_old(self) -> None:
+        if os.path.exists(self.old_path):
+            os.remove(self.old_path)
 
 
 class ChatDB:
-    def __init__(self, db_path):
-        self.data: list[Chat] = []
+    # scalar fields of a chat journaled with a "set" entry when they change
+    JOURNAL_FIELDS = ["user_id", "openai_thread_id", "status", "chat_context", "last_context", "last_promotions"]
+
+    def __init__(self, db_path, journal_path=None):
+        # chats by id, in insertion order, so that lookups, updates and deletes are O(1)
+        self.data: dict[int, Chat] = {}
+        # id of the next new chat, never reused even after the last chat is deleted
+        self.next_id = 1
         self.db_path = db_path
+        # the journal sits next to the snapshot, e.g. data/chats.journal.jsonl
+        self.journal = ChatJournal(journal_path or os.path.splitext(db_path)[0] + ".journal.jsonl")
+        # what the journal holds of each chat, to append only what changed since
+        self.journaled: dict[int, tuple] = {}
+        # deleted chats not journaled yet (persist=False), journaled with the next persisted change
+        self.pending_deletes: set[int] = set()
+        self.compacting = False
+        self.lock = threading.RLock()
         self.load_from_file(db_path)
 
+        entries = self.journal.read()
+        if entries:
+            self.replay(entries)
+            # start from a clean snapshot, without a torn line the next appends would follow
+            self.compact()
+        for chat in self.data.values():
+            self.journaled[chat.id] = self.journal_state(chat)
+
     def load_from_file(self, db_path) -> None:
         with open(db_path, "r") as f:
             chat_json = json.load(f)
 
             for item in chat_json:
                 chat = Chat.from_dict(item)
-                self.data.append(chat)
+                self.data[chat.id] = chat
+                self.next_id = max(self.next_id, chat.id + 1)
 
     def save_to_file(self, db_path) -> None:
-        chat_json = []
-        for chat in self.data:
-            item = chat.get_as_dict()
-            chat_json.append(item)
+        with self.lock:
+            chat_json = [chat.get_as_dict() for chat in self.data.values()]
+        self.write_snapshot(chat_json, db_path)
+
+    def write_snapshot(self, chat_json: list[dict], db_path) -> None:
+        # write aside and rename, so that a crash never leaves a partial snapshot
+        tmp_path = db_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(chat_json, f, indent=4)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, db_path)
 
-            with open(db_path, "w") as f:
-                json.dump(chat_json, f, indent=4)
+    def replay(self, entries: list[dict]) -> None:
+        for entry in entries:
+            op = entry["op"]
+            if op == "create":
+                chat = Chat.from_dict(entry["chat"])
+                self.data[chat.id] = chat
+                self.next_id = max(self.next_id, chat.id + 1)
+                continue
+            if op == "delete":
+                self.data.pop(entry["id"], None)
+                continue
+
+            chat = self.data.get(entry["id"])
+            if chat is None:
+                continue
+            if op == "messages":
+                chat.chat_messages[entry["start"]:] = [ChatMessage.from_dict(item) for item in entry["items"]]
+            elif op == "logs":
+                chat.assistant_logs[entry["start"]:] = [AssistantLog.from_dict(item) for item in entry["items"]]
+            elif op == "run_ids":
+                chat.openai_run_id[entry["start"]:] = entry["items"]
+            elif op == "set":
+                for field, value in entry["fields"].items():
+                    setattr(chat, field, value)
+
+    def journal_state(self, chat: Chat) -> tuple:
+        return (
+            len(chat.chat_messages),
+            len(chat.assistant_logs),
+            len(chat.openai_run_id),
+            {field: getattr(chat, field) for field in self.JOURNAL_FIELDS},
+        )
+
+    def journal_changes(self, chat: Chat) -> list[dict]:
+        """Return the entries bringing the journaled state of a chat up to date, e.g. its new messages."""
+        # the chat may keep changing while it is written (e.g. by the event loop during a flush), so
+        # the journaled state is exactly what the entries hold, and later changes go with the next update
+        state = self.journaled.get(chat.id)
+        if state is None:
+            data = chat.get_as_dict()
+            self.journaled[chat.id] = (
+                len(data["chat_messages"]),
+                len(data["assistant_logs"]),
+                len(data["openai_run_id"]),
+                {field: data[field] for field in self.JOURNAL_FIELDS},
+            )
+            return [{"op": "create", "chat": data}]
+
+        entries = []
+        ends = []
+        lists = [
+            ("messages", chat.chat_messages, ChatMessage.get_as_dict),
+            ("logs", chat.assistant_logs, AssistantLog.get_as_dict),
+            ("run_ids", chat.openai_run_id, lambda run_id: run_id),
+        ]
+        for (op, items, serialize), journaled in zip(lists, state):
+            end = len(items)
+            if end != journaled:
+                start = min(journaled, end)
+                entries.append({"op": op, "id": chat.id, "start": start, "items": [serialize(item) for item in items[start:end]]})
+            ends.append(end)
+        values = {field: getattr(chat, field) for field in self.JOURNAL_FIELDS}
+        fields = {field: value for field, value in values.items() if value != state[3][field]}
+        if fields:
+            entries.append({"op": "set", "id": chat.id, "fields": fields})
+        self.journaled[chat.id] = (*ends, values)
+        return entries
+
+    def write_journal(self, entries: list[dict]) -> None:
+        entries = [{"op": "delete", "id": id} for id in self.pending_deletes] + entries
+        self.pending_deletes.clear()
+        if not entries:
+            return
+        self.journal.append(entries)
+
+        if self.journal.size >= CHAT_JOURNAL_COMPACT_BYTES and not self.compacting:
+            self.compacting = True
+            threading.Thread(target=self.compact, daemon=True).start()
+
+    def compact(self) -> None:
+        """Write a snapshot of every chat to db_path and drop the journal entries it contains."""
+        try:
+            with self.lock:
+                self.compacting = True
+                chat_json = [chat.get_as_dict() for chat in self.data.values()]
+                self.journal.rotate()
+            # chats keep changing meanwhile, into the new journal
+            self.write_snapshot(chat_json, self.db_path)
+            self.journal.remove_old()
+        except OSError as e:
+            logging.warning("Chat journal compaction failed: {}".format(e))
+        finally:
+            self.compacting = False
+
+    def close(self) -> None:
+        self.journal.close()
 
     def get_last_chat(self) -> Chat | None:
         if len(self.data) > 0:
-            return self.data[-1]
+            return next(reversed(self.data.values()))
 
     def get_chat_by_id(self, id: int) -> Chat | None:
-        for chat in self.data:
-            if chat.id == id:
-                return chat
+        return self.data.get(id)
 
     def update_chat(self, chat: Chat, persist=True) -> None:
-        for index, c in enumerate(self.data):
-            if c.id == chat.id:
-                self.data[index] = chat
+        with self.lock:
+            if chat.id in self.data:
+                self.data[chat.id] = chat
 
                 if persist:
-                    self.save_to_file(self.db_path)
-
-                return
+                    self.write_journal(self.journal_changes(chat))
 
     def add_chat(self, chat: Chat, persist=True) -> Chat:
-        last_chat = self.get_last_chat()
-        if last_chat:
-            chat.id = last_chat.id + 1
-        else:
-            chat.id = 1
+        with self.lock:
+            chat.id = self.next_id
+            self.next_id += 1
 
-        self.data.append(chat)
+            self.data[chat.id] = chat
 
-        if persist:
-            self.save_to_file(self.db_path)
+            if persist:
+                self.write_journal(self.journal_changes(chat))
 
         return chat
 
@@ -273,24 +669,25 @@ class ChatDB:
         self, id: int | None = None, chat: Chat | None = None, persist=True
     ) -> None:
         if id:
-            for index, c in enumerate(self.data):
-                if c.id == id:
-                    del self.data[index]
-                    if persist:
-                        self.save_to_file(self.db_path)
-                    return
+            key = id
         elif chat:
-            for index, c in enumerate(self.data):
-                if c.id == chat.id:
-                    del self.data[index]
-                    if persist:
-                        self.save_to_file(self.db_path)
-                    return
+            key = chat.id
+        else:
+            return
+
+        with self.lock:
+            if self.data.pop(key, None) is not None:
+                self.journaled.pop(key, None)
+                self.pending_deletes.add(key)
+                if persist:
+                    self.write_journal([])
 
 # load chat sessions from data/chats.json, simulating a database
 CREDIT_CARD_PROMOS_DATA_PATH = "data/credit_cards.json"
 
 class CreditCard:
+    __slots__ = ("credit_card_name", "promotion")
+
     def __init__(self, credit_card_name, promotion):
         self.credit_card_name = credit_card_name
         self.promotion = promotion
@@ -313,6 +710,8 @@ class CreditCard:
 class CreditCardDB:
     def __init__(self, db_path):
         self.data: list[CreditCard] = []
+        # credit cards by name, the first one wins as with a linear scan
+        self.index: dict[str, CreditCard] = {}
         self.db_path = db_path
         self.load_from_file(db_path)
 
@@ -323,18 +722,343 @@ class CreditCardDB:
             for item in credit_card_json:
                 credit_card = CreditCard.from_dict(item)
                 self.data.append(credit_card)
+                self.index.setdefault(credit_card.credit_card_name, credit_card)
                 
     def get_credit_card(self, credit_card_name: str) -> CreditCard | None:
-        for credit_card in self.data:
-            if credit_card.credit_card_name == credit_card_name:
-                return credit_card
+        return self.index.get(credit_card_name)
     
     def get_credit_card_promotion(self, credit_card_name: str) -> str | None:
-        for credit_card in self.data:
-            if credit_card.credit_card_name == credit_card_name:
-                return credit_card.promotion
+        credit_card = self.index.get(credit_card_name)
+        if credit_card:
+            return credit_card.promotion
+
+
+#### SQLITE BACKEND ####
+# where users, chats and credit cards are stored: "json" for the files above, "sqlite" for one SQLite database
+DB_BACKEND = os.getenv("DB_BACKEND", "json")
+# the SQLite database, filled from data/*.json with `python -m server2.migrate`
+SQLITE_DATA_PATH = os.getenv("SQLITE_DATA_PATH", "data/database.sqlite3")
+# seconds a write waits for another connection (thread or process) to commit
+SQLITE_BUSY_TIMEOUT = float(os.getenv("SQLITE_BUSY_TIMEOUT", 5.0))
+
+# The lists of a chat are stored one row per item at its position, so that a new message
+# is one inserted row. Columns without a type keep the Python type of the JSON data.
+SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    position INTEGER PRIMARY KEY,
+    id INTEGER NOT NULL,
+    name TEXT,
+    password TEXT,
+    description TEXT,
+    customer_segment TEXT,
+    npl_status TEXT
+);
+CREATE INDEX IF NOT EXISTS users_id ON users (id, position);
+CREATE TABLE IF NOT EXISTS user_credit_cards (
+    user_position INTEGER NOT NULL REFERENCES users (position) ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    credit_card_name TEXT NOT NULL,
+    PRIMARY KEY (user_position, position)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS chats (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id,
+    openai_thread_id TEXT,
+    status TEXT NOT NULL,
+    chat_context,
+    last_context TEXT NOT NULL,
+    last_promotions TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS chats_user_id ON chats (user_id);
+CREATE TABLE IF NOT EXISTS chat_messages (
+    chat_id INTEGER NOT NULL REFERENCES chats (id) ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    user_type TEXT NOT NULL,
+    message TEXT,
+    PRIMARY KEY (chat_id, position)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS assistant_logs (
+    chat_id INTEGER NOT NULL REFERENCES chats (id) ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    type TEXT,
+    message TEXT,
+    response_time,
+    PRIMARY KEY (chat_id, position)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS chat_run_ids (
+    chat_id INTEGER NOT NULL REFERENCES chats (id) ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    run_id TEXT,
+    PRIMARY KEY (chat_id, position)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS credit_cards (
+    position INTEGER PRIMARY KEY,
+    credit_card_name TEXT NOT NULL,
+    promotion TEXT
+);
+CREATE INDEX IF NOT EXISTS credit_cards_name ON credit_cards (credit_card_name, position);
+"""
+
+
+class SqliteDatabase:
+    """
+    A SQLite database in WAL mode, so that readers never wait for the writer, with one
+    connection per thread. Each connection prepares a statement once and reuses it for
+    every later execution of the same SQL, so the queries below are constant strings.
+    """
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self.local = threading.local()
+        self.connect().executescript(SQLITE_SCHEMA)
+
+    def connect(self) -> sqlite3.Connection:
+        connection = getattr(self.local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.db_path, timeout=SQLITE_BUSY_TIMEOUT, cached_statements=128)
+            connection.execute("PRAGMA journal_mode=WAL")
+            # a commit is durable at the next checkpoint, and the database is never corrupted
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.execute("PRAGMA foreign_keys=ON")
+            self.local.connection = connection
+        return connection
+
+
+class SqliteUserDB:
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self.database = SqliteDatabase(db_path)
+
+    def load_from_file(self, db_path) -> None:
+        # the users of a JSON file replace every user
+        with open(db_path, "r") as f:
+            user_json = json.load(f)
+
+        with self.database.connect() as connection:
+            connection.execute("DELETE FROM users")
+            for position, item in enumerate(user_json):
+                connection.execute(
+                    "INSERT INTO users (position, id, name, password, description, customer_segment, npl_status) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (position, item["id"], item["name"], item["password"], item["description"], item["customer_segment"], item["NPL_status"]),
+                )
+                connection.executemany(
+                    "INSERT INTO user_credit_cards (user_position, position, credit_card_name) VALUES (?, ?, ?)",
+                    [(position, card_position, name) for card_position, name in enumerate(item["credit_cards"])],
+                )
+
+    def save_to_file(self, db_path) -> None:
+        with open(db_path, "w") as f:
+            json.dump(self.get_all_users_as_dict(), f, indent=4)
+
+    def get_users(self, id: int | None = None) -> list[User]:
+        connection = self.database.connect()
+        if id is None:
+            rows = connection.execute(
+                "SELECT position, id, name, password, description, customer_segment, npl_status FROM users ORDER BY position"
+            ).fetchall()
+        else:
+            # the first one wins as with the JSON backend
+            rows = connection.execute(
+                "SELECT position, id, name, password, description, customer_segment, npl_status FROM users WHERE id = ? ORDER BY position LIMIT 1",
+                (id,),
+            ).fetchall()
+
+        users = []
+        for position, id, name, password, description, segment, npl_status in rows:
+            credit_cards = [card for card, in connection.execute(
+                "SELECT credit_card_name FROM user_credit_cards WHERE user_position = ? ORDER BY position", (position,)
+            )]
+            user = User(name, password, description, segment, npl_status, credit_cards)
+            user.id = id
+            users.append(user)
+        return users
+
+    def get_user_by_id(self, id: int) -> User | None:
+        users = self.get_users(id)
+        return users[0] if users else None
+
+    def get_all_users_as_dict(self) -> list[dict]:
+        return [user.get_as_dict() for user in self.get_users()]
+
+
+class SqliteChatDB:
+    # table and columns of each list of a chat, its Chat attribute, and the conversions of an item to and from a row
+    LISTS = [
+        ("chat_messages", "user_type, message", "chat_messages",
+         lambda message: (message.type, message.message), ChatMessage),
+        ("assistant_logs", "type, message, response_time", "assistant_logs",
+         lambda log: (log.type, log.message, log.response_time), AssistantLog),
+        ("chat_run_ids", "run_id", "openai_run_id",
+         lambda run_id: (run_id,), lambda run_id: run_id),
+    ]
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self.database = SqliteDatabase(db_path)
+        # the chats in use, by id, so that every caller of this process gets and changes the same
+        # Chat as with the JSON backend, and update_chat never writes a stale copy over a newer one;
+        # a chat no one holds any more is read again from the database. Other processes sharing
+        # the database have their own copies.
+        self.chats: weakref.WeakValueDictionary[int, Chat] = weakref.WeakValueDictionary()
+        self.lock = threading.Lock()
+
+    def load_from_file(self, db_path) -> None:
+        # the chats of a JSON file replace the chats with the same ids
+        with open(db_path, "r") as f:
+            chat_json = json.load(f)
+
+        with self.database.connect() as connection:
+            for item in chat_json:
+                chat = Chat.from_dict(item)
+                connection.execute("DELETE FROM chats WHERE id = ?", (chat.id,))
+                self.insert_chat(connection, chat)
+                with self.lock:
+                    self.chats.pop(chat.id, None)
+
+    def save_to_file(self, db_path) -> None:
+        with open(db_path, "w") as f:
+            json.dump([chat.get_as_dict() for chat in self.get_chats()], f, indent=4)
+
+    def insert_chat(self, connection: sqlite3.Connection, chat: Chat) -> None:
+        cursor = connection.execute(
+            "INSERT INTO chats (id, user_id, openai_thread_id, status, chat_context, last_context, last_promotions) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (chat.id, chat.user_id, chat.openai_thread_id, chat.status, chat.chat_context, chat.last_context, chat.last_promotions),
+        )
+        chat.id = cursor.lastrowid
+        for table, columns, attribute, to_row, _ in self.LISTS:
+            self.insert_items(connection, table, columns, chat.id, 0, [to_row(item) for item in getattr(chat, attribute)])
+
+    def insert_items(self, connection: sqlite3.Connection, table: str, columns: str, chat_id: int, start: int, rows: list[tuple]) -> None:
+        placeholders = ", ".join("?" * (columns.count(",") + 3))
+        connection.executemany(
+            f"INSERT INTO {table} (chat_id, position, {columns}) VALUES ({placeholders})",
+            [(chat_id, start + offset, *row) for offset, row in enumerate(rows)],
+        )
+
+    def get_chats(self, id: int | None = None) -> list[Chat]:
+        # the chats in use are returned as they are, they are at least as recent as the database
+        chats = self.read_chats(id)
+        with self.lock:
+            return [self.chats.setdefault(chat.id, chat) for chat in chats]
+
+    def read_chats(self, id: int | None = None) -> list[Chat]:
+        connection = self.database.connect()
+        where, parameters = ("WHERE id = ?", (id,)) if id is not None else ("", ())
+        chats = {}
+        for row in connection.execute(
+            f"SELECT id, user_id, openai_thread_id, status, chat_context, last_context, last_promotions FROM chats {where} ORDER BY id",
+            parameters,
+        ):
+            chat = Chat(row[0], row[1], row[2])
+            chat.status, chat.chat_context, chat.last_context, chat.last_promotions = row[3:]
+            chats[chat.id] = chat
+        if not chats:
+            return []
+
+        # the items of the chats, one query per list
+        where = "WHERE chat_id = ?" if id is not None else ""
+        for table, columns, attribute, _, from_row in self.LISTS:
+            for chat_id, *row in connection.execute(f"SELECT chat_id, {columns} FROM {table} {where} ORDER BY chat_id, position", parameters):
+                getattr(chats[chat_id], attribute).append(from_row(*row))
+        return list(chats.values())
+
+    def get_last_chat(self) -> Chat | None:
+        id, = self.database.connect().execute("SELECT max(id) FROM chats").fetchone()
+        return self.get_chat_by_id(id) if id is not None else None
+
+    def get_chat_by_id(self, id: int) -> Chat | None:
+        with self.lock:
+            chat = self.chats.get(id)
+        if chat is not None:
+            return chat
+        chats = self.get_chats(id)
+        return chats[0] if chats else None
+
+    def update_chat(self, chat: Chat, persist=True) -> None:
+        # every change is written, persist only exists for the JSON backend
+        with self.database.connect() as connection:
+            cursor = connection.execute(
+                "UPDATE chats SET user_id = ?, openai_thread_id = ?, status = ?, chat_context = ?, last_context = ?, last_promotions = ? WHERE id = ?",
+                (chat.user_id, chat.openai_thread_id, chat.status, chat.chat_context, chat.last_context, chat.last_promotions, chat.id),
+            )
+            if cursor.rowcount == 0:
+                return
+            with self.lock:
+                self.chats[chat.id] = chat
+
+            # only the items past the stored ones are written, e.g. the new message
+            for table, columns, attribute, to_row, _ in self.LISTS:
+                items = getattr(chat, attribute)
+                stored, = connection.execute(f"SELECT coalesce(max(position) + 1, 0) FROM {table} WHERE chat_id = ?", (chat.id,)).fetchone()
+                if stored > len(items):
+                    connection.execute(f"DELETE FROM {table} WHERE chat_id = ? AND position >= ?", (chat.id, len(items)))
+                elif stored < len(items):
+                    self.insert_items(connection, table, columns, chat.id, stored, [to_row(item) for item in items[stored:]])
+
+    def add_chat(self, chat: Chat, persist=True) -> Chat:
+        # the database assigns the id, never reused even after the last chat is deleted
+        chat.id = None
+        with self.database.connect() as connection:
+            self.insert_chat(connection, chat)
+        with self.lock:
+            self.chats[chat.id] = chat
+        return chat
+
+    def delete_chat(
+        self, id: int | None = None, chat: Chat | None = None, persist=True
+    ) -> None:
+        if id:
+            key = id
+        elif chat:
+            key = chat.id
+        else:
+            return
+
+        # messages, logs and run ids are deleted by cascade
+        with self.database.connect() as connection:
+            connection.execute("DELETE FROM chats WHERE id = ?", (key,))
+        with self.lock:
+            self.chats.pop(key, None)
+
+
+class SqliteCreditCardDB:
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self.database = SqliteDatabase(db_path)
+
+    def load_from_file(self, db_path) -> None:
+        # the credit cards of a JSON file replace every credit card
+        with open(db_path, "r") as f:
+            credit_card_json = json.load(f)
+
+        with self.database.connect() as connection:
+            connection.execute("DELETE FROM credit_cards")
+            connection.executemany(
+                "INSERT INTO credit_cards (position, credit_card_name, promotion) VALUES (?, ?, ?)",
+                [(position, item["credit_card_name"], item["promotion"]) for position, item in enumerate(credit_card_json)],
+            )
+
+    def get_credit_card(self, credit_card_name: str) -> CreditCard | None:
+        # the first one wins as with the JSON backend
+        row = self.database.connect().execute(
+            "SELECT credit_card_name, promotion FROM credit_cards WHERE credit_card_name = ? ORDER BY position LIMIT 1",
+            (credit_card_name,),
+        ).fetchone()
+        return CreditCard(*row) if row else None
+
+    def get_credit_card_promotion(self, credit_card_name: str) -> str | None:
+        credit_card = self.get_credit_card(credit_card_name)
+        if credit_card:
+            return credit_card.promotion
 
 
-USER_DB = UserDB(USER_DATA_PATH)
-CHAT_DB = ChatDB(CHAT_DATA_PATH)
-CREDIT_CARD_DB = CreditCardDB(CREDIT_CARD_PROMOS_DATA_PATH)
+if DB_BACKEND == "sqlite":
+    USER_DB = SqliteUserDB(SQLITE_DATA_PATH)
+    CHAT_DB = SqliteChatDB(SQLITE_DATA_PATH)
+    CREDIT_CARD_DB = SqliteCreditCardDB(SQLITE_DATA_PATH)
+elif DB_BACKEND == "json":
+    USER_DB = UserDB(USER_DATA_PATH)
+    CHAT_DB = ChatDB(CHAT_DATA_PATH, CHAT_JOURNAL_PATH)
+    CREDIT_CARD_DB = CreditCardDB(CREDIT_CARD_PROMOS_DATA_PATH)
+else:
+    raise ValueError("Invalid DB_BACKEND: {}".format(DB_BACKEND))
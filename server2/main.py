@@ -1,16 +1,24 @@
 import os
 import logging
 import uvicorn
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, WebSocket
 from dotenv import load_dotenv
 
 from server2.user import router as user_router
 from server2.chat import router as chat_router
 from server2.chat.api import router as chat_api_router
+from server2.chat.write_behind import CHAT_WRITER
 
 logging.basicConfig(level=logging.INFO)
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    # write the chats changed since the last flush before exiting
+    CHAT_WRITER.flush()
+
+app = FastAPI(lifespan=lifespan)
 app.include_router(user_router)
 app.include_router(chat_router)
 app.include_router(chat_api_router)
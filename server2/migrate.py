@@ -0,0 +1,46 @@
+"""
+Copy the JSON "database simulation" (data/users.json, data/chats.json and data/credit_cards.json)
+into the SQLite database used with DB_BACKEND=sqlite.
+
+Users and credit cards replace those of the database, chats replace the chats with the same ids,
+so running it again is harmless. Run it with the server stopped: the journal of data/chats.json
+is first compacted into it.
+
+Usage (from the repository root):
+    python -m server2.migrate [--sqlite data/database.sqlite3]
+"""
+import argparse
+
+from server2.db import (
+    CHAT_DATA_PATH,
+    CHAT_JOURNAL_PATH,
+    CREDIT_CARD_PROMOS_DATA_PATH,
+    SQLITE_DATA_PATH,
+    USER_DATA_PATH,
+    ChatDB,
+    SqliteChatDB,
+    SqliteCreditCardDB,
+    SqliteUserDB,
+)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sqlite", default=SQLITE_DATA_PATH, help="The SQLite database to fill")
+    args = parser.parse_args()
+
+    SqliteUserDB(args.sqlite).load_from_file(USER_DATA_PATH)
+    SqliteCreditCardDB(args.sqlite).load_from_file(CREDIT_CARD_PROMOS_DATA_PATH)
+
+    # loading the chats replays their journal and compacts it into data/chats.json
+    ChatDB(CHAT_DATA_PATH, CHAT_JOURNAL_PATH).close()
+    sqlite_chat_db = SqliteChatDB(args.sqlite)
+    sqlite_chat_db.load_from_file(CHAT_DATA_PATH)
+
+    print("Migrated {} users, {} chats and the credit cards to {}".format(
+        len(SqliteUserDB(args.sqlite).get_all_users_as_dict()), len(sqlite_chat_db.get_chats()), args.sqlite
+    ))
+
+
+if __name__ == "__main__":
+    main()
@@ -14,7 +14,7 @@ def get_users():
 @router.get("/api/users/{id}")
 async def get_user(id: int):
     user = USER_DB.get_user_by_id(id)
-    return user
+    return user.to_response() if user is not None else None
 
 
 @router.post("/api/users")
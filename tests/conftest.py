@@ -0,0 +1,22 @@
+import atexit
+import glob
+import os
+import shutil
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# server2.db loads data/*.json from the working directory when it is imported, so the tests
+# run from a copy of the data, and the databases the tests create never touch the repository
+os.environ["DB_BACKEND"] = "json"
+os.environ["CHAT_JOURNAL_FSYNC"] = "never"
+# importing the chat package creates the OpenAI clients, which never make a request in the tests
+os.environ.setdefault("OPENAI_API_KEY", "test")
+WORKDIR = tempfile.mkdtemp(prefix="server-tests-")
+os.makedirs(os.path.join(WORKDIR, "data"))
+for path in glob.glob(os.path.join(ROOT, "data", "*.json")):
+    shutil.copy(path, os.path.join(WORKDIR, "data"))
+os.chdir(WORKDIR)
+atexit.register(shutil.rmtree, WORKDIR, ignore_errors=True)
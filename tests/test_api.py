@@ -0,0 +1,28 @@
+from fastapi.testclient import TestClient
+
+from server2.db import CHAT_DB, Chat
+from server2.main import app
+
+client = TestClient(app)
+
+
+def test_get_user_keeps_the_attribute_names():
+    user = client.get("/api/users/1").json()
+    assert sorted(user) == ["credit_cards", "description", "id", "name", "npl_status", "password", "segment"]
+
+
+def test_get_chat_serves_messages_with_type():
+    chat = Chat(0, 1, "thread_1")
+    chat.add_message("user", "hello")
+    chat.add_assistant_log("context", "log", 0.5)
+    chat.set_last_context({"place": "cafe"})
+    chat = CHAT_DB.add_chat(chat, persist=False)
+    try:
+        response = client.get("/api/chat/{}".format(chat.id)).json()
+        assert response["chat_messages"] == [{"type": "user", "message": "hello"}]
+        assert response["assistant_logs"] == [{"type": "context", "message": "log", "response_time": 0.5}]
+        assert response["last_context"] == '{"place": "cafe"}'
+        assert client.get("/api/chat/{}/message".format(chat.id)).json() == response["chat_messages"]
+        assert client.get("/api/chat/{}/assistant".format(chat.id)).json() == response["assistant_logs"]
+    finally:
+        CHAT_DB.delete_chat(chat.id, persist=False)
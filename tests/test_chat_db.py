@@ -0,0 +1,158 @@
+import json
+import os
+
+import pytest
+
+from server2.db import Chat, ChatDB
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    path = tmp_path / "chats.json"
+    path.write_text("[]")
+    return str(path)
+
+
+def journal_path(db_path):
+    return os.path.splitext(db_path)[0] + ".journal.jsonl"
+
+
+def make_chat(user_id="1", messages=2):
+    chat = Chat(0, user_id, "thread_{}".format(user_id))
+    for i in range(messages):
+        chat.add_message("user" if i % 2 == 0 else "assistant", "message {}".format(i))
+    return chat
+
+
+def read_snapshot(db_path):
+    with open(db_path) as f:
+        return json.load(f)
+
+
+def test_journal_is_replayed_and_compacted_on_startup(db_path):
+    chat_db = ChatDB(db_path)
+    chat = chat_db.add_chat(make_chat())
+    chat.add_message("user", "message 2")
+    chat.add_assistant_log("context", "log", 1.5)
+    chat.add_run_id("run_1")
+    chat.set_status("running")
+    chat.set_last_context({"place": "cafe"})
+    chat_db.update_chat(chat)
+    expected = chat.get_as_dict()
+    chat_db.close()
+    assert read_snapshot(db_path) == []
+
+    reloaded = ChatDB(db_path)
+    assert reloaded.get_chat_by_id(chat.id).get_as_dict() == expected
+    assert read_snapshot(db_path) == [expected]
+    assert not os.path.exists(journal_path(db_path))
+    assert not os.path.exists(journal_path(db_path) + ".old")
+
+
+def test_update_journals_only_the_new_items(db_path):
+    chat_db = ChatDB(db_path)
+    chat = chat_db.add_chat(make_chat(messages=3))
+    chat.add_message("assistant", "message 3")
+    chat_db.update_chat(chat)
+    chat_db.close()
+
+    with open(journal_path(db_path)) as f:
+        entries = [json.loads(line) for line in f]
+    assert [entry["op"] for entry in entries] == ["create", "messages"]
+    assert entries[1]["start"] == 3
+    assert entries[1]["items"] == [{"user_type": "assistant", "message": "message 3"}]
+
+
+def test_replay_is_idempotent(db_path):
+    chat_db = ChatDB(db_path)
+    chat = chat_db.add_chat(make_chat())
+    chat.add_message("user", "message 2")
+    chat_db.update_chat(chat)
+    chat_db.close()
+    with open(journal_path(db_path)) as f:
+        entries = [json.loads(line) for line in f]
+
+    # the snapshot already contains every entry, e.g. after a crash before the journal was removed
+    ChatDB(db_path).close()
+    replayed = ChatDB(db_path)
+    replayed.replay(entries)
+    assert replayed.get_chat_by_id(chat.id).get_as_dict() == chat.get_as_dict()
+
+
+def test_deletes_are_replayed(db_path):
+    chat_db = ChatDB(db_path)
+    first = chat_db.add_chat(make_chat("1"))
+    second = chat_db.add_chat(make_chat("2"))
+    chat_db.delete_chat(second.id)
+    chat_db.close()
+
+    reloaded = ChatDB(db_path)
+    assert [chat["id"] for chat in read_snapshot(db_path)] == [first.id]
+    assert reloaded.get_chat_by_id(second.id) is None
+    assert reloaded.add_chat(make_chat("3")).id == second.id + 1
+
+
+def test_torn_last_line_is_ignored(db_path):
+    chat_db = ChatDB(db_path)
+    chat = chat_db.add_chat(make_chat())
+    chat_db.close()
+    with open(journal_path(db_path), "a") as f:
+        f.write('{"op": "messages", "id": 1, "sta')
+
+    reloaded = ChatDB(db_path)
+    assert reloaded.get_chat_by_id(chat.id).get_as_dict() == chat.get_as_dict()
+    # the compacted journal no longer has the torn line, new entries are readable
+    reloaded.add_chat(make_chat("2"))
+    reloaded.close()
+    assert len(ChatDB(db_path).data) == 2
+
+
+def test_interrupted_compaction_is_recovered(db_path):
+    chat_db = ChatDB(db_path)
+    chat = chat_db.add_chat(make_chat())
+    # the process dies after the journal is rotated, before the snapshot is written
+    chat_db.journal.rotate()
+    chat.add_message("user", "message 2")
+    chat_db.update_chat(chat)
+    chat_db.close()
+    assert os.path.exists(journal_path(db_path) + ".old")
+    assert read_snapshot(db_path) == []
+
+    reloaded = ChatDB(db_path)
+    assert reloaded.get_chat_by_id(chat.id).get_as_dict() == chat.get_as_dict()
+    assert not os.path.exists(journal_path(db_path) + ".old")
+
+
+def test_compact_keeps_changes_made_after_it(db_path):
+    chat_db = ChatDB(db_path)
+    chat = chat_db.add_chat(make_chat())
+    chat_db.compact()
+    assert read_snapshot(db_path) == [chat.get_as_dict()]
+
+    chat.add_message("user", "message 2")
+    chat_db.update_chat(chat)
+    chat_db.close()
+    assert ChatDB(db_path).get_chat_by_id(chat.id).get_as_dict() == chat.get_as_dict()
+
+
+def test_last_context_is_a_snapshot():
+    chat = make_chat()
+    context = {"place": "cafe"}
+    chat.set_last_context(context)
+    context["place"] = "airport"
+    assert chat.get_last_context() == {"place": "cafe"}
+    assert chat.last_context == '{"place": "cafe"}'
+
+    promotions = [{"id": 1}]
+    chat.set_last_promotions(promotions)
+    promotions.append({"id": 2})
+    assert Chat.from_dict(chat.get_as_dict()).get_last_promotions() == [{"id": 1}]
+
+
+def test_last_context_is_serialized_when_persisted(monkeypatch):
+    chat = make_chat()
+    chat.set_last_context({"place": "cafe"})
+    # the parsed value is kept, reading it back does not parse the JSON
+    monkeypatch.setattr("json.loads", None)
+    assert chat.get_last_context() == {"place": "cafe"}
+    assert chat.get_as_dict()["last_context"] == '{"place": "cafe"}'
@@ -0,0 +1,69 @@
+import glob
+import os
+import shutil
+import sys
+
+import pytest
+
+from server2 import migrate
+from server2.db import (
+    CHAT_DATA_PATH,
+    CREDIT_CARD_PROMOS_DATA_PATH,
+    USER_DATA_PATH,
+    Chat,
+    ChatDB,
+    CreditCardDB,
+    SqliteChatDB,
+    SqliteCreditCardDB,
+    SqliteUserDB,
+    UserDB,
+)
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture
+def sqlite_path(tmp_path, monkeypatch):
+    # the migration reads the data files relative to the working directory, like the servers
+    os.makedirs(tmp_path / "data")
+    for path in glob.glob(os.path.join(ROOT, "data", "*.json")):
+        shutil.copy(path, tmp_path / "data")
+    monkeypatch.chdir(tmp_path)
+    return str(tmp_path / "data" / "database.sqlite3")
+
+
+def run_migrate(sqlite_path, monkeypatch):
+    monkeypatch.setattr(sys, "argv", ["migrate", "--sqlite", sqlite_path])
+    migrate.main()
+
+
+def test_migrate_copies_the_json_data(sqlite_path, monkeypatch):
+    # a chat still in the journal, e.g. the server was stopped before compacting it
+    chat_db = ChatDB(CHAT_DATA_PATH)
+    chat = chat_db.add_chat(Chat(0, "1", "thread_1"))
+    chat.add_message("user", "hello")
+    chat.add_assistant_log("context", "log", 0.5)
+    chat.set_last_promotions([{"id": 1}])
+    chat_db.update_chat(chat)
+    chat_db.close()
+
+    run_migrate(sqlite_path, monkeypatch)
+
+    assert SqliteUserDB(sqlite_path).get_all_users_as_dict() == UserDB(USER_DATA_PATH).get_all_users_as_dict()
+    expected_chats = [chat.get_as_dict() for chat in ChatDB(CHAT_DATA_PATH).data.values()]
+    assert [chat.get_as_dict() for chat in SqliteChatDB(sqlite_path).get_chats()] == expected_chats
+    assert chat.get_as_dict() in expected_chats
+    credit_card_db = CreditCardDB(CREDIT_CARD_PROMOS_DATA_PATH)
+    sqlite_credit_card_db = SqliteCreditCardDB(sqlite_path)
+    for credit_card in credit_card_db.data:
+        assert sqlite_credit_card_db.get_credit_card(credit_card.credit_card_name).get_as_dict() == credit_card.get_as_dict()
+
+
+def test_migrate_twice_gives_the_same_database(sqlite_path, monkeypatch):
+    run_migrate(sqlite_path, monkeypatch)
+    users = SqliteUserDB(sqlite_path).get_all_users_as_dict()
+    chats = [chat.get_as_dict() for chat in SqliteChatDB(sqlite_path).get_chats()]
+
+    run_migrate(sqlite_path, monkeypatch)
+    assert SqliteUserDB(sqlite_path).get_all_users_as_dict() == users
+    assert [chat.get_as_dict() for chat in SqliteChatDB(sqlite_path).get_chats()] == chats
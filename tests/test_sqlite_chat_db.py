@@ -0,0 +1,52 @@
+import gc
+
+import pytest
+
+from server2.db import Chat, SqliteChatDB
+
+
+@pytest.fixture
+def chat_db(tmp_path):
+    return SqliteChatDB(str(tmp_path / "database.sqlite3"))
+
+
+def test_callers_share_the_chat_in_use(chat_db):
+    chat_id = chat_db.add_chat(Chat(0, "1", "thread_1")).id
+    first = chat_db.get_chat_by_id(chat_id)
+    second = chat_db.get_chat_by_id(chat_id)
+    assert first is second
+    assert chat_db.get_chats()[0] is first
+    assert chat_db.get_last_chat() is first
+
+
+def test_updates_of_two_callers_are_all_written(chat_db):
+    chat_id = chat_db.add_chat(Chat(0, "1", "thread_1")).id
+    first = chat_db.get_chat_by_id(chat_id)
+    second = chat_db.get_chat_by_id(chat_id)
+    first.add_message("user", "hello")
+    chat_db.update_chat(first)
+    second.add_message("assistant", "hi")
+    second.add_assistant_log("context", "log", 0.5)
+    chat_db.update_chat(second)
+    del first, second
+    gc.collect()
+
+    stored = chat_db.get_chat_by_id(chat_id)
+    assert [message.message for message in stored.chat_messages] == ["hello", "hi"]
+    assert len(stored.assistant_logs) == 1
+
+
+def test_chat_no_one_holds_is_read_again(chat_db):
+    chat = chat_db.add_chat(Chat(0, "1", "thread_1"))
+    chat.add_message("user", "not written")
+    chat_id = chat.id
+    del chat
+    gc.collect()
+    assert chat_db.get_chat_by_id(chat_id).chat_messages == []
+
+
+def test_deleted_chat_is_not_returned(chat_db):
+    chat = chat_db.add_chat(Chat(0, "1", "thread_1"))
+    chat_db.delete_chat(chat.id)
+    assert chat_db.get_chat_by_id(chat.id) is None
+    assert chat_db.get_chats() == []
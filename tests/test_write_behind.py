@@ -0,0 +1,40 @@
+import sys
+
+import pytest
+
+from server2.chat.write_behind import ChatWriteBehind
+from server2.db import Chat, ChatDB
+
+
+@pytest.fixture
+def fast_thread_switches():
+    # switch threads as often as possible, so that changes land in the middle of update_chat
+    switch_interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    yield
+    sys.setswitchinterval(switch_interval)
+
+
+def test_changes_made_while_flushing_are_written(tmp_path, fast_thread_switches):
+    db_path = tmp_path / "chats.json"
+    db_path.write_text("[]")
+    chat_db = ChatDB(str(db_path))
+    chat = chat_db.add_chat(Chat(0, "1", "thread_1"))
+    # the flusher thread writes the chat while this thread, like the event loop, keeps changing it
+    writer = ChatWriteBehind(chat_db, interval=0.0001)
+
+    for i in range(20000):
+        chat.add_message("user", "message {}".format(i))
+        chat.add_assistant_log("context", "log {}".format(i), 0.1)
+        if i % 10 == 0:
+            chat.add_run_id("run_{}".format(i))
+            chat.chat_context = i
+        writer.mark_dirty(chat)
+    writer.flush()
+    chat_db.close()
+
+    replayed = ChatDB(str(db_path)).get_chat_by_id(chat.id)
+    assert len(replayed.chat_messages) == len(chat.chat_messages)
+    assert len(replayed.assistant_logs) == len(chat.assistant_logs)
+    assert replayed.openai_run_id == chat.openai_run_id
+    assert replayed.get_as_dict() == chat.get_as_dict()